@@ -1,12 +1,41 @@
+from typing import AsyncIterator
+
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import declarative_base, sessionmaker
 
-from app.config import DATABASE_URL
+from app.config import ASYNC_DATABASE_URL, DATABASE_URL, DB_MAX_OVERFLOW, DB_POOL_SIZE
 
+# Motor sync: migraciones, caché de embeddings (en hilos) y scripts.
 engine = create_engine(
     DATABASE_URL,
     pool_pre_ping=True,
 )
 
 SessionLocal = sessionmaker(bind=engine, autoflush=False)
+
+# Motor async: todas las rutas y los workers de ingesta.
+# SQLite (desarrollo/benchmarks) usa NullPool, que no acepta tamaño de pool.
+_pool_options = {} if ASYNC_DATABASE_URL.startswith("sqlite") else {
+    "pool_size": DB_POOL_SIZE,
+    "max_overflow": DB_MAX_OVERFLOW,
+}
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    pool_pre_ping=True,
+    **_pool_options,
+)
+
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    autoflush=False,
+    expire_on_commit=False,
+)
+
 Base = declarative_base()
+
+
+async def get_db() -> AsyncIterator[AsyncSession]:
+    # Una sesión por request; al cerrar se descarta lo que no se haya confirmado.
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,414 @@
+"""
+Migraciones de esquema versionadas.
+
+Cada migración se aplica una sola vez y queda registrada en schema_version.
+El runner toma un advisory lock de PostgreSQL para que varias réplicas que
+arrancan a la vez no apliquen la misma migración en paralelo; si el esquema
+ya está al día, el arranque solo hace una consulta.
+
+Uso manual (p. ej. antes de un deploy):
+    python -m app.migrations
+"""
+
+from datetime import datetime
+from typing import Callable
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+
+from app.config import logger
+from app.models import Base, CorpusState
+
+# Clave fija del advisory lock de migraciones.
+MIGRATION_LOCK_KEY = 7_241_016
+
+# Configuración de full-text search de document_chunks.content_tsv; las
+# consultas léxicas deben usar la misma para que coincidan los lexemas.
+TEXT_SEARCH_CONFIG = "spanish"
+
+# Sentencias que antes corrían en cada arranque para esquemas creados por
+# versiones anteriores; se conservan tal cual como parte de la migración base.
+_LEGACY_STATEMENTS = (
+    (
+        "ALTER TABLE IF EXISTS documents "
+        "ADD COLUMN IF NOT EXISTS filename VARCHAR NOT NULL DEFAULT ''"
+    ),
+    (
+        "ALTER TABLE IF EXISTS documents "
+        "ADD COLUMN IF NOT EXISTS document_id VARCHAR"
+    ),
+    (
+        "ALTER TABLE IF EXISTS documents "
+        "ALTER COLUMN filename SET DEFAULT ''"
+    ),
+    (
+        "UPDATE documents "
+        "SET filename = COALESCE(filename, title, '') "
+        "WHERE filename IS NULL"
+    ),
+    (
+        "ALTER TABLE IF EXISTS documents "
+        "ADD COLUMN IF NOT EXISTS title VARCHAR NOT NULL DEFAULT ''"
+    ),
+    (
+        "ALTER TABLE IF EXISTS documents "
+        "ADD COLUMN IF NOT EXISTS category VARCHAR"
+    ),
+    (
+        "ALTER TABLE IF EXISTS documents "
+        "ADD COLUMN IF NOT EXISTS owner_area VARCHAR"
+    ),
+    (
+        "ALTER TABLE IF EXISTS documents "
+        "ADD COLUMN IF NOT EXISTS owner VARCHAR"
+    ),
+    (
+        "ALTER TABLE IF EXISTS documents "
+        "ADD COLUMN IF NOT EXISTS department VARCHAR"
+    ),
+    (
+        "ALTER TABLE IF EXISTS documents "
+        "ADD COLUMN IF NOT EXISTS tags TEXT"
+    ),
+    (
+        "ALTER TABLE IF EXISTS documents "
+        "ADD COLUMN IF NOT EXISTS description TEXT"
+    ),
+    (
+        "ALTER TABLE IF EXISTS documents "
+        "ADD COLUMN IF NOT EXISTS is_public BOOLEAN NOT NULL DEFAULT false"
+    ),
+    (
+        "ALTER TABLE IF EXISTS documents "
+        "ADD COLUMN IF NOT EXISTS is_indexable BOOLEAN NOT NULL DEFAULT true"
+    ),
+    (
+        "ALTER TABLE IF EXISTS documents "
+        "ADD COLUMN IF NOT EXISTS file_size INTEGER NOT NULL DEFAULT 0"
+    ),
+    (
+        "ALTER TABLE IF EXISTS documents "
+        "ADD COLUMN IF NOT EXISTS file_type VARCHAR"
+    ),
+    (
+        "ALTER TABLE IF EXISTS documents "
+        "ADD COLUMN IF NOT EXISTS file_path VARCHAR"
+    ),
+    (
+        "ALTER TABLE IF EXISTS documents "
+        "ADD COLUMN IF NOT EXISTS status VARCHAR NOT NULL DEFAULT 'active'"
+    ),
+    (
+        "ALTER TABLE IF EXISTS documents "
+        "ADD COLUMN IF NOT EXISTS created_at TIMESTAMP NOT NULL DEFAULT NOW()"
+    ),
+    (
+        "ALTER TABLE IF EXISTS documents "
+        "ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP"
+    ),
+    (
+        "ALTER TABLE IF EXISTS documents "
+        "ADD COLUMN IF NOT EXISTS indexed_at TIMESTAMP"
+    ),
+    (
+        "ALTER TABLE IF EXISTS documents "
+        "ADD COLUMN IF NOT EXISTS chunk_count INTEGER NOT NULL DEFAULT 0"
+    ),
+    (
+        "DO $$\n"
+        "DECLARE pk_name text;\n"
+        "BEGIN\n"
+        "  IF NOT EXISTS (\n"
+        "    SELECT 1 FROM information_schema.columns\n"
+        "    WHERE table_name = 'documents' AND column_name = 'id'\n"
+        "  ) THEN\n"
+        "    ALTER TABLE documents ADD COLUMN id BIGSERIAL;\n"
+        "  END IF;\n"
+        "  IF EXISTS (\n"
+        "    SELECT 1 FROM information_schema.columns\n"
+        "    WHERE table_name = 'documents' AND column_name = 'id'\n"
+        "  ) THEN\n"
+        "    IF EXISTS (\n"
+        "      SELECT 1 FROM information_schema.columns\n"
+        "      WHERE table_name = 'documents'\n"
+        "        AND column_name = 'id'\n"
+        "        AND data_type IN ('integer', 'bigint', 'smallint')\n"
+        "    ) THEN\n"
+        "      CREATE SEQUENCE IF NOT EXISTS documents_id_seq;\n"
+        "      ALTER SEQUENCE documents_id_seq OWNED BY documents.id;\n"
+        "      ALTER TABLE documents ALTER COLUMN id SET DEFAULT nextval('documents_id_seq');\n"
+        "      PERFORM setval('documents_id_seq', COALESCE((SELECT MAX(id) FROM documents), 0));\n"
+        "      UPDATE documents\n"
+        "      SET id = nextval('documents_id_seq')\n"
+        "      WHERE id IS NULL;\n"
+        "    ELSIF EXISTS (\n"
+        "      SELECT 1 FROM information_schema.columns\n"
+        "      WHERE table_name = 'documents'\n"
+        "        AND column_name = 'id'\n"
+        "        AND data_type = 'uuid'\n"
+        "    ) THEN\n"
+        "      CREATE EXTENSION IF NOT EXISTS pgcrypto;\n"
+        "      ALTER TABLE documents ALTER COLUMN id SET DEFAULT gen_random_uuid();\n"
+        "      UPDATE documents\n"
+        "      SET id = gen_random_uuid()\n"
+        "      WHERE id IS NULL;\n"
+        "    ELSE\n"
+        "      UPDATE documents\n"
+        "      SET document_id = COALESCE(NULLIF(document_id, ''), id::text)\n"
+        "      WHERE (document_id IS NULL OR document_id = '')\n"
+        "        AND id IS NOT NULL;\n"
+        "      SELECT conname INTO pk_name\n"
+        "      FROM pg_constraint\n"
+        "      WHERE conrelid = 'documents'::regclass AND contype = 'p'\n"
+        "      LIMIT 1;\n"
+        "      IF pk_name IS NOT NULL THEN\n"
+        "        EXECUTE format('ALTER TABLE documents DROP CONSTRAINT %I', pk_name);\n"
+        "      END IF;\n"
+        "      ALTER TABLE documents ADD COLUMN id_tmp BIGSERIAL;\n"
+        "      CREATE SEQUENCE IF NOT EXISTS documents_id_seq;\n"
+        "      ALTER SEQUENCE documents_id_seq OWNED BY documents.id_tmp;\n"
+        "      ALTER TABLE documents ALTER COLUMN id_tmp SET DEFAULT nextval('documents_id_seq');\n"
+        "      PERFORM setval('documents_id_seq', COALESCE((SELECT MAX(id_tmp) FROM documents), 0));\n"
+        "      UPDATE documents\n"
+        "      SET id_tmp = nextval('documents_id_seq')\n"
+        "      WHERE id_tmp IS NULL;\n"
+        "      ALTER TABLE documents DROP COLUMN id;\n"
+        "      ALTER TABLE documents RENAME COLUMN id_tmp TO id;\n"
+        "      ALTER SEQUENCE documents_id_seq OWNED BY documents.id;\n"
+        "      ALTER TABLE documents ALTER COLUMN id SET NOT NULL;\n"
+        "    END IF;\n"
+        "  END IF;\n"
+        "  IF NOT EXISTS (\n"
+        "    SELECT 1 FROM pg_constraint\n"
+        "    WHERE conrelid = 'documents'::regclass AND contype = 'p'\n"
+        "  ) THEN\n"
+        "    ALTER TABLE documents ADD PRIMARY KEY (id);\n"
+        "  END IF;\n"
+        "  IF EXISTS (\n"
+        "    SELECT 1 FROM information_schema.columns\n"
+        "    WHERE table_name = 'documents' AND column_name = 'id'\n"
+        "  ) THEN\n"
+        "    UPDATE documents\n"
+        "    SET document_id = COALESCE(document_id, id::text)\n"
+        "    WHERE document_id IS NULL OR document_id = '';\n"
+        "  END IF;\n"
+        "END $$;"
+    ),
+    (
+        "ALTER TABLE IF EXISTS document_versions "
+        "ADD COLUMN IF NOT EXISTS filename VARCHAR NOT NULL DEFAULT ''"
+    ),
+    (
+        "ALTER TABLE IF EXISTS document_versions "
+        "ADD COLUMN IF NOT EXISTS file_path VARCHAR"
+    ),
+    (
+        "ALTER TABLE IF EXISTS document_versions "
+        "ADD COLUMN IF NOT EXISTS file_size INTEGER NOT NULL DEFAULT 0"
+    ),
+    (
+        "ALTER TABLE IF EXISTS document_versions "
+        "ADD COLUMN IF NOT EXISTS file_type VARCHAR"
+    ),
+    (
+        "ALTER TABLE IF EXISTS document_versions "
+        "ALTER COLUMN filename SET DEFAULT ''"
+    ),
+    (
+        "UPDATE document_versions "
+        "SET filename = COALESCE(filename, '') "
+        "WHERE filename IS NULL"
+    ),
+    (
+        "ALTER TABLE IF EXISTS document_versions "
+        "ADD COLUMN IF NOT EXISTS is_current BOOLEAN NOT NULL DEFAULT false"
+    ),
+    (
+        "ALTER TABLE IF EXISTS document_versions "
+        "ADD COLUMN IF NOT EXISTS deleted BOOLEAN NOT NULL DEFAULT false"
+    ),
+    (
+        "ALTER TABLE IF EXISTS document_versions "
+        "ADD COLUMN IF NOT EXISTS change_summary TEXT"
+    ),
+    (
+        "ALTER TABLE IF EXISTS document_versions "
+        "ADD COLUMN IF NOT EXISTS file_hash VARCHAR"
+    ),
+    (
+        "ALTER TABLE IF EXISTS document_versions "
+        "ADD COLUMN IF NOT EXISTS uploaded_at TIMESTAMP"
+    ),
+    (
+        "ALTER TABLE IF EXISTS document_versions "
+        "ADD COLUMN IF NOT EXISTS effective_from TIMESTAMP"
+    ),
+    (
+        "ALTER TABLE IF EXISTS document_versions "
+        "ADD COLUMN IF NOT EXISTS effective_to TIMESTAMP"
+    ),
+    (
+        "ALTER TABLE IF EXISTS document_chunks "
+        "ADD COLUMN IF NOT EXISTS is_current BOOLEAN NOT NULL DEFAULT false"
+    ),
+    (
+        "ALTER TABLE IF EXISTS document_chunks "
+        "ADD COLUMN IF NOT EXISTS deleted BOOLEAN NOT NULL DEFAULT false"
+    ),
+    (
+        "ALTER TABLE IF EXISTS document_chunks "
+        "ADD COLUMN IF NOT EXISTS content TEXT"
+    ),
+    (
+        "ALTER TABLE IF EXISTS document_chunks "
+        "ADD COLUMN IF NOT EXISTS chunk_index INTEGER NOT NULL DEFAULT 0"
+    ),
+    (
+        "ALTER TABLE IF EXISTS document_chunks "
+        "ADD COLUMN IF NOT EXISTS section VARCHAR"
+    ),
+    (
+        "ALTER TABLE IF EXISTS document_chunks "
+        "ADD COLUMN IF NOT EXISTS created_at TIMESTAMP"
+    ),
+)
+
+
+def _m001_baseline(connection: Connection) -> None:
+    # Crea las tablas de app.models que falten (instalaciones nuevas).
+    Base.metadata.create_all(bind=connection)
+    for statement in _LEGACY_STATEMENTS:
+        connection.execute(text(statement))
+
+
+def _m002_secondary_indexes(connection: Connection) -> None:
+    # Filtros frecuentes: chunks/versiones vigentes por documento y hash duplicado.
+    connection.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_document_chunks_document_current "
+        "ON document_chunks (document_id, is_current)"
+    ))
+    connection.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_document_versions_document_current "
+        "ON document_versions (document_id, is_current)"
+    ))
+    connection.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_document_versions_document_hash "
+        "ON document_versions (document_id, file_hash)"
+    ))
+
+
+def _m003_chunk_full_text(connection: Connection) -> None:
+    # Columna generada: cada INSERT/COPY de chunks la calcula sin cambios en la ingesta.
+    # Reescribe la tabla una vez; en corpus grandes conviene aplicarla fuera de horario.
+    connection.execute(text(
+        "ALTER TABLE document_chunks ADD COLUMN IF NOT EXISTS content_tsv tsvector "
+        f"GENERATED ALWAYS AS (to_tsvector('{TEXT_SEARCH_CONFIG}', content)) STORED"
+    ))
+    # Parcial: la búsqueda léxica solo consulta chunks vigentes.
+    connection.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_document_chunks_content_tsv "
+        "ON document_chunks USING GIN (content_tsv) "
+        "WHERE is_current AND NOT deleted"
+    ))
+
+
+def _m004_corpus_state(connection: Connection) -> None:
+    # Contador de generación del corpus que invalida el caché de respuestas.
+    Base.metadata.create_all(bind=connection, tables=[CorpusState.__table__])
+    connection.execute(text(
+        "INSERT INTO corpus_state (id, generation, updated_at) "
+        "VALUES (1, 0, now()) ON CONFLICT (id) DO NOTHING"
+    ))
+
+
+def _m005_chunk_position_index(connection: Connection) -> None:
+    # Búsqueda de chunks vecinos: (documento, versión, rango de chunk_index).
+    connection.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_document_chunks_document_version_index "
+        "ON document_chunks (document_id, version_id, chunk_index)"
+    ))
+
+
+def _m006_job_lease(connection: Connection) -> None:
+    # Dueño del job en ejecución; una réplica solo retoma jobs con latido vencido.
+    connection.execute(text(
+        "ALTER TABLE ingestion_jobs ADD COLUMN IF NOT EXISTS owner VARCHAR"
+    ))
+    connection.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_ingestion_jobs_status_updated "
+        "ON ingestion_jobs (status, updated_at)"
+    ))
+
+
+# Solo se agregan migraciones al final; nunca se edita una ya publicada.
+MIGRATIONS: list[tuple[int, str, Callable[[Connection], None]]] = [
+    (1, "Esquema base y columnas legadas", _m001_baseline),
+    (2, "Índices secundarios de chunks y versiones", _m002_secondary_indexes),
+    (3, "Búsqueda full-text sobre chunks", _m003_chunk_full_text),
+    (4, "Generación del corpus para el caché de respuestas", _m004_corpus_state),
+    (5, "Índice de posición de chunks", _m005_chunk_position_index),
+    (6, "Lease de jobs de ingesta", _m006_job_lease),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def _current_version(connection: Connection) -> int:
+    exists = connection.execute(text("SELECT to_regclass('schema_version')")).scalar()
+    if exists is None:
+        return 0
+    return connection.execute(text("SELECT COALESCE(MAX(version), 0) FROM schema_version")).scalar()
+
+
+def run_migrations(engine: Engine) -> int:
+    with engine.connect() as connection:
+        current = _current_version(connection)
+        connection.commit()
+        if current >= LATEST_VERSION:
+            logger.info("✅ Esquema al día (versión %s)", current)
+            return current
+
+        # Lock de sesión: se mantiene entre las transacciones de cada migración.
+        connection.execute(text("SELECT pg_advisory_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+        connection.commit()
+        try:
+            connection.execute(text(
+                "CREATE TABLE IF NOT EXISTS schema_version ("
+                "version INTEGER PRIMARY KEY, "
+                "description TEXT NOT NULL, "
+                "applied_at TIMESTAMP NOT NULL)"
+            ))
+            connection.commit()
+
+            # Otra réplica pudo aplicar migraciones mientras se esperaba el lock.
+            current = _current_version(connection)
+            for version, description, migrate in MIGRATIONS:
+                if version <= current:
+                    continue
+                logger.info("🛠️ Aplicando migración %s: %s", version, description)
+                # Cada migración y su registro se confirman juntos.
+                migrate(connection)
+                connection.execute(
+                    text(
+                        "INSERT INTO schema_version (version, description, applied_at) "
+                        "VALUES (:version, :description, :applied_at)"
+                    ),
+                    {"version": version, "description": description, "applied_at": datetime.utcnow()},
+                )
+                connection.commit()
+                current = version
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": MIGRATION_LOCK_KEY})
+            connection.commit()
+
+    logger.info("✅ Esquema migrado a la versión %s", current)
+    return current
+
+
+if __name__ == "__main__":
+    from app.db import engine
+
+    run_migrations(engine)
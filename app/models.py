@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, DateTime, Integer, String, Text
+from sqlalchemy import BigInteger, Boolean, Column, DateTime, Float, Index, Integer, LargeBinary, String, Text
 
 from app.db import Base
 
@@ -30,6 +30,10 @@ class Document(Base):
 
 class DocumentVersion(Base):
     __tablename__ = "document_versions"
+    __table_args__ = (
+        Index("ix_document_versions_document_current", "document_id", "is_current"),
+        Index("ix_document_versions_document_hash", "document_id", "file_hash"),
+    )
 
     version_id = Column(String, primary_key=True)
     document_id = Column(String, nullable=False)
@@ -49,6 +53,10 @@ class DocumentVersion(Base):
 
 class DocumentChunk(Base):
     __tablename__ = "document_chunks"
+    __table_args__ = (
+        Index("ix_document_chunks_document_current", "document_id", "is_current"),
+        Index("ix_document_chunks_document_version_index", "document_id", "version_id", "chunk_index"),
+    )
 
     chunk_id = Column(String, primary_key=True)
     document_id = Column(String, nullable=False)
@@ -70,3 +78,48 @@ class DocumentAudit(Base):
     version = Column(String)
     user = Column(String)
     created_at = Column(DateTime, nullable=False)
+
+
+class IngestionJob(Base):
+    __tablename__ = "ingestion_jobs"
+
+    job_id = Column(String, primary_key=True)
+    kind = Column(String, nullable=False)
+    status = Column(String, nullable=False)
+    stage = Column(String)
+    progress = Column(Float, nullable=False, default=0)
+    document_id = Column(String, nullable=False)
+    version_id = Column(String, nullable=False)
+    version = Column(String)
+    filename = Column(String, nullable=False)
+    file_path = Column(String, nullable=False)
+    file_size = Column(Integer, nullable=False, default=0)
+    file_hash = Column(String, nullable=False)
+    params = Column(Text)
+    result = Column(Text)
+    error = Column(Text)
+    attempts = Column(Integer, nullable=False, default=0)
+    # Réplica que ejecuta el job; updated_at es su latido (lease).
+    owner = Column(String)
+    created_at = Column(DateTime, nullable=False)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+    updated_at = Column(DateTime)
+
+
+class EmbeddingCacheEntry(Base):
+    __tablename__ = "embedding_cache"
+
+    content_hash = Column(String, primary_key=True)
+    model = Column(String, primary_key=True)
+    embedding = Column(LargeBinary, nullable=False)
+    created_at = Column(DateTime, nullable=False)
+
+
+class CorpusState(Base):
+    # Fila única (id=1): la generación sube con cada cambio del corpus indexado.
+    __tablename__ = "corpus_state"
+
+    id = Column(Integer, primary_key=True)
+    generation = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime)
@@ -0,0 +1,32 @@
+from fastapi import APIRouter, HTTPException
+
+from app.config import ANSWER_CACHE_ENABLED, logger
+from app.services.answer_cache import answer_cache_stats, purge_answer_cache
+from app.services.intent_classifier import build_centroids
+
+router = APIRouter()
+
+
+@router.post("/admin/intent/rebuild")
+def rebuild_intent_centroids():
+    try:
+        return build_centroids()
+    except Exception as exc:
+        logger.error("❌ Error reconstruyendo centroides", exc_info=exc)
+        raise HTTPException(500, "Error reconstruyendo centroides de intención")
+
+
+@router.get("/admin/answer-cache")
+async def answer_cache_status():
+    return await answer_cache_stats()
+
+
+@router.post("/admin/answer-cache/purge")
+async def purge_answers():
+    if not ANSWER_CACHE_ENABLED:
+        raise HTTPException(400, "El caché de respuestas está deshabilitado")
+    try:
+        return await purge_answer_cache()
+    except Exception as exc:
+        logger.error("❌ Error purgando el caché de respuestas", exc_info=exc)
+        raise HTTPException(500, "Error purgando el caché de respuestas")
@@ -1,29 +1,294 @@
-from fastapi import APIRouter
+import asyncio
+import json
 
-from app.config import logger
-from app.schemas import AskRequest
-from app.services.openai_service import route_intent
-from app.services.rag import ask_rag, preview_rag_hits
+from fastapi import APIRouter, HTTPException, Response
+from fastapi.responses import StreamingResponse
+
+from app.config import (
+    ANSWER_CACHE_ENABLED,
+    ASK_BATCH_CONCURRENCY,
+    ASK_BATCH_MAX_QUESTIONS,
+    ASK_PARALLEL_RETRIEVAL,
+    logger,
+)
+from app.schemas import AskBatchRequest, AskRequest, RouteDecision
+from app.services.answer_cache import lookup_answer, lookup_answers, store_answer
+from app.services.intent_classifier import intent_classifier_ready, route_question
+from app.services.metrics import ASK_STAGE_SECONDS
+from app.services.openai_service import embed_queries, embed_query, route_intent
+from app.services.rag import (
+    RetrievalContext,
+    ask_rag,
+    build_retrieval_context,
+    build_retrieval_contexts,
+    preview_rag_hits,
+    stream_rag_answer,
+)
+from app.services.timing import StageTimer
 
 router = APIRouter()
 
 
 @router.post("/ask")
-def ask(payload: AskRequest):
-    decision = route_intent(payload.question)
+async def ask(payload: AskRequest, response: Response):
+    timer = StageTimer(ASK_STAGE_SECONDS, endpoint="ask")
+    try:
+        with timer.stage("total"):
+            query_vector, generation, cached, route_task = await _lookup_cached_answer(payload, timer)
+            if ANSWER_CACHE_ENABLED:
+                response.headers["X-Answer-Cache"] = "hit" if cached else "miss"
+            if cached is not None:
+                return cached
+            return await _answer(payload, timer, query_vector, generation, route_task)
+    finally:
+        response.headers["Server-Timing"] = timer.server_timing()
+        logger.info("⏱️ /ask %s", timer.summary())
+
+
+@router.post("/ask/stream")
+async def ask_stream(payload: AskRequest):
+    # Variante SSE de /ask: evento "sources", eventos "token" y "done".
+    timer = StageTimer(ASK_STAGE_SECONDS, endpoint="ask_stream")
+    query_vector, generation, cached, route_task = await _lookup_cached_answer(payload, timer)
+    if cached is None:
+        decision, retrieval = await _route_and_retrieve(payload, timer, query_vector, route_task)
+        use_rag = _should_use_rag(decision, retrieval)
+
+    async def events():
+        try:
+            if cached is not None:
+                yield _sse("sources", {"sources": cached["sources"]})
+                yield _sse("token", {"text": cached["answer"]})
+                yield _sse("done", {"answer": cached["answer"]})
+            elif use_rag:
+                sources = []
+                async for event, data in stream_rag_answer(payload, retrieval, timer):
+                    if event == "sources":
+                        sources = data["sources"]
+                    elif event == "done":
+                        await store_answer(
+                            payload.question,
+                            retrieval.query_vector,
+                            payload.top_k,
+                            generation,
+                            {"answer": data["answer"], "sources": sources},
+                        )
+                    yield _sse(event, data)
+            else:
+                answer = _specialist_placeholder(decision)
+                yield _sse("sources", {"sources": []})
+                yield _sse("token", {"text": answer})
+                yield _sse("done", {"answer": answer})
+        except HTTPException as exc:
+            yield _sse("error", {"detail": exc.detail})
+        finally:
+            timer.record("total", timer.elapsed())
+            logger.info("⏱️ /ask/stream %s", timer.summary())
+
+    headers = {
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    }
+    if ANSWER_CACHE_ENABLED:
+        headers["X-Answer-Cache"] = "hit" if cached else "miss"
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers=headers,
+    )
+
+
+@router.post("/ask/batch")
+async def ask_batch(payload: AskBatchRequest):
+    # Muchas preguntas en un request: embeddings y búsqueda en lote, respuestas
+    # generadas a la vez (hasta ASK_BATCH_CONCURRENCY) y entregadas como NDJSON
+    # en el orden en que terminan; "index" es la posición en la lista enviada.
+    if not payload.questions:
+        raise HTTPException(status_code=400, detail="Debe enviar al menos una pregunta")
+    if len(payload.questions) > ASK_BATCH_MAX_QUESTIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Máximo {ASK_BATCH_MAX_QUESTIONS} preguntas por request",
+        )
+
+    timer = StageTimer(ASK_STAGE_SECONDS, endpoint="ask_batch")
+    questions = payload.questions
+    with timer.stage("embed"):
+        query_vectors = await embed_queries(questions)
+
+    generation, cached = None, [None] * len(questions)
+    if ANSWER_CACHE_ENABLED:
+        with timer.stage("cache"):
+            generation, cached = await lookup_answers(query_vectors, payload.top_k)
+
+    pending = [idx for idx, entry in enumerate(cached) if entry is None]
+    retrievals = await build_retrieval_contexts(
+        [questions[idx] for idx in pending],
+        payload.top_k,
+        timer,
+        [query_vectors[idx] for idx in pending],
+    )
+    semaphore = asyncio.Semaphore(ASK_BATCH_CONCURRENCY)
+
+    async def answer(idx: int, retrieval: RetrievalContext) -> dict:
+        question = questions[idx]
+        async with semaphore:
+            try:
+                if intent_classifier_ready():
+                    decision = await route_question(question, retrieval.query_vector)
+                else:
+                    decision = await route_intent(question)
+                if _should_use_rag(decision, retrieval):
+                    result = await ask_rag(
+                        AskRequest(question=question, top_k=payload.top_k),
+                        retrieval,
+                        StageTimer(ASK_STAGE_SECONDS, endpoint="ask_batch"),
+                    )
+                    await store_answer(question, retrieval.query_vector, payload.top_k, generation, result)
+                else:
+                    result = {"answer": _specialist_placeholder(decision), "sources": []}
+            except HTTPException as exc:
+                return {"index": idx, "question": question, "error": exc.detail}
+            except Exception as exc:
+                logger.error("❌ Error respondiendo pregunta %s del lote", idx, exc_info=exc)
+                return {"index": idx, "question": question, "error": "Error generando respuesta IA"}
+        return {"index": idx, "question": question, **result, "cached": False}
+
+    async def results():
+        tasks = [asyncio.create_task(answer(idx, retrieval)) for idx, retrieval in zip(pending, retrievals)]
+        try:
+            for idx, entry in enumerate(cached):
+                if entry is not None:
+                    yield _ndjson({"index": idx, "question": questions[idx], **entry, "cached": True})
+            # "generate" se mide por pregunta; aquí, el tiempo hasta la última respuesta.
+            with timer.stage("answers"):
+                for task in asyncio.as_completed(tasks):
+                    yield _ndjson(await task)
+        finally:
+            # Si el cliente se desconecta no se siguen generando respuestas.
+            for task in tasks:
+                task.cancel()
+            timer.record("total", timer.elapsed())
+            logger.info("⏱️ /ask/batch (%s preguntas) %s", len(questions), timer.summary())
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+
+def _ndjson(data: dict) -> str:
+    return json.dumps(data, ensure_ascii=False) + "\n"
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def _lookup_cached_answer(
+    payload: AskRequest,
+    timer: StageTimer,
+) -> tuple[list[float] | None, int | None, dict | None, asyncio.Task | None]:
+    # (vector de la pregunta, generación del corpus, respuesta en caché o None,
+    # router LLM en curso o None). El vector se reutiliza luego en retrieval si
+    # no hay hit.
+    if not ANSWER_CACHE_ENABLED:
+        return None, None, None, None
+    # El router LLM no necesita el embedding: corre mientras se consulta el
+    # caché y se cancela si hay hit. El clasificador local sí lo necesita.
+    route_task = None
+    if not intent_classifier_ready():
+        route_task = asyncio.create_task(_route(payload, timer))
+    try:
+        with timer.stage("embed"):
+            query_vector = await embed_query(payload.question)
+        with timer.stage("cache"):
+            generation, cached = await lookup_answer(query_vector, payload.top_k)
+    except BaseException:
+        if route_task is not None:
+            route_task.cancel()
+        raise
+    if cached is not None and route_task is not None:
+        route_task.cancel()
+        route_task = None
+    return query_vector, generation, cached, route_task
+
+
+async def _route(
+    payload: AskRequest,
+    timer: StageTimer,
+    route_task: asyncio.Task | None = None,
+) -> RouteDecision:
+    if route_task is not None:
+        return await route_task
+    with timer.stage("route"):
+        return await route_intent(payload.question)
+
+
+async def _route_and_retrieve(
+    payload: AskRequest,
+    timer: StageTimer,
+    query_vector: list[float] | None = None,
+    route_task: asyncio.Task | None = None,
+) -> tuple[RouteDecision, RetrievalContext]:
+    if intent_classifier_ready():
+        if route_task is not None:
+            # El clasificador terminó de cargar después de lanzar el router LLM.
+            route_task.cancel()
+        # El clasificador local reutiliza el vector ya calculado para retrieval.
+        retrieval = await build_retrieval_context(payload.question, payload.top_k, timer, query_vector)
+        with timer.stage("route"):
+            decision = await route_question(payload.question, retrieval.query_vector)
+    elif ASK_PARALLEL_RETRIEVAL:
+        # Retrieval especulativo: corre mientras el router LLM clasifica la pregunta.
+        retrieval_task = asyncio.create_task(
+            build_retrieval_context(payload.question, payload.top_k, timer, query_vector)
+        )
+        try:
+            decision = await _route(payload, timer, route_task)
+        except BaseException:
+            retrieval_task.cancel()
+            raise
+        retrieval = await retrieval_task
+    else:
+        decision = await _route(payload, timer, route_task)
+        # Embedding y búsqueda una sola vez; se reutilizan en todo el flujo.
+        retrieval = await build_retrieval_context(payload.question, payload.top_k, timer, query_vector)
+
     logger.info("🧭 Ruta detectada: %s (%s)", decision.route, decision.confidence)
+    return decision, retrieval
+
 
+def _should_use_rag(decision: RouteDecision, retrieval: RetrievalContext) -> bool:
     if decision.route == "rag":
-        return ask_rag(payload)
+        return True
 
-    if preview_rag_hits(payload.question):
+    if preview_rag_hits(retrieval):
         logger.info("📚 Forzando RAG por evidencia documental")
-        return ask_rag(payload)
+        return True
+
+    return False
+
+
+def _specialist_placeholder(decision: RouteDecision) -> str:
+    return (
+        f"Esta consulta fue clasificada como '{decision.route}'. "
+        "La respuesta por agente especialista está en implementación."
+    )
+
+
+async def _answer(
+    payload: AskRequest,
+    timer: StageTimer,
+    query_vector: list[float] | None = None,
+    generation: int | None = None,
+    route_task: asyncio.Task | None = None,
+):
+    decision, retrieval = await _route_and_retrieve(payload, timer, query_vector, route_task)
+
+    if _should_use_rag(decision, retrieval):
+        result = await ask_rag(payload, retrieval, timer)
+        await store_answer(payload.question, retrieval.query_vector, payload.top_k, generation, result)
+        return result
 
     return {
-        "answer": (
-            f"Esta consulta fue clasificada como '{decision.route}'. "
-            "La respuesta por agente especialista está en implementación."
-        ),
+        "answer": _specialist_placeholder(decision),
         "sources": [],
     }
@@ -0,0 +1,23 @@
+from fastapi import APIRouter, HTTPException, Query
+
+from app.services.tracing import get_trace, recent_traces
+
+router = APIRouter()
+
+
+@router.get("/debug/traces")
+async def list_traces(
+    limit: int = Query(50, ge=1, le=500),
+    min_duration_ms: float = Query(0.0, ge=0),
+    name: str | None = None,
+):
+    # Traces muestreados más recientes primero; name filtra por "GET /api/..." o "ingest.*".
+    return {"traces": recent_traces(limit, min_duration_ms, name)}
+
+
+@router.get("/debug/traces/{trace_id}")
+async def trace_detail(trace_id: str):
+    trace = get_trace(trace_id)
+    if trace is None:
+        raise HTTPException(404, "Trace no encontrado")
+    return trace
@@ -1,34 +1,97 @@
+import hashlib
+import json
 import os
 
-from fastapi import APIRouter, File, Form, HTTPException, UploadFile
+from fastapi import APIRouter, Depends, File, Form, HTTPException, Query, Request, Response, UploadFile
 from fastapi.responses import FileResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.db import SessionLocal
+from app.config import DOCUMENTS_MAX_PAGE_SIZE, DOCUMENTS_PAGE_SIZE
+from app.db import get_db
 from app.models import DocumentVersion
 from app.schemas import DocumentUpdate
 from app.services.documents import (
-    create_document_version,
+    count_documents,
     delete_document as remove_document,
     delete_document_version,
     get_document_detail,
-    index_document,
     list_documents,
     update_document_metadata,
 )
+from app.services.jobs import submit_index_job, submit_version_job
 
 router = APIRouter()
 
 
-@router.get("/documents")
-def list_documents_route():
-    db = SessionLocal()
-    try:
-        return list_documents(db)
-    finally:
-        db.close()
+def _conditional_json(request: Request, payload: dict) -> Response:
+    # ETag del contenido: si el cliente ya tiene esta página, 304 sin cuerpo.
+    body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    etag = f'W/"{hashlib.sha256(body).hexdigest()[:32]}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+
+    if_none_match = request.headers.get("if-none-match", "")
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    if "*" in candidates or etag.removeprefix("W/") in candidates:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
 
 
-@router.post("/documents/upload")
+@router.get("/documents")
+async def list_documents_route(
+    request: Request,
+    limit: int = Query(DOCUMENTS_PAGE_SIZE, ge=1, le=DOCUMENTS_MAX_PAGE_SIZE),
+    cursor: str | None = None,
+    sort: str = "created_at",
+    order: str = "desc",
+    category: str | None = None,
+    department: str | None = None,
+    status: str | None = None,
+    type: str | None = None,
+    tags: str | None = None,
+    q: str | None = None,
+    db: AsyncSession = Depends(get_db),
+):
+    page = await list_documents(
+        db,
+        limit=limit,
+        cursor=cursor,
+        sort=sort,
+        order=order,
+        category=category,
+        department=department,
+        status=status,
+        file_type=type,
+        tags=tags,
+        q=q,
+    )
+    return _conditional_json(request, page)
+
+
+@router.get("/documents/count")
+async def count_documents_route(
+    request: Request,
+    category: str | None = None,
+    department: str | None = None,
+    status: str | None = None,
+    type: str | None = None,
+    tags: str | None = None,
+    q: str | None = None,
+    db: AsyncSession = Depends(get_db),
+):
+    result = await count_documents(
+        db,
+        category=category,
+        department=department,
+        status=status,
+        file_type=type,
+        tags=tags,
+        q=q,
+    )
+    return _conditional_json(request, result)
+
+
+@router.post("/documents/upload", status_code=202)
 async def upload_document(
     file: UploadFile = File(...),
     title: str | None = Form(None),
@@ -42,10 +105,11 @@ async def upload_document(
     indexable: str | None = Form(None),
     version: str = Form("1.0"),
     change_summary: str | None = Form(None),
+    db: AsyncSession = Depends(get_db),
 ):
-    db = SessionLocal()
     try:
-        return await index_document(
+        # Se persiste el archivo y la ingesta corre en un worker de fondo.
+        return await submit_index_job(
             file=file,
             db=db,
             title=title,
@@ -61,75 +125,62 @@ async def upload_document(
             change_summary=change_summary,
         )
     except HTTPException:
-        db.rollback()
         raise
     except Exception as exc:
-        db.rollback()
         raise HTTPException(500, str(exc))
-    finally:
-        db.close()
 
 
 @router.get("/documents/{document_id}")
-def document_detail(document_id: str):
-    db = SessionLocal()
-    try:
-        return get_document_detail(document_id, db)
-    finally:
-        db.close()
+async def document_detail(document_id: str, db: AsyncSession = Depends(get_db)):
+    return await get_document_detail(document_id, db)
 
 
 @router.get("/documents/{document_id}/download")
-def download_document(document_id: str):
-    db = SessionLocal()
-    try:
-        document = get_document_detail(document_id, db)
-        version = (
-            db.query(DocumentVersion)
-            .filter(
-                DocumentVersion.document_id == document_id,
-                DocumentVersion.is_current.is_(True),
-                DocumentVersion.deleted.is_(False),
-            )
-            .first()
-        )
-        if not version or not version.file_path:
-            raise HTTPException(404, "Archivo no encontrado")
-        if not os.path.exists(version.file_path):
-            raise HTTPException(404, "Archivo no encontrado")
-        return FileResponse(
-            version.file_path,
-            filename=version.filename or document.get("filename") or "documento.pdf",
+async def download_document(document_id: str, db: AsyncSession = Depends(get_db)):
+    document = await get_document_detail(document_id, db)
+    version = await db.scalar(
+        select(DocumentVersion)
+        .where(
+            DocumentVersion.document_id == document_id,
+            DocumentVersion.is_current.is_(True),
+            DocumentVersion.deleted.is_(False),
         )
-    finally:
-        db.close()
+        .limit(1)
+    )
+    if not version or not version.file_path:
+        raise HTTPException(404, "Archivo no encontrado")
+    if not os.path.exists(version.file_path):
+        raise HTTPException(404, "Archivo no encontrado")
+    return FileResponse(
+        version.file_path,
+        filename=version.filename or document.get("filename") or "documento.pdf",
+    )
 
 
 @router.put("/documents/{document_id}")
-def update_document(document_id: str, payload: DocumentUpdate):
-    db = SessionLocal()
+async def update_document(
+    document_id: str,
+    payload: DocumentUpdate,
+    db: AsyncSession = Depends(get_db),
+):
     try:
-        return update_document_metadata(document_id, payload, db)
+        return await update_document_metadata(document_id, payload, db)
     except HTTPException:
-        db.rollback()
         raise
     except Exception as exc:
-        db.rollback()
         raise HTTPException(500, str(exc))
-    finally:
-        db.close()
 
 
-@router.post("/documents/{document_id}/versions")
+@router.post("/documents/{document_id}/versions", status_code=202)
 async def add_document_version(
     document_id: str,
     file: UploadFile = File(...),
     version: str = Form(...),
     change_summary: str | None = Form(None),
+    db: AsyncSession = Depends(get_db),
 ):
-    db = SessionLocal()
     try:
-        return await create_document_version(
+        return await submit_version_job(
             document_id=document_id,
             file=file,
             db=db,
@@ -137,40 +188,26 @@ async def add_document_version(
             change_summary=change_summary,
         )
     except HTTPException:
-        db.rollback()
         raise
     except Exception as exc:
-        db.rollback()
         raise HTTPException(500, str(exc))
-    finally:
-        db.close()
 
 
 @router.delete("/documents/{document_id}")
-def delete_document(document_id: str):
-    db = SessionLocal()
+async def delete_document(document_id: str, db: AsyncSession = Depends(get_db)):
     try:
-        return remove_document(document_id, db)
+        return await remove_document(document_id, db)
     except HTTPException:
-        db.rollback()
         raise
     except Exception as exc:
-        db.rollback()
         raise HTTPException(500, str(exc))
-    finally:
-        db.close()
 
 
 @router.delete("/documents/{document_id}/versions/{version}")
-def delete_version(document_id: str, version: str):
-    db = SessionLocal()
+async def delete_version(document_id: str, version: str, db: AsyncSession = Depends(get_db)):
     try:
-        return delete_document_version(document_id, version, db)
+        return await delete_document_version(document_id, version, db)
     except HTTPException:
-        db.rollback()
         raise
     except Exception as exc:
-        db.rollback()
         raise HTTPException(500, str(exc))
-    finally:
-        db.close()
@@ -0,0 +1,12 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db import get_db
+from app.services.jobs import get_job
+
+router = APIRouter()
+
+
+@router.get("/jobs/{job_id}")
+async def job_status(job_id: str, db: AsyncSession = Depends(get_db)):
+    return await get_job(job_id, db)
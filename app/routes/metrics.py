@@ -0,0 +1,64 @@
+from anyio import to_thread
+from fastapi import APIRouter, Response
+
+from app.config import EMBEDDING_CONCURRENCY
+from app.db import async_engine, engine
+from app.services.answer_cache import answer_cache_counters
+from app.services.metrics import EMBEDDING_THREADS_BUSY, REGISTRY, counter, gauge
+
+router = APIRouter()
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_ENGINES = {"async": async_engine.sync_engine, "sync": engine}
+
+
+def _pool_values(method: str) -> dict[tuple, float]:
+    # NullPool/StaticPool (SQLite) no llevan cuenta de conexiones: se omiten.
+    values = {}
+    for name, current in _ENGINES.items():
+        reader = getattr(current.pool, method, None)
+        if callable(reader):
+            values[(name,)] = reader()
+    return values
+
+
+def _threadpool_busy() -> dict[tuple, float]:
+    # Threadpool de Starlette/anyio: dependencias y rutas sync, run_in_threadpool.
+    limiter = to_thread.current_default_thread_limiter()
+    return {
+        ("starlette",): limiter.borrowed_tokens,
+        ("embeddings",): EMBEDDING_THREADS_BUSY.value(),
+    }
+
+
+def _threadpool_limit() -> dict[tuple, float]:
+    limiter = to_thread.current_default_thread_limiter()
+    return {
+        ("starlette",): limiter.total_tokens,
+        ("embeddings",): EMBEDDING_CONCURRENCY,
+    }
+
+
+def _answer_cache_events() -> dict[tuple, float]:
+    counters = answer_cache_counters()
+    return {
+        ("hit",): counters["hits"],
+        ("miss",): counters["misses"],
+        ("store",): counters["stores"],
+        ("error",): counters["errors"],
+    }
+
+
+gauge("apex_db_pool_size", "Conexiones fijas del pool de la base.", ("engine",), lambda: _pool_values("size"))
+gauge("apex_db_pool_checked_out", "Conexiones del pool en uso.", ("engine",), lambda: _pool_values("checkedout"))
+gauge("apex_db_pool_idle", "Conexiones abiertas libres en el pool.", ("engine",), lambda: _pool_values("checkedin"))
+gauge("apex_threadpool_busy", "Threads ocupados por pool.", ("pool",), _threadpool_busy)
+gauge("apex_threadpool_limit", "Threads disponibles por pool.", ("pool",), _threadpool_limit)
+counter("apex_answer_cache_events_total", "Consultas y escrituras del caché de respuestas.", ("result",), _answer_cache_events)
+
+
+@router.get("/metrics")
+async def metrics():
+    # Formato de texto de Prometheus; el scrape corre en el event loop (anyio).
+    return Response(REGISTRY.render(), media_type=PROMETHEUS_CONTENT_TYPE)
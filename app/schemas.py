@@ -6,6 +6,11 @@ class AskRequest(BaseModel):
     top_k: int = 5
 
 
+class AskBatchRequest(BaseModel):
+    questions: list[str]
+    top_k: int = 5
+
+
 class RouteDecision(BaseModel):
     route: str
     confidence: float
@@ -15,7 +20,9 @@ class AskSource(BaseModel):
     document_id: str | None
     filename: str | None
     chunk_index: int | None
-    score: float
+    chunk_indexes: list[int] | None = None
+    # Similitud coseno del mejor chunk; None si la fuente llegó solo por búsqueda léxica.
+    score: float | None
 
 
 class AskResponse(BaseModel):
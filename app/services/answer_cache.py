@@ -0,0 +1,208 @@
+import time
+import uuid
+from datetime import datetime
+
+from qdrant_client.models import (
+    FieldCondition,
+    Filter,
+    FilterSelector,
+    MatchValue,
+    PointStruct,
+    Range,
+    ScoredPoint,
+    SearchRequest,
+)
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import (
+    ANSWER_CACHE_COLLECTION,
+    ANSWER_CACHE_ENABLED,
+    ANSWER_CACHE_SIMILARITY,
+    ANSWER_CACHE_TTL,
+    logger,
+)
+from app.db import AsyncSessionLocal
+from app.models import CorpusState
+from app.services.embeddings import embedding_signature
+from app.services.openai_service import _normalize_query
+from app.state import state
+
+# Espacio de nombres de los IDs de entrada: la misma pregunta normalizada se sobrescribe.
+ANSWER_ID_NAMESPACE = uuid.UUID("0b7d3c1e-8a4f-5e62-b9d1-4c3f2a7e6d58")
+
+# Entradas vencidas o de generaciones anteriores se borran como mucho una vez por hora.
+_PRUNE_INTERVAL = 3600.0
+
+_stats = {"hits": 0, "misses": 0, "stores": 0, "errors": 0}
+_last_prune: tuple[int, float] | None = None
+
+
+async def get_corpus_generation() -> int:
+    async with AsyncSessionLocal() as db:
+        generation = await db.scalar(select(CorpusState.generation).where(CorpusState.id == 1))
+    return generation or 0
+
+
+async def bump_corpus_generation(db: AsyncSession) -> None:
+    # En la transacción del cambio: la nueva generación se confirma junto con él.
+    # La fila queda bloqueada hasta el commit, por eso se llama justo antes.
+    now = datetime.utcnow()
+    result = await db.execute(
+        update(CorpusState)
+        .where(CorpusState.id == 1)
+        .values(generation=CorpusState.generation + 1, updated_at=now)
+    )
+    if not result.rowcount:
+        db.add(CorpusState(id=1, generation=1, updated_at=now))
+
+
+def _entry_filter(generation: int, top_k: int) -> Filter:
+    return Filter(must=[
+        FieldCondition(key="generation", match=MatchValue(value=generation)),
+        FieldCondition(key="top_k", match=MatchValue(value=top_k)),
+        FieldCondition(key="signature", match=MatchValue(value=embedding_signature())),
+        FieldCondition(key="created_at", range=Range(gte=time.time() - ANSWER_CACHE_TTL)),
+    ])
+
+
+async def lookup_answer(query_vector: list[float], top_k: int) -> tuple[int | None, dict | None]:
+    # Devuelve (generación vigente, respuesta en caché o None). Un fallo del
+    # caché nunca falla la pregunta: se responde como si fuera un miss.
+    try:
+        generation = await get_corpus_generation()
+        hits = await state.qdrant.search(
+            collection_name=ANSWER_CACHE_COLLECTION,
+            query_vector=query_vector,
+            query_filter=_entry_filter(generation, top_k),
+            score_threshold=ANSWER_CACHE_SIMILARITY,
+            limit=1,
+            with_payload=True,
+        )
+    except Exception as exc:
+        _stats["errors"] += 1
+        logger.warning("⚠️ Caché de respuestas no disponible: %s", exc)
+        return None, None
+
+    if not hits:
+        _stats["misses"] += 1
+        return generation, None
+
+    _stats["hits"] += 1
+    logger.info("💾 Respuesta desde caché (similitud %.3f)", hits[0].score)
+    return generation, _cached_answer(hits[0])
+
+
+async def lookup_answers(
+    query_vectors: list[list[float]],
+    top_k: int,
+) -> tuple[int | None, list[dict | None]]:
+    # Versión en lote de lookup_answer: una lectura de la generación y un search_batch.
+    try:
+        generation = await get_corpus_generation()
+        results = await state.qdrant.search_batch(
+            collection_name=ANSWER_CACHE_COLLECTION,
+            requests=[
+                SearchRequest(
+                    vector=query_vector,
+                    filter=_entry_filter(generation, top_k),
+                    score_threshold=ANSWER_CACHE_SIMILARITY,
+                    limit=1,
+                    with_payload=True,
+                )
+                for query_vector in query_vectors
+            ],
+        )
+    except Exception as exc:
+        _stats["errors"] += 1
+        logger.warning("⚠️ Caché de respuestas no disponible: %s", exc)
+        return None, [None] * len(query_vectors)
+
+    cached = [_cached_answer(hits[0]) if hits else None for hits in results]
+    found = sum(entry is not None for entry in cached)
+    _stats["hits"] += found
+    _stats["misses"] += len(cached) - found
+    return generation, cached
+
+
+def _cached_answer(hit: ScoredPoint) -> dict:
+    return {"answer": hit.payload["answer"], "sources": hit.payload["sources"]}
+
+
+async def store_answer(
+    question: str,
+    query_vector: list[float],
+    top_k: int,
+    generation: int | None,
+    result: dict,
+) -> None:
+    # Se guarda con la generación leída antes de recuperar: si el corpus cambió
+    # mientras se generaba, la entrada ya nace vencida.
+    if generation is None or not result.get("sources"):
+        return
+    try:
+        await _prune(generation)
+        await state.qdrant.upsert(
+            collection_name=ANSWER_CACHE_COLLECTION,
+            points=[PointStruct(
+                id=str(uuid.uuid5(ANSWER_ID_NAMESPACE, f"{generation}:{top_k}:{_normalize_query(question)}")),
+                vector=query_vector,
+                payload={
+                    "question": question,
+                    "answer": result["answer"],
+                    "sources": result["sources"],
+                    "generation": generation,
+                    "top_k": top_k,
+                    "signature": embedding_signature(),
+                    "created_at": time.time(),
+                },
+            )],
+            wait=False,
+        )
+        _stats["stores"] += 1
+    except Exception as exc:
+        _stats["errors"] += 1
+        logger.warning("⚠️ No se pudo guardar la respuesta en caché: %s", exc)
+
+
+async def _prune(generation: int) -> None:
+    global _last_prune
+    now = time.monotonic()
+    if _last_prune and _last_prune[0] == generation and now - _last_prune[1] < _PRUNE_INTERVAL:
+        return
+    await state.qdrant.delete(
+        collection_name=ANSWER_CACHE_COLLECTION,
+        points_selector=FilterSelector(filter=Filter(should=[
+            FieldCondition(key="generation", range=Range(lt=generation)),
+            FieldCondition(key="created_at", range=Range(lt=time.time() - ANSWER_CACHE_TTL)),
+        ])),
+    )
+    _last_prune = (generation, now)
+
+
+def answer_cache_counters() -> dict:
+    return dict(_stats)
+
+
+async def answer_cache_stats() -> dict:
+    lookups = _stats["hits"] + _stats["misses"]
+    entries = None
+    if ANSWER_CACHE_ENABLED:
+        entries = (await state.qdrant.count(ANSWER_CACHE_COLLECTION, exact=True)).count
+    return {
+        "enabled": ANSWER_CACHE_ENABLED,
+        **_stats,
+        "hit_rate": round(_stats["hits"] / lookups, 4) if lookups else None,
+        "entries": entries,
+        "generation": await get_corpus_generation(),
+    }
+
+
+async def purge_answer_cache() -> dict:
+    deleted = (await state.qdrant.count(ANSWER_CACHE_COLLECTION, exact=True)).count
+    await state.qdrant.delete(
+        collection_name=ANSWER_CACHE_COLLECTION,
+        points_selector=FilterSelector(filter=Filter()),
+    )
+    logger.info("🧹 Caché de respuestas purgado (%s entradas)", deleted)
+    return {"deleted": deleted}
@@ -1,21 +1,43 @@
+import asyncio
+import base64
 import hashlib
 import json
 import os
+import tempfile
 import uuid
 from datetime import datetime
-from io import BytesIO
-from typing import Iterable, List, Tuple
+from typing import Awaitable, BinaryIO, Callable, Iterable, List, Tuple
 
-import openai
 from fastapi import HTTPException, UploadFile
-from PyPDF2 import PdfReader
-from qdrant_client.models import FieldCondition, Filter, MatchValue, PointStruct
-
-from app.config import EMBEDDING_MODEL, QDRANT_COLLECTION, UPLOAD_DIR, logger
+from qdrant_client.models import FieldCondition, Filter, MatchValue, PointIdsList, PointStruct
+from sqlalchemy import delete, func, insert, or_, select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import (
+    CHUNK_COPY_THRESHOLD,
+    DOCUMENTS_MAX_PAGE_SIZE,
+    DOCUMENTS_PAGE_SIZE,
+    QDRANT_COLLECTION,
+    QDRANT_UPSERT_BATCH_SIZE,
+    UPLOAD_CHUNK_SIZE,
+    UPLOAD_DIR,
+    logger,
+)
 from app.models import Document, DocumentAudit, DocumentChunk, DocumentVersion
-from app.services.text_splitter import splitter
+from app.services.answer_cache import bump_corpus_generation
+from app.services.embedding_cache import embed_with_cache
+from app.services.extraction import extract_chunks
+from app.services.metrics import INGEST_STAGE_SECONDS
+from app.services.qdrant_service import point_vector
+from app.services.tracing import span, traced
 from app.state import state
 
+# Callback de avance para jobs de ingesta: (etapa, fracción 0..1).
+ProgressCallback = Callable[[str, float], Awaitable[None]]
+
+# Espacio de nombres fijo para derivar IDs de chunk/punto con uuid5.
+CHUNK_ID_NAMESPACE = uuid.UUID("5f0c6f2e-3d1a-5b8e-9c47-2a6d8e1f4b93")
+
 
 def _compare_versions(left: str, right: str) -> int:
     # Comparación simple de versiones tipo "1.0", "2.0".
@@ -29,34 +51,12 @@ def _compare_versions(left: str, right: str) -> int:
     return 1 if left_parts > right_parts else -1
 
 
-def _extract_pdf_text(file_bytes: bytes) -> str:
-    # Extrae texto del PDF sin alterar el pipeline actual.
-    reader = PdfReader(BytesIO(file_bytes))
-    return "\n".join(p.extract_text() or "" for p in reader.pages)
-
-
-def _extract_text(file_bytes: bytes, filename: str) -> str:
-    extension = os.path.splitext(filename or "")[1].lower()
-    if extension == ".pdf":
-        return _extract_pdf_text(file_bytes)
-    if extension == ".txt":
-        return file_bytes.decode("utf-8", errors="ignore")
-    raise HTTPException(400, "Solo se aceptan PDF o TXT")
-
-
 def _build_embeddings(chunks: Iterable[str]) -> List[List[float]]:
-    # Reutiliza la generación de embeddings existente.
-    embeddings: List[List[float]] = []
-    for chunk in chunks:
-        response = openai.Embedding.create(
-            model=EMBEDDING_MODEL,
-            input=chunk,
-        )
-        embeddings.append(response["data"][0]["embedding"])
-    return embeddings
+    # Caché por contenido; lo faltante va en lotes paralelos, en el orden de los chunks.
+    return embed_with_cache(list(chunks))
 
 
-def _store_audit(db, action: str, document_id: str, version: str | None = None) -> None:
+def _store_audit(db: AsyncSession, action: str, document_id: str, version: str | None = None) -> None:
     # Auditoría obligatoria para cambios sensibles.
     db.add(DocumentAudit(
         audit_id=str(uuid.uuid4()),
@@ -67,40 +67,65 @@ def _store_audit(db, action: str, document_id: str, version: str | None = None)
     ))
 
 
-def _upsert_qdrant_points(
+def chunk_point_id(document_id: str, version_id: str, chunk_index: int) -> str:
+    # Mismo ID en document_chunks y Qdrant: reintentar una ingesta sobrescribe en lugar de duplicar.
+    return str(uuid.uuid5(CHUNK_ID_NAMESPACE, f"{document_id}:{version_id}:{chunk_index}"))
+
+
+def chunk_point_ids(document_id: str, version_id: str, count: int) -> List[str]:
+    return [chunk_point_id(document_id, version_id, idx) for idx in range(count)]
+
+
+async def _upsert_qdrant_points(
+    point_ids: List[str],
     document_id: str,
+    version_id: str,
     version: str,
     filename: str,
     chunks: List[str],
     embeddings: List[List[float]],
     metadata: dict | None = None,
 ) -> None:
-    # Persistimos embeddings para retrieval sin mezclar versiones.
-    points: List[PointStruct] = []
-    for idx, (chunk, emb) in enumerate(zip(chunks, embeddings)):
-        payload = {
-            "document_id": document_id,
-            "version": version,
-            "chunk_index": idx,
-            "filename": filename,
-            "content": chunk,
-            "is_current": True,
-            "deleted": False,
-        }
-        if metadata:
-            payload.update(metadata)
-        points.append(PointStruct(
-            id=str(uuid.uuid4()),
-            vector=emb,
-            payload=payload,
-        ))
-    state.qdrant.upsert(
-        collection_name=QDRANT_COLLECTION,
-        points=points,
-    )
+    # Persistimos embeddings para retrieval sin mezclar versiones. Los IDs son
+    # deterministas: un job reanudado sobrescribe sus puntos con el payload vigente.
+    for start in range(0, len(chunks), QDRANT_UPSERT_BATCH_SIZE):
+        points: List[PointStruct] = []
+        for idx in range(start, min(start + QDRANT_UPSERT_BATCH_SIZE, len(chunks))):
+            payload = {
+                "document_id": document_id,
+                "version_id": version_id,
+                "version": version,
+                "chunk_index": idx,
+                "filename": filename,
+                "content": chunks[idx],
+                "is_current": True,
+                "deleted": False,
+            }
+            if metadata:
+                payload.update(metadata)
+            points.append(PointStruct(
+                id=point_ids[idx],
+                vector=point_vector(embeddings[idx]),
+                payload=payload,
+            ))
+        await state.qdrant.upsert(
+            collection_name=QDRANT_COLLECTION,
+            points=points,
+            wait=True,
+        )
+
+
+async def _delete_qdrant_points(point_ids: List[str], label: str) -> None:
+    try:
+        await state.qdrant.delete(
+            collection_name=QDRANT_COLLECTION,
+            points_selector=PointIdsList(points=point_ids),
+        )
+    except Exception as cleanup_exc:
+        logger.warning("No se pudo limpiar Qdrant para %s: %s", label, cleanup_exc)
 
 
-def _update_qdrant_payload(document_id: str, version: str | None, payload: dict) -> None:
+async def _update_qdrant_payload(document_id: str, version: str | None, payload: dict) -> None:
     # Sincroniza flags de versionado en Qdrant.
     filters = [
         FieldCondition(
@@ -113,20 +138,90 @@ def _update_qdrant_payload(document_id: str, version: str | None, payload: dict)
             key="version",
             match=MatchValue(value=version),
         ))
-    state.qdrant.set_payload(
+    await state.qdrant.set_payload(
         collection_name=QDRANT_COLLECTION,
         payload=payload,
-        points_selector=Filter(must=filters),
+        points=Filter(must=filters),
+    )
+
+
+_CHUNK_COLUMNS = (
+    "chunk_id",
+    "document_id",
+    "version_id",
+    "content",
+    "chunk_index",
+    "section",
+    "is_current",
+    "deleted",
+    "created_at",
+)
+
+
+async def _copy_chunk_rows(db: AsyncSession, rows: List[dict]) -> None:
+    # Conexión de la sesión: el COPY debe quedar en la misma transacción que la versión.
+    await db.flush()
+    connection = await db.connection()
+    raw_connection = await connection.get_raw_connection()
+    driver_connection = raw_connection.driver_connection
+    if not driver_connection.is_in_transaction():
+        # El adaptador de asyncpg abre la transacción en el primer execute; sin
+        # esto el COPY haría autocommit y un rollback posterior no lo desharía.
+        await connection.exec_driver_sql("SELECT 1")
+    # COPY binario de asyncpg: sin serializar a CSV ni ambigüedad entre NULL y "".
+    await driver_connection.copy_records_to_table(
+        DocumentChunk.__tablename__,
+        records=[tuple(row[column] for column in _CHUNK_COLUMNS) for row in rows],
+        columns=list(_CHUNK_COLUMNS),
     )
 
 
-def _process_chunks(file_bytes: bytes, filename: str) -> Tuple[List[str], List[List[float]]]:
-    # Chunking + embeddings para la nueva versión.
-    text = _extract_text(file_bytes, filename)
-    if not text.strip():
-        raise HTTPException(400, "El documento no contiene texto")
-    chunks = splitter.split_text(text)
-    embeddings = _build_embeddings(chunks)
+async def _insert_chunk_rows(
+    db: AsyncSession,
+    document_id: str,
+    version_id: str,
+    chunks: List[str],
+    created_at: datetime,
+) -> None:
+    # Inserción masiva en lugar de un objeto ORM por chunk.
+    rows = [
+        {
+            "chunk_id": chunk_point_id(document_id, version_id, idx),
+            "document_id": document_id,
+            "version_id": version_id,
+            "content": chunk,
+            "chunk_index": idx,
+            "section": None,
+            "is_current": True,
+            "deleted": False,
+            "created_at": created_at,
+        }
+        for idx, chunk in enumerate(chunks)
+    ]
+    if not rows:
+        return
+    if len(rows) >= CHUNK_COPY_THRESHOLD and db.bind.dialect.name == "postgresql":
+        await _copy_chunk_rows(db, rows)
+    else:
+        # executemany con insertmanyvalues: pocos INSERT multi-fila.
+        await db.execute(insert(DocumentChunk), rows)
+
+
+async def _no_progress(stage: str, fraction: float) -> None:
+    return None
+
+
+async def _process_chunks(
+    file_path: str,
+    filename: str,
+    progress: ProgressCallback = _no_progress,
+) -> Tuple[List[str], List[List[float]]]:
+    # Chunking + embeddings para la nueva versión, sin bloquear el event loop.
+    await progress("extracting", 0.05)
+    chunks = await extract_chunks(file_path, filename)
+    await progress("embedding", 0.3)
+    with span("ingest.embed"), INGEST_STAGE_SECONDS.time(stage="embed"):
+        embeddings = await asyncio.to_thread(_build_embeddings, chunks)
     return chunks, embeddings
 
 
@@ -166,7 +261,7 @@ def _safe_filename(filename: str | None, fallback: str = "documento.pdf") -> str
     return os.path.basename(filename or fallback)
 
 
-def _build_storage_path(document_id: str, version_id: str, filename: str) -> str:
+def build_storage_path(document_id: str, version_id: str, filename: str) -> str:
     safe_name = _safe_filename(filename)
     return os.path.join(UPLOAD_DIR, f"{document_id}_{version_id}_{safe_name}")
 
@@ -184,9 +279,139 @@ def _build_metadata_payload(document) -> dict:
     }
 
 
+def validate_upload_filename(filename: str | None) -> str:
+    if not filename:
+        raise HTTPException(400, "Nombre de archivo inválido")
+    if not filename.lower().endswith((".pdf", ".txt")):
+        raise HTTPException(400, "Solo se aceptan PDF o TXT")
+    return _safe_filename(filename)
+
+
+def _copy_upload(source: BinaryIO, filepath: str) -> Tuple[int, str]:
+    # Copia por bloques a un temporal y rename atómico; devuelve (tamaño, sha256).
+    digest = hashlib.sha256()
+    file_size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(filepath), prefix=".upload-")
+    try:
+        with os.fdopen(fd, "wb") as handle:
+            while block := source.read(UPLOAD_CHUNK_SIZE):
+                digest.update(block)
+                file_size += len(block)
+                handle.write(block)
+            handle.flush()
+            os.fsync(handle.fileno())
+        # mkstemp crea el archivo con 0600; se mantienen los permisos habituales.
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return file_size, digest.hexdigest()
+
+
+async def store_upload(file: UploadFile, filepath: str) -> Tuple[int, str]:
+    # El upload ya está en el spool de Starlette; escritura, hash y fsync van en
+    # un hilo para no detener el event loop mientras el disco responde.
+    await file.seek(0)
+    return await asyncio.to_thread(_copy_upload, file.file, filepath)
+
+
+async def _get_document(document_id: str, db: AsyncSession) -> Document:
+    document = await db.scalar(select(Document).where(Document.document_id == document_id))
+    if not document:
+        raise HTTPException(404, "Documento no encontrado")
+    return document
+
+
+async def validate_new_version(document_id: str, version: str, db: AsyncSession):
+    # Reglas de versionado; devuelve el documento y su versión vigente (o None).
+    document = await _get_document(document_id, db)
+    if document.status == "archived":
+        raise HTTPException(400, "El documento está archivado")
+
+    current_versions = (await db.scalars(
+        select(DocumentVersion)
+        .where(
+            DocumentVersion.document_id == document_id,
+            DocumentVersion.is_current.is_(True),
+            DocumentVersion.deleted.is_(False),
+        )
+    )).all()
+    if len(current_versions) > 1:
+        raise HTTPException(400, "Existe más de una versión vigente")
+    current_version = current_versions[0] if current_versions else None
+    if current_version and _compare_versions(version, current_version.version) <= 0:
+        raise HTTPException(400, "La versión debe ser mayor a la vigente")
+
+    version_exists = await db.scalar(
+        select(DocumentVersion.version_id)
+        .where(
+            DocumentVersion.document_id == document_id,
+            DocumentVersion.version == version,
+        )
+        .limit(1)
+    )
+    if version_exists:
+        raise HTTPException(400, "La versión ya existe")
+
+    return document, current_version
+
+
+async def ensure_new_file_hash(document_id: str, file_hash: str, db: AsyncSession) -> None:
+    duplicate_hash = await db.scalar(
+        select(DocumentVersion.version_id)
+        .where(
+            DocumentVersion.document_id == document_id,
+            DocumentVersion.file_hash == file_hash,
+        )
+        .limit(1)
+    )
+    if duplicate_hash:
+        raise HTTPException(400, "El archivo ya fue cargado previamente")
+
+
+async def version_committed(version_id: str, db: AsyncSession) -> bool:
+    return await db.scalar(
+        select(DocumentVersion.version_id)
+        .where(DocumentVersion.version_id == version_id)
+        .limit(1)
+    ) is not None
+
+
+async def _cleanup_failed_ingest(
+    db: AsyncSession,
+    version_id: str,
+    point_ids: List[str],
+    label: str,
+) -> None:
+    # Los IDs de versión y de punto son deterministas: si la versión ya quedó
+    # confirmada (p. ej. un job reanudado tras caer después del commit), sus
+    # puntos no son de este intento y no se tocan. El archivo subido no se
+    # borra aquí: lo elimina el job al llegar a un estado final, para que un
+    # intento interrumpido pueda reanudarse desde él.
+    try:
+        await db.rollback()
+        if await version_committed(version_id, db):
+            logger.warning("La versión %s ya estaba confirmada; no se limpia", version_id)
+            return
+    except Exception as check_exc:
+        logger.warning("No se pudo verificar la versión %s; no se limpia: %s", version_id, check_exc)
+        return
+
+    if point_ids:
+        await _delete_qdrant_points(point_ids, label)
+
+
+@traced("ingest.index_document")
 async def index_document(
-    file: UploadFile,
-    db,
+    file_path: str,
+    filename: str,
+    file_size: int,
+    file_hash: str,
+    db: AsyncSession,
+    document_id: str,
+    version_id: str,
     title: str | None = None,
     category: str | None = None,
     owner_area: str | None = None,
@@ -198,27 +423,15 @@ async def index_document(
     indexable: str | None = None,
     version: str = "1.0",
     change_summary: str | None = None,
+    progress: ProgressCallback = _no_progress,
 ) -> dict:
-    if not file.filename:
-        raise HTTPException(400, "Nombre de archivo inválido")
-    if not file.filename.lower().endswith((".pdf", ".txt")):
-        raise HTTPException(400, "Solo se aceptan PDF o TXT")
-
-    doc_id = str(uuid.uuid4())
-    version_id = str(uuid.uuid4())
-    safe_filename = _safe_filename(file.filename)
-    filepath = _build_storage_path(doc_id, version_id, safe_filename)
-    qdrant_upserted = False
+    doc_id = document_id
+    safe_filename = _safe_filename(filename)
+    point_ids: List[str] = []
 
     try:
-        file_bytes = await file.read()
-        with open(filepath, "wb") as handle:
-            handle.write(file_bytes)
-
-        chunks, embeddings = _process_chunks(file_bytes, safe_filename)
+        chunks, embeddings = await _process_chunks(file_path, safe_filename, progress)
         now = datetime.utcnow()
-        file_hash = hashlib.sha256(file_bytes).hexdigest()
-        file_size = len(file_bytes)
         file_type = os.path.splitext(safe_filename)[1].lstrip(".").lower()
         tag_list = _parse_tags(tags)
 
@@ -236,7 +449,7 @@ async def index_document(
             is_indexable=_parse_bool(indexable) if indexable is not None else True,
             file_size=file_size,
             file_type=file_type,
-            file_path=filepath,
+            file_path=file_path,
             status="active",
             created_at=now,
             updated_at=now,
@@ -248,7 +461,7 @@ async def index_document(
             document_id=doc_id,
             version=version,
             filename=safe_filename,
-            file_path=filepath,
+            file_path=file_path,
             file_size=file_size,
             file_type=file_type,
             effective_from=now,
@@ -260,38 +473,34 @@ async def index_document(
             deleted=False,
         ))
 
-        for idx, (chunk, emb) in enumerate(zip(chunks, embeddings)):
-            db.add(DocumentChunk(
-                chunk_id=str(uuid.uuid4()),
-                document_id=doc_id,
-                version_id=version_id,
-                content=chunk,
-                chunk_index=idx,
-                section=None,
-                is_current=True,
-                deleted=False,
-                created_at=now,
-            ))
+        await _insert_chunk_rows(db, doc_id, version_id, chunks, now)
 
         document.chunk_count = len(chunks)
         document.status = "chunked"
 
-        _upsert_qdrant_points(
-            document_id=doc_id,
-            version=version,
-            filename=safe_filename,
-            chunks=chunks,
-            embeddings=embeddings,
-            metadata=_build_metadata_payload(document),
-        )
-        qdrant_upserted = True
+        await progress("indexing", 0.8)
+        point_ids = chunk_point_ids(doc_id, version_id, len(chunks))
+        with span("ingest.upsert"), INGEST_STAGE_SECONDS.time(stage="upsert"):
+            await _upsert_qdrant_points(
+                point_ids=point_ids,
+                document_id=doc_id,
+                version_id=version_id,
+                version=version,
+                filename=safe_filename,
+                chunks=chunks,
+                embeddings=embeddings,
+                metadata=_build_metadata_payload(document),
+            )
 
+        await progress("committing", 0.95)
         document.status = "indexed"
         document.indexed_at = datetime.utcnow()
         _store_audit(db, "CREATE_VERSION", doc_id, version)
-        db.commit()
+        await bump_corpus_generation(db)
+        with span("ingest.commit"), INGEST_STAGE_SECONDS.time(stage="commit"):
+            await db.commit()
 
-        logger.info("✅ Documento %s indexado", file.filename)
+        logger.info("✅ Documento %s indexado", safe_filename)
 
         return {
             "id": doc_id,
@@ -300,123 +509,49 @@ async def index_document(
             "status": "indexed",
         }
     except Exception:
-        if qdrant_upserted:
-            try:
-                state.qdrant.delete(
-                    collection_name=QDRANT_COLLECTION,
-                    points_selector=Filter(
-                        must=[
-                            FieldCondition(
-                                key="document_id",
-                                match=MatchValue(value=doc_id),
-                            )
-                        ]
-                    ),
-                )
-            except Exception as cleanup_exc:
-                logger.warning(
-                    "No se pudo limpiar Qdrant para %s: %s",
-                    file.filename,
-                    cleanup_exc,
-                )
-
-        if os.path.exists(filepath):
-            try:
-                os.remove(filepath)
-            except OSError as cleanup_exc:
-                logger.warning(
-                    "No se pudo eliminar el archivo %s: %s",
-                    filepath,
-                    cleanup_exc,
-                )
+        await _cleanup_failed_ingest(db, version_id, point_ids, safe_filename)
         raise
 
 
+@traced("ingest.create_version")
 async def create_document_version(
     document_id: str,
-    file: UploadFile,
-    db,
+    file_path: str,
+    filename: str,
+    file_size: int,
+    file_hash: str,
+    db: AsyncSession,
     version: str,
+    version_id: str,
     change_summary: str | None = None,
+    progress: ProgressCallback = _no_progress,
 ) -> dict:
-    if not file.filename:
-        raise HTTPException(400, "Nombre de archivo inválido")
-    if not file.filename.lower().endswith((".pdf", ".txt")):
-        raise HTTPException(400, "Solo se aceptan PDF o TXT")
-
-    document = db.query(Document).filter(Document.document_id == document_id).first()
-    if not document:
-        raise HTTPException(404, "Documento no encontrado")
-    if document.status == "archived":
-        raise HTTPException(400, "El documento está archivado")
-
-    current_versions = (
-        db.query(DocumentVersion)
-        .filter(
-            DocumentVersion.document_id == document_id,
-            DocumentVersion.is_current.is_(True),
-            DocumentVersion.deleted.is_(False),
-        )
-        .all()
-    )
-    if len(current_versions) > 1:
-        raise HTTPException(400, "Existe más de una versión vigente")
-    current_version = current_versions[0] if current_versions else None
-    if current_version and _compare_versions(version, current_version.version) <= 0:
-        raise HTTPException(400, "La versión debe ser mayor a la vigente")
-
-    file_bytes = await file.read()
-    file_hash = hashlib.sha256(file_bytes).hexdigest()
-    duplicate_hash = (
-        db.query(DocumentVersion)
-        .filter(
-            DocumentVersion.document_id == document_id,
-            DocumentVersion.file_hash == file_hash,
-        )
-        .first()
-    )
-    if duplicate_hash:
-        raise HTTPException(400, "El archivo ya fue cargado previamente")
-
-    version_exists = (
-        db.query(DocumentVersion)
-        .filter(
-            DocumentVersion.document_id == document_id,
-            DocumentVersion.version == version,
-        )
-        .first()
-    )
-    if version_exists:
-        raise HTTPException(400, "La versión ya existe")
-
-    version_id = str(uuid.uuid4())
-    qdrant_upserted = False
+    point_ids: List[str] = []
 
     try:
-        safe_filename = _safe_filename(file.filename)
-        filepath = _build_storage_path(document_id, version_id, safe_filename)
-        with open(filepath, "wb") as handle:
-            handle.write(file_bytes)
+        # Se revalida al ejecutar el job: otra versión pudo entrar en la cola antes.
+        document, current_version = await validate_new_version(document_id, version, db)
+        await ensure_new_file_hash(document_id, file_hash, db)
 
-        file_size = len(file_bytes)
+        safe_filename = _safe_filename(filename)
         file_type = os.path.splitext(safe_filename)[1].lstrip(".").lower()
 
-        chunks, embeddings = _process_chunks(file_bytes, safe_filename)
+        chunks, embeddings = await _process_chunks(file_path, safe_filename, progress)
         now = datetime.utcnow()
 
         if current_version:
             current_version.is_current = False
             current_version.effective_to = now
-            _update_qdrant_payload(document_id, current_version.version, {
+            await _update_qdrant_payload(document_id, current_version.version, {
                 "is_current": False,
             })
-            (
-                db.query(DocumentChunk)
-                .filter(
+            await db.execute(
+                update(DocumentChunk)
+                .where(
                     DocumentChunk.document_id == document_id,
                     DocumentChunk.is_current.is_(True),
                 )
-                .update({DocumentChunk.is_current: False})
+                .values(is_current=False)
             )
 
         db.add(DocumentVersion(
@@ -424,7 +559,7 @@ async def create_document_version(
             document_id=document_id,
             version=version,
             filename=safe_filename,
-            file_path=filepath,
+            file_path=file_path,
             file_size=file_size,
             file_type=file_type,
             effective_from=now,
@@ -436,38 +571,34 @@ async def create_document_version(
             deleted=False,
         ))
 
-        for idx, (chunk, emb) in enumerate(zip(chunks, embeddings)):
-            db.add(DocumentChunk(
-                chunk_id=str(uuid.uuid4()),
-                document_id=document_id,
-                version_id=version_id,
-                content=chunk,
-                chunk_index=idx,
-                section=None,
-                is_current=True,
-                deleted=False,
-                created_at=now,
-            ))
+        await _insert_chunk_rows(db, document_id, version_id, chunks, now)
 
         document.chunk_count = len(chunks)
         document.indexed_at = now
         document.filename = safe_filename
-        document.file_path = filepath
+        document.file_path = file_path
         document.file_size = file_size
         document.file_type = file_type
         document.updated_at = now
 
-        _upsert_qdrant_points(
-            document_id=document_id,
-            version=version,
-            filename=safe_filename,
-            chunks=chunks,
-            embeddings=embeddings,
-            metadata=_build_metadata_payload(document),
-        )
-        qdrant_upserted = True
+        await progress("indexing", 0.8)
+        point_ids = chunk_point_ids(document_id, version_id, len(chunks))
+        with span("ingest.upsert"), INGEST_STAGE_SECONDS.time(stage="upsert"):
+            await _upsert_qdrant_points(
+                point_ids=point_ids,
+                document_id=document_id,
+                version_id=version_id,
+                version=version,
+                filename=safe_filename,
+                chunks=chunks,
+                embeddings=embeddings,
+                metadata=_build_metadata_payload(document),
+            )
+        await progress("committing", 0.95)
         _store_audit(db, "CREATE_VERSION", document_id, version)
-        db.commit()
+        await bump_corpus_generation(db)
+        with span("ingest.commit"), INGEST_STAGE_SECONDS.time(stage="commit"):
+            await db.commit()
 
         return {
             "document_id": document_id,
@@ -475,97 +606,168 @@ async def create_document_version(
             "chunks": len(chunks),
         }
     except Exception:
-        if qdrant_upserted:
-            try:
-                state.qdrant.delete(
-                    collection_name=QDRANT_COLLECTION,
-                    points_selector=Filter(
-                        must=[
-                            FieldCondition(
-                                key="document_id",
-                                match=MatchValue(value=document_id),
-                            ),
-                            FieldCondition(
-                                key="version",
-                                match=MatchValue(value=version),
-                            ),
-                        ]
-                    ),
-                )
-            except Exception as cleanup_exc:
-                logger.warning(
-                    "No se pudo limpiar Qdrant para %s: %s",
-                    document_id,
-                    cleanup_exc,
-                )
-        if "filepath" in locals() and os.path.exists(filepath):
-            try:
-                os.remove(filepath)
-            except OSError as cleanup_exc:
-                logger.warning(
-                    "No se pudo eliminar el archivo %s: %s",
-                    filepath,
-                    cleanup_exc,
-                )
+        await _cleanup_failed_ingest(db, version_id, point_ids, document_id)
         raise
 
 
-def list_documents(db) -> List[dict]:
-    records = (
-        db.query(Document, DocumentVersion)
+# Orden disponible en el listado; updated_at cae a created_at si nunca se editó.
+DOCUMENT_SORTS = {
+    "created_at": Document.created_at,
+    "updated_at": func.coalesce(Document.updated_at, Document.created_at),
+    "title": Document.title,
+    "size": Document.file_size,
+}
+
+
+def _document_filters(
+    category: str | None = None,
+    department: str | None = None,
+    status: str | None = None,
+    file_type: str | None = None,
+    tags: str | None = None,
+    q: str | None = None,
+) -> list:
+    filters = []
+    if category:
+        filters.append(Document.category == category)
+    if department:
+        filters.append(Document.department == department)
+    if status:
+        filters.append(Document.status == status)
+    if file_type:
+        filters.append(Document.file_type == file_type.lower())
+    for tag in _parse_tags(tags):
+        # Los tags se guardan como lista JSON: se busca el elemento entre comillas.
+        filters.append(Document.tags.contains(json.dumps(tag, ensure_ascii=False), autoescape=True))
+    if q and q.strip():
+        term = q.strip()
+        filters.append(or_(
+            Document.title.icontains(term, autoescape=True),
+            Document.filename.icontains(term, autoescape=True),
+            Document.description.icontains(term, autoescape=True),
+            Document.tags.icontains(term, autoescape=True),
+        ))
+    return filters
+
+
+def _encode_cursor(sort: str, order: str, value, row_id: int) -> str:
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    raw = json.dumps({"s": sort, "o": order, "v": value, "id": row_id}, ensure_ascii=False)
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def _decode_cursor(cursor: str, sort: str, order: str) -> tuple:
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        value = data["v"]
+        if sort in {"created_at", "updated_at"}:
+            value = datetime.fromisoformat(value)
+        row_id = int(data["id"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(400, "Cursor inválido")
+    if data.get("s") != sort or data.get("o") != order:
+        raise HTTPException(400, "El cursor no corresponde al orden solicitado")
+    return value, row_id
+
+
+def _serialize_document(document, version) -> dict:
+    tags = _deserialize_tags(document.tags)
+    file_type = document.file_type
+    if not file_type and document.filename:
+        file_type = os.path.splitext(document.filename)[1].lstrip(".").lower()
+    updated_at = document.updated_at
+    if not updated_at:
+        updated_at = version.uploaded_at if version else document.created_at
+    return {
+        "document_id": document.document_id,
+        "title": document.title,
+        "filename": document.filename,
+        "category": document.category,
+        "status": document.status,
+        "owner": document.owner or document.owner_area,
+        "department": document.department,
+        "tags": tags,
+        "description": document.description,
+        "public": document.is_public,
+        "indexable": document.is_indexable,
+        "size": document.file_size,
+        "type": file_type,
+        "chunks_count": document.chunk_count,
+        "embedding_status": "completed" if document.status == "indexed" else document.status,
+        "version": version.version if version else None,
+        "effective_from": version.effective_from.isoformat() if version else None,
+        "created_at": document.created_at.isoformat(),
+        "updated_at": updated_at.isoformat(),
+    }
+
+
+async def list_documents(
+    db: AsyncSession,
+    limit: int = DOCUMENTS_PAGE_SIZE,
+    cursor: str | None = None,
+    sort: str = "created_at",
+    order: str = "desc",
+    **filters,
+) -> dict:
+    # Paginación por keyset: (valor de orden, id) del último elemento de la página.
+    if sort not in DOCUMENT_SORTS:
+        raise HTTPException(400, f"Orden inválido; use {', '.join(DOCUMENT_SORTS)}")
+    if order not in {"asc", "desc"}:
+        raise HTTPException(400, "El orden debe ser asc o desc")
+    limit = max(1, min(limit, DOCUMENTS_MAX_PAGE_SIZE))
+
+    sort_column = DOCUMENT_SORTS[sort]
+    query = (
+        select(Document, DocumentVersion, sort_column)
         .outerjoin(
             DocumentVersion,
             (Document.document_id == DocumentVersion.document_id)
             & (DocumentVersion.is_current.is_(True))
             & (DocumentVersion.deleted.is_(False)),
         )
-        .order_by(Document.created_at.desc())
-        .all()
+        .where(*_document_filters(**filters))
     )
-    response = []
-    for document, version in records:
-        tags = _deserialize_tags(document.tags)
-        file_type = document.file_type
-        if not file_type and document.filename:
-            file_type = os.path.splitext(document.filename)[1].lstrip(".").lower()
-        updated_at = document.updated_at
-        if not updated_at:
-            updated_at = version.uploaded_at if version else document.created_at
-        response.append({
-            "document_id": document.document_id,
-            "title": document.title,
-            "filename": document.filename,
-            "category": document.category,
-            "status": document.status,
-            "owner": document.owner or document.owner_area,
-            "department": document.department,
-            "tags": tags,
-            "description": document.description,
-            "public": document.is_public,
-            "indexable": document.is_indexable,
-            "size": document.file_size,
-            "type": file_type,
-            "chunks_count": document.chunk_count,
-            "embedding_status": "completed" if document.status == "indexed" else document.status,
-            "version": version.version if version else None,
-            "effective_from": version.effective_from.isoformat() if version else None,
-            "created_at": document.created_at.isoformat(),
-            "updated_at": updated_at.isoformat(),
-        })
-    return response
-
-
-def get_document_detail(document_id: str, db) -> dict:
-    document = db.query(Document).filter(Document.document_id == document_id).first()
-    if not document:
-        raise HTTPException(404, "Documento no encontrado")
+    if cursor:
+        value, row_id = _decode_cursor(cursor, sort, order)
+        key = tuple_(sort_column, Document.id)
+        query = query.where(key < tuple_(value, row_id) if order == "desc" else key > tuple_(value, row_id))
+    if order == "desc":
+        query = query.order_by(sort_column.desc(), Document.id.desc())
+    else:
+        query = query.order_by(sort_column.asc(), Document.id.asc())
+
+    # Una fila extra indica si hay página siguiente sin contar el total.
+    records = (await db.execute(query.limit(limit + 1))).all()
+    page = records[:limit]
+    next_cursor = None
+    if len(records) > limit:
+        last_document, _, last_value = page[-1]
+        next_cursor = _encode_cursor(sort, order, last_value, last_document.id)
+
+    return {
+        "items": [_serialize_document(document, version) for document, version, _ in page],
+        "next_cursor": next_cursor,
+        "limit": limit,
+    }
+
+
+async def count_documents(db: AsyncSession, **filters) -> dict:
+    total, total_size = (await db.execute(
+        select(func.count(Document.id), func.coalesce(func.sum(Document.file_size), 0))
+        .where(*_document_filters(**filters))
+    )).one()
+    return {"total": total, "total_size": int(total_size)}
+
+
+async def get_document_detail(document_id: str, db: AsyncSession) -> dict:
+    document = await _get_document(document_id, db)
 
-    versions = (
-        db.query(DocumentVersion)
-        .filter(DocumentVersion.document_id == document_id)
+    versions = (await db.scalars(
+        select(DocumentVersion)
+        .where(DocumentVersion.document_id == document_id)
         .order_by(DocumentVersion.effective_from.desc())
-        .all()
-    )
+    )).all()
     version_payload = []
     for version in versions:
         item = {
@@ -588,43 +790,34 @@ def get_document_detail(document_id: str, db) -> dict:
     }
 
 
-def archive_document(document_id: str, db) -> dict:
-    document = db.query(Document).filter(Document.document_id == document_id).first()
-    if not document:
-        raise HTTPException(404, "Documento no encontrado")
+async def archive_document(document_id: str, db: AsyncSession) -> dict:
+    document = await _get_document(document_id, db)
 
     now = datetime.utcnow()
     document.status = "archived"
 
-    (
-        db.query(DocumentVersion)
-        .filter(DocumentVersion.document_id == document_id, DocumentVersion.is_current.is_(True))
-        .update({
-            DocumentVersion.is_current: False,
-            DocumentVersion.effective_to: now,
-        })
+    await db.execute(
+        update(DocumentVersion)
+        .where(DocumentVersion.document_id == document_id, DocumentVersion.is_current.is_(True))
+        .values(is_current=False, effective_to=now)
     )
-    (
-        db.query(DocumentChunk)
-        .filter(DocumentChunk.document_id == document_id)
-        .update({
-            DocumentChunk.deleted: True,
-            DocumentChunk.is_current: False,
-        })
+    await db.execute(
+        update(DocumentChunk)
+        .where(DocumentChunk.document_id == document_id)
+        .values(deleted=True, is_current=False)
     )
-    _update_qdrant_payload(document_id, None, {
+    await _update_qdrant_payload(document_id, None, {
         "deleted": True,
         "is_current": False,
     })
     _store_audit(db, "ARCHIVE_DOCUMENT", document_id, None)
-    db.commit()
+    await bump_corpus_generation(db)
+    await db.commit()
     return {"document_id": document_id, "status": "archived"}
 
 
-def update_document_metadata(document_id: str, payload, db) -> dict:
-    document = db.query(Document).filter(Document.document_id == document_id).first()
-    if not document:
-        raise HTTPException(404, "Documento no encontrado")
+async def update_document_metadata(document_id: str, payload, db: AsyncSession) -> dict:
+    document = await _get_document(document_id, db)
 
     if payload.title is not None:
         document.title = payload.title
@@ -651,37 +844,35 @@ def update_document_metadata(document_id: str, payload, db) -> dict:
 
     document.updated_at = datetime.utcnow()
 
-    _update_qdrant_payload(document_id, None, _build_metadata_payload(document))
+    await _update_qdrant_payload(document_id, None, _build_metadata_payload(document))
     _store_audit(db, "UPDATE_METADATA", document_id, None)
-    db.commit()
+    await bump_corpus_generation(db)
+    await db.commit()
 
     return {"document_id": document_id, "status": "updated"}
 
 
-def delete_document(document_id: str, db) -> dict:
-    document = db.query(Document).filter(Document.document_id == document_id).first()
-    if not document:
-        raise HTTPException(404, "Documento no encontrado")
+async def delete_document(document_id: str, db: AsyncSession) -> dict:
+    await _get_document(document_id, db)
 
-    versions = (
-        db.query(DocumentVersion)
-        .filter(DocumentVersion.document_id == document_id)
-        .all()
-    )
+    file_paths = (await db.scalars(
+        select(DocumentVersion.file_path)
+        .where(DocumentVersion.document_id == document_id)
+    )).all()
 
-    for version in versions:
-        if version.file_path and os.path.exists(version.file_path):
+    for file_path in file_paths:
+        if file_path and os.path.exists(file_path):
             try:
-                os.remove(version.file_path)
+                os.remove(file_path)
             except OSError as cleanup_exc:
                 logger.warning(
                     "No se pudo eliminar el archivo %s: %s",
-                    version.file_path,
+                    file_path,
                     cleanup_exc,
                 )
 
     try:
-        state.qdrant.delete(
+        await state.qdrant.delete(
             collection_name=QDRANT_COLLECTION,
             points_selector=Filter(
                 must=[
@@ -695,39 +886,26 @@ def delete_document(document_id: str, db) -> dict:
     except Exception as exc:
         logger.warning("No se pudo eliminar en Qdrant %s: %s", document_id, exc)
 
-    (
-        db.query(DocumentChunk)
-        .filter(DocumentChunk.document_id == document_id)
-        .delete(synchronize_session=False)
-    )
-    (
-        db.query(DocumentVersion)
-        .filter(DocumentVersion.document_id == document_id)
-        .delete(synchronize_session=False)
-    )
-    (
-        db.query(DocumentAudit)
-        .filter(DocumentAudit.document_id == document_id)
-        .delete(synchronize_session=False)
-    )
-    (
-        db.query(Document)
-        .filter(Document.document_id == document_id)
-        .delete(synchronize_session=False)
-    )
-    db.commit()
+    for model in (DocumentChunk, DocumentVersion, DocumentAudit, Document):
+        await db.execute(
+            delete(model)
+            .where(model.document_id == document_id)
+            .execution_options(synchronize_session=False)
+        )
+    await bump_corpus_generation(db)
+    await db.commit()
 
     return {"document_id": document_id, "status": "deleted"}
 
 
-def delete_document_version(document_id: str, version: str, db) -> dict:
-    version_record = (
-        db.query(DocumentVersion)
-        .filter(
+async def delete_document_version(document_id: str, version: str, db: AsyncSession) -> dict:
+    version_record = await db.scalar(
+        select(DocumentVersion)
+        .where(
             DocumentVersion.document_id == document_id,
             DocumentVersion.version == version,
         )
-        .first()
+        .limit(1)
     )
     if not version_record:
         raise HTTPException(404, "Versión no encontrada")
@@ -738,21 +916,19 @@ def delete_document_version(document_id: str, version: str, db) -> dict:
     version_record.is_current = False
     version_record.effective_to = version_record.effective_to or datetime.utcnow()
 
-    (
-        db.query(DocumentChunk)
-        .filter(
+    await db.execute(
+        update(DocumentChunk)
+        .where(
             DocumentChunk.document_id == document_id,
             DocumentChunk.version_id == version_record.version_id,
         )
-        .update({
-            DocumentChunk.deleted: True,
-            DocumentChunk.is_current: False,
-        })
+        .values(deleted=True, is_current=False)
     )
-    _update_qdrant_payload(document_id, version, {
+    await _update_qdrant_payload(document_id, version, {
         "deleted": True,
         "is_current": False,
     })
     _store_audit(db, "DELETE_VERSION", document_id, version)
-    db.commit()
+    await bump_corpus_generation(db)
+    await db.commit()
     return {"document_id": document_id, "version": version, "status": "deleted"}
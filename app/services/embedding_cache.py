@@ -0,0 +1,111 @@
+import hashlib
+from array import array
+from datetime import datetime
+from typing import Dict, List, Sequence
+
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app.config import EMBEDDING_CACHE_ENABLED, logger
+from app.db import SessionLocal
+from app.models import EmbeddingCacheEntry
+from app.services.embeddings import embed_texts, embedding_signature
+
+# Tamaño de lote para los IN (...) y los inserts del caché.
+_DB_BATCH_SIZE = 1000
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _pack(vector: List[float]) -> bytes:
+    return array("f", vector).tobytes()
+
+
+def _unpack(raw: bytes) -> List[float]:
+    values = array("f")
+    values.frombytes(raw)
+    return values.tolist()
+
+
+def _load_cached(db, hashes: List[str]) -> Dict[str, List[float]]:
+    cached: Dict[str, List[float]] = {}
+    for start in range(0, len(hashes), _DB_BATCH_SIZE):
+        rows = (
+            db.query(EmbeddingCacheEntry.content_hash, EmbeddingCacheEntry.embedding)
+            .filter(
+                EmbeddingCacheEntry.model == embedding_signature(),
+                EmbeddingCacheEntry.content_hash.in_(hashes[start:start + _DB_BATCH_SIZE]),
+            )
+            .all()
+        )
+        cached.update({row_hash: _unpack(raw) for row_hash, raw in rows})
+    return cached
+
+
+# INSERT ... ON CONFLICT DO NOTHING según el motor; otros motores no guardan caché.
+_INSERTS = {
+    "postgresql": postgresql.insert,
+    "sqlite": sqlite.insert,
+}
+
+
+def _store(db, vectors: Dict[str, List[float]]) -> None:
+    dialect = db.bind.dialect.name
+    if dialect not in _INSERTS:
+        raise RuntimeError(f"El caché de embeddings no soporta {dialect}")
+    insert = _INSERTS[dialect]
+    now = datetime.utcnow()
+    rows = [
+        {
+            "content_hash": row_hash,
+            "model": embedding_signature(),
+            "embedding": _pack(vector),
+            "created_at": now,
+        }
+        for row_hash, vector in vectors.items()
+    ]
+    for start in range(0, len(rows), _DB_BATCH_SIZE):
+        db.execute(
+            insert(EmbeddingCacheEntry)
+            .values(rows[start:start + _DB_BATCH_SIZE])
+            .on_conflict_do_nothing()
+        )
+    db.commit()
+
+
+def embed_with_cache(texts: Sequence[str]) -> List[List[float]]:
+    # Solo los chunks nuevos o modificados van a OpenAI; el resto reutiliza su vector.
+    if not EMBEDDING_CACHE_ENABLED or not texts:
+        return embed_texts(texts)
+
+    hashes = [content_hash(text) for text in texts]
+    unique_hashes = list(dict.fromkeys(hashes))
+
+    # Sesiones cortas: ninguna conexión queda tomada mientras se llama a OpenAI.
+    try:
+        with SessionLocal() as db:
+            vectors = _load_cached(db, unique_hashes)
+    except Exception as exc:
+        # El caché es una optimización: sin él se embebe todo.
+        logger.warning("No se pudo leer el caché de embeddings: %s", exc)
+        return embed_texts(texts)
+
+    missing = [row_hash for row_hash in unique_hashes if row_hash not in vectors]
+    if missing:
+        text_by_hash = dict(zip(hashes, texts))
+        fresh = dict(zip(missing, embed_texts([text_by_hash[h] for h in missing])))
+        vectors.update(fresh)
+        try:
+            with SessionLocal() as db:
+                _store(db, fresh)
+        except Exception as exc:
+            # El caché es una optimización: la ingesta sigue aunque no se guarde.
+            logger.warning("No se pudo guardar el caché de embeddings: %s", exc)
+
+    logger.info(
+        "♻️ Embeddings reutilizados desde caché: %s/%s",
+        len(unique_hashes) - len(missing),
+        len(unique_hashes),
+    )
+    return [vectors[row_hash] for row_hash in hashes]
@@ -0,0 +1,172 @@
+import math
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import List, Sequence
+
+import openai
+import tiktoken
+from tenacity import (
+    retry,
+    retry_if_exception_type,
+    stop_after_attempt,
+    wait_random_exponential,
+)
+
+from app.config import (
+    EMBEDDING_BATCH_MAX_INPUTS,
+    EMBEDDING_BATCH_MAX_TOKENS,
+    EMBEDDING_CONCURRENCY,
+    EMBEDDING_DIMENSIONS,
+    EMBEDDING_MAX_RETRIES,
+    EMBEDDING_MODEL,
+    QDRANT_TWO_STAGE_SEARCH,
+    logger,
+)
+from app.services.metrics import EMBEDDING_THREADS_BUSY, OPENAI_RETRIES, record_token_usage
+
+# Tamaño nativo de los modelos conocidos.
+NATIVE_DIMENSIONS = {
+    "text-embedding-3-small": 1536,
+    "text-embedding-3-large": 3072,
+    "text-embedding-ada-002": 1536,
+}
+
+# Errores transitorios de la API clásica que justifican reintentar el lote.
+_RETRYABLE_ERRORS = (
+    openai.error.APIConnectionError,
+    openai.error.APIError,
+    openai.error.RateLimitError,
+    openai.error.ServiceUnavailableError,
+    openai.error.Timeout,
+    openai.error.TryAgain,
+)
+
+# Pool compartido: limita las llamadas simultáneas a OpenAI en todo el proceso.
+_executor = ThreadPoolExecutor(
+    max_workers=EMBEDDING_CONCURRENCY,
+    thread_name_prefix="embeddings",
+)
+
+
+def full_dimensions() -> int:
+    return NATIVE_DIMENSIONS.get(EMBEDDING_MODEL, 1536)
+
+
+def index_dimensions() -> int:
+    # Tamaño del vector que se busca en Qdrant (el corto en búsqueda en dos etapas).
+    return EMBEDDING_DIMENSIONS or full_dimensions()
+
+
+def requested_dimensions() -> int | None:
+    # En dos etapas se pide el vector completo y el corto se deriva localmente.
+    if QDRANT_TWO_STAGE_SEARCH or index_dimensions() == full_dimensions():
+        return None
+    return EMBEDDING_DIMENSIONS
+
+
+def query_dimensions() -> int:
+    # Tamaño del vector que devuelve embed_query.
+    return requested_dimensions() or full_dimensions()
+
+
+def embedding_kwargs() -> dict:
+    dimensions = requested_dimensions()
+    return {"dimensions": dimensions} if dimensions else {}
+
+
+def embedding_signature() -> str:
+    # Identifica el espacio vectorial en cachés y centroides: modelo + dimensiones.
+    dimensions = requested_dimensions()
+    return f"{EMBEDDING_MODEL}@{dimensions}" if dimensions else EMBEDDING_MODEL
+
+
+def shorten(vector: List[float], dimensions: int) -> List[float]:
+    # Embeddings Matryoshka: los primeros N valores renormalizados conservan el sentido.
+    truncated = vector[:dimensions]
+    norm = math.sqrt(sum(value * value for value in truncated))
+    if not norm:
+        return truncated
+    return [value / norm for value in truncated]
+
+
+@lru_cache(maxsize=1)
+def _get_encoding() -> tiktoken.Encoding:
+    try:
+        return tiktoken.encoding_for_model(EMBEDDING_MODEL)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def count_tokens(text: str) -> int:
+    return len(_get_encoding().encode(text, disallowed_special=()))
+
+
+def build_batches(texts: Sequence[str]) -> List[List[int]]:
+    # Agrupa índices de chunks respetando el presupuesto de tokens por request.
+    batches: List[List[int]] = []
+    current: List[int] = []
+    current_tokens = 0
+    for idx, text in enumerate(texts):
+        tokens = count_tokens(text)
+        if current and (
+            current_tokens + tokens > EMBEDDING_BATCH_MAX_TOKENS
+            or len(current) >= EMBEDDING_BATCH_MAX_INPUTS
+        ):
+            batches.append(current)
+            current = []
+            current_tokens = 0
+        current.append(idx)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+# Política de reintentos de toda llamada de embeddings (síncrona o async).
+retry_embeddings = retry(
+    retry=retry_if_exception_type(_RETRYABLE_ERRORS),
+    wait=wait_random_exponential(multiplier=1, max=30),
+    stop=stop_after_attempt(EMBEDDING_MAX_RETRIES),
+    before_sleep=lambda retry_state: OPENAI_RETRIES.inc(operation="embeddings"),
+    reraise=True,
+)
+
+
+@retry_embeddings
+def _embed_batch(texts: List[str]) -> List[List[float]]:
+    with EMBEDDING_THREADS_BUSY.track():
+        response = openai.Embedding.create(
+            model=EMBEDDING_MODEL,
+            input=texts,
+            **embedding_kwargs(),
+        )
+    record_token_usage(EMBEDDING_MODEL, response.get("usage"))
+    # La API no garantiza el orden de "data"; usamos el índice devuelto.
+    data = sorted(response["data"], key=lambda item: item["index"])
+    return [item["embedding"] for item in data]
+
+
+def embed_texts(texts: Sequence[str]) -> List[List[float]]:
+    # Embeddings en lotes concurrentes, conservando el orden original.
+    if not texts:
+        return []
+
+    batches = build_batches(texts)
+    logger.info(
+        "🧮 Generando embeddings: %s chunks en %s lotes",
+        len(texts),
+        len(batches),
+    )
+
+    results: List[List[float] | None] = [None] * len(texts)
+    futures = [
+        (batch, _executor.submit(_embed_batch, [texts[idx] for idx in batch]))
+        for batch in batches
+    ]
+    for batch, future in futures:
+        vectors = future.result()
+        if len(vectors) != len(batch):
+            raise RuntimeError("OpenAI devolvió un número inesperado de embeddings")
+        for idx, vector in zip(batch, vectors):
+            results[idx] = vector
+    return results
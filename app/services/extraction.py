@@ -0,0 +1,92 @@
+import asyncio
+import mmap
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import List
+
+from fastapi import HTTPException
+from PyPDF2 import PdfReader
+
+from app.config import EXTRACTION_WORKERS, PDF_PAGES_PER_TASK
+from app.services.metrics import INGEST_STAGE_SECONDS
+from app.services.text_splitter import splitter
+from app.services.tracing import span
+
+_executor: ProcessPoolExecutor | None = None
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        # spawn: el proceso padre tiene threads (embeddings, uvicorn) y fork no es seguro.
+        _executor = ProcessPoolExecutor(
+            max_workers=EXTRACTION_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _executor
+
+
+def shutdown_extraction_pool() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def count_pdf_pages(file_path: str) -> int:
+    if os.path.getsize(file_path) == 0:
+        return 0
+    with open(file_path, "rb") as handle, mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        return len(PdfReader(mapped).pages)
+
+
+def extract_pdf_pages(file_path: str, start: int, end: int) -> str:
+    # PyPDF2 lee sobre un mmap: las páginas se cargan desde el page cache bajo demanda.
+    with open(file_path, "rb") as handle, mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        reader = PdfReader(mapped)
+        return "\n".join(
+            reader.pages[idx].extract_text() or ""
+            for idx in range(start, end)
+        )
+
+
+def read_text_file(file_path: str) -> str:
+    with open(file_path, encoding="utf-8", errors="ignore") as handle:
+        return handle.read()
+
+
+def split_text(text: str) -> List[str]:
+    return splitter.split_text(text)
+
+
+async def extract_chunks(file_path: str, filename: str) -> List[str]:
+    # Extracción y chunking (CPU) en el pool de procesos, fuera del event loop.
+    loop = asyncio.get_running_loop()
+    executor = _get_executor()
+    extension = os.path.splitext(filename or "")[1].lower()
+
+    with span("ingest.extract"), INGEST_STAGE_SECONDS.time(stage="extract"):
+        if extension == ".pdf":
+            page_count = await loop.run_in_executor(executor, count_pdf_pages, file_path)
+            # PDFs grandes se reparten por rangos de páginas entre procesos.
+            parts = await asyncio.gather(*(
+                loop.run_in_executor(
+                    executor,
+                    extract_pdf_pages,
+                    file_path,
+                    start,
+                    min(start + PDF_PAGES_PER_TASK, page_count),
+                )
+                for start in range(0, page_count, PDF_PAGES_PER_TASK)
+            ))
+            text = "\n".join(parts)
+        elif extension == ".txt":
+            text = await loop.run_in_executor(executor, read_text_file, file_path)
+        else:
+            raise HTTPException(400, "Solo se aceptan PDF o TXT")
+
+    if not text.strip():
+        raise HTTPException(400, "El documento no contiene texto")
+    with span("ingest.split"), INGEST_STAGE_SECONDS.time(stage="split"):
+        return await loop.run_in_executor(executor, split_text, text)
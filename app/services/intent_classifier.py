@@ -0,0 +1,187 @@
+import json
+import math
+import os
+from datetime import datetime
+
+import openai
+
+from app.config import (
+    INTENT_CENTROIDS_PATH,
+    INTENT_CLASSIFIER_ENABLED,
+    INTENT_CONFIDENCE_THRESHOLD,
+    INTENT_EXAMPLES_PATH,
+    INTENT_TEMPERATURE,
+    OPENAI_API_KEY,
+    logger,
+)
+from app.schemas import RouteDecision
+from app.services.embeddings import embed_texts, embedding_signature
+from app.services.openai_service import route_intent
+from app.state import state
+
+# Preguntas etiquetadas por ruta; se pueden reemplazar con INTENT_EXAMPLES_PATH.
+ROUTE_EXAMPLES: dict[str, list[str]] = {
+    "rag": [
+        "¿Qué dice el documento sobre el procedimiento de reembolso?",
+        "Resume el reglamento interno que cargamos",
+        "¿Cuáles son los requisitos de las bases del concurso?",
+        "Según la política publicada, ¿cuántos días tengo para responder?",
+        "¿En qué sección del manual se explica el proceso de compras?",
+        "Busca en los documentos la definición de proveedor crítico",
+        "¿Qué establece el código de ética sobre regalos?",
+        "Dame las condiciones del contrato que está en el gestor documental",
+    ],
+    "hr": [
+        "¿Cuántos días de vacaciones me corresponden al año?",
+        "¿Cómo solicito un permiso por nacimiento de un hijo?",
+        "¿Qué hago si sufro acoso laboral según la Ley Karin?",
+        "¿Cómo se calcula la indemnización por años de servicio?",
+        "¿Cuál es el procedimiento para pedir licencia médica?",
+        "¿Qué beneficios tiene el seguro complementario de salud?",
+        "¿Cómo funciona la evaluación de desempeño anual?",
+        "¿Puedo trabajar en modalidad de teletrabajo?",
+    ],
+    "legal": [
+        "¿Qué exige la ley de protección de datos personales?",
+        "¿Este contrato cumple con la normativa vigente?",
+        "¿Cuáles son las obligaciones de compliance para la empresa?",
+        "¿Qué sanciones contempla la ley por incumplimiento normativo?",
+        "¿Cómo se redacta una cláusula de confidencialidad?",
+        "¿Qué modelo de prevención de delitos exige la Ley 20.393?",
+        "¿Cuál es el plazo legal para responder un requerimiento?",
+        "¿Qué responsabilidad tiene la empresa frente a un subcontratista?",
+    ],
+    "technical": [
+        "No puedo conectarme a la VPN de la empresa",
+        "¿Cómo restablezco mi contraseña del correo?",
+        "El sistema ERP muestra un error al iniciar sesión",
+        "¿Cómo instalo la impresora de la oficina?",
+        "Mi computador está muy lento, ¿qué hago?",
+        "¿Cómo configuro la autenticación en dos pasos?",
+        "La API devuelve un error 500 al consultar pedidos",
+        "¿Cómo solicito acceso a una carpeta compartida?",
+    ],
+    "training": [
+        "¿Qué cursos de capacitación hay disponibles este mes?",
+        "¿Cómo me inscribo en un curso con franquicia SENCE?",
+        "¿Dónde encuentro el material del curso de inducción?",
+        "¿Cómo diseño una evaluación para un curso e-learning?",
+        "¿Qué plataforma LMS usamos para la formación interna?",
+        "¿Cuándo obtengo el certificado del curso que terminé?",
+        "Quiero armar un plan de formación para mi equipo",
+        "¿Cómo se miden los objetivos de aprendizaje de un taller?",
+    ],
+}
+
+
+def _normalize(vector: list[float]) -> list[float]:
+    norm = math.sqrt(sum(value * value for value in vector))
+    if not norm:
+        return vector
+    return [value / norm for value in vector]
+
+
+def _load_examples() -> dict[str, list[str]]:
+    if not INTENT_EXAMPLES_PATH:
+        return ROUTE_EXAMPLES
+    with open(INTENT_EXAMPLES_PATH, encoding="utf-8") as handle:
+        return json.load(handle)
+
+
+def build_centroids() -> dict:
+    # Un centroide normalizado por ruta, a partir de sus preguntas de ejemplo.
+    examples = _load_examples()
+    routes = [route for route, questions in examples.items() if questions]
+    texts = [question for route in routes for question in examples[route]]
+    vectors = embed_texts(texts)
+
+    centroids: dict[str, list[float]] = {}
+    offset = 0
+    for route in routes:
+        count = len(examples[route])
+        route_vectors = vectors[offset:offset + count]
+        offset += count
+        centroids[route] = _normalize([sum(values) / count for values in zip(*route_vectors)])
+
+    data = {
+        "model": embedding_signature(),
+        "built_at": datetime.utcnow().isoformat(),
+        "examples": {route: len(examples[route]) for route in routes},
+        "centroids": centroids,
+    }
+    tmp_path = f"{INTENT_CENTROIDS_PATH}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as handle:
+        json.dump(data, handle)
+    os.replace(tmp_path, INTENT_CENTROIDS_PATH)
+
+    state.intent_centroids = centroids
+    logger.info("🧭 Centroides de intención reconstruidos (%s rutas)", len(centroids))
+    return {key: value for key, value in data.items() if key != "centroids"}
+
+
+def load_centroids() -> bool:
+    if not os.path.exists(INTENT_CENTROIDS_PATH):
+        return False
+    with open(INTENT_CENTROIDS_PATH, encoding="utf-8") as handle:
+        data = json.load(handle)
+    if data.get("model") != embedding_signature():
+        logger.warning("🧭 Centroides generados con otro modelo; se ignoran")
+        return False
+    state.intent_centroids = data["centroids"]
+    return True
+
+
+def init_intent_classifier() -> None:
+    if not INTENT_CLASSIFIER_ENABLED:
+        return
+    try:
+        if load_centroids():
+            logger.info("✅ Clasificador de intención local cargado")
+            return
+        build_centroids()
+    except Exception as exc:
+        # Sin centroides se sigue usando el router LLM.
+        logger.warning("⚠️ Clasificador de intención no disponible: %s", exc)
+
+
+def intent_classifier_ready() -> bool:
+    return INTENT_CLASSIFIER_ENABLED and bool(state.intent_centroids)
+
+
+def classify_vector(query_vector: list[float]) -> RouteDecision | None:
+    centroids = state.intent_centroids
+    if not centroids:
+        return None
+
+    query = _normalize(query_vector)
+    similarities = {
+        route: sum(a * b for a, b in zip(query, centroid))
+        for route, centroid in centroids.items()
+    }
+    # Softmax con temperatura: convierte similitudes coseno en confianza.
+    best = max(similarities.values())
+    weights = {
+        route: math.exp((similarity - best) / INTENT_TEMPERATURE)
+        for route, similarity in similarities.items()
+    }
+    route = max(weights, key=weights.get)
+    confidence = weights[route] / sum(weights.values())
+    return RouteDecision(route=route, confidence=round(confidence, 4))
+
+
+async def route_question(question: str, query_vector: list[float]) -> RouteDecision:
+    # Clasificación local con el vector de retrieval; LLM solo si hay duda.
+    decision = classify_vector(query_vector)
+    if decision and decision.confidence >= INTENT_CONFIDENCE_THRESHOLD:
+        return decision
+
+    logger.info(
+        "🧭 Confianza local insuficiente (%s); usando router LLM",
+        decision.confidence if decision else None,
+    )
+    return await route_intent(question)
+
+
+if __name__ == "__main__":
+    openai.api_key = OPENAI_API_KEY
+    print(json.dumps(build_centroids(), ensure_ascii=False, indent=2))
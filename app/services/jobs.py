@@ -0,0 +1,399 @@
+import asyncio
+import json
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+
+from fastapi import HTTPException, UploadFile
+from sqlalchemy import func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import INGESTION_JOB_LEASE_SECONDS, INGESTION_WORKERS, logger
+from app.db import AsyncSessionLocal
+from app.models import DocumentChunk, IngestionJob
+from app.services.documents import (
+    build_storage_path,
+    create_document_version,
+    ensure_new_file_hash,
+    index_document,
+    store_upload,
+    validate_new_version,
+    validate_upload_filename,
+    version_committed,
+)
+
+JOB_INDEX_DOCUMENT = "index_document"
+JOB_CREATE_VERSION = "create_document_version"
+
+# Identifica a esta réplica como dueña de los jobs que ejecuta.
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class JobQueue:
+    # Cola en memoria con N workers; el estado durable vive en ingestion_jobs.
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._queue: asyncio.Queue[str] | None = None
+        self._queued: set[str] = set()
+        self._tasks: list[asyncio.Task] = []
+
+    async def start(self) -> None:
+        self._queue = asyncio.Queue()
+        self._tasks = [
+            asyncio.create_task(self._worker(idx))
+            for idx in range(self.workers)
+        ]
+        self._tasks.append(asyncio.create_task(self._reclaim_loop()))
+        for job_id in await _recover_pending_jobs():
+            self.submit(job_id)
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, job_id: str) -> None:
+        # Un job ya encolado aquí no se duplica; entre réplicas decide _claim_job.
+        if job_id in self._queued:
+            return
+        self._queued.add(job_id)
+        self._queue.put_nowait(job_id)
+
+    async def _reclaim_loop(self) -> None:
+        # Retoma periódicamente jobs de réplicas caídas (lease vencido).
+        while True:
+            await asyncio.sleep(INGESTION_JOB_LEASE_SECONDS)
+            try:
+                for job_id in await _recover_pending_jobs():
+                    self.submit(job_id)
+            except Exception as exc:
+                logger.warning("No se pudieron revisar jobs abandonados: %s", exc)
+
+    async def _worker(self, idx: int) -> None:
+        while True:
+            job_id = await self._queue.get()
+            self._queued.discard(job_id)
+            try:
+                await _run_job(job_id)
+            except Exception as exc:
+                logger.error("❌ Worker de ingesta %s falló en %s", idx, job_id, exc_info=exc)
+            finally:
+                self._queue.task_done()
+
+
+job_queue = JobQueue(INGESTION_WORKERS)
+
+
+async def _recover_pending_jobs() -> list[str]:
+    # Jobs "running" sin latido dentro del lease (réplica caída o reiniciada)
+    # vuelven a la cola; los de réplicas vivas siguen con su dueño.
+    stale_before = datetime.utcnow() - timedelta(seconds=INGESTION_JOB_LEASE_SECONDS)
+    async with AsyncSessionLocal() as db:
+        reclaimed = await db.execute(
+            update(IngestionJob)
+            .where(
+                IngestionJob.status == "running",
+                or_(IngestionJob.updated_at.is_(None), IngestionJob.updated_at < stale_before),
+            )
+            .values(status="queued", owner=None)
+        )
+        await db.commit()
+        job_ids = list((await db.scalars(
+            select(IngestionJob.job_id)
+            .where(IngestionJob.status == "queued")
+            .order_by(IngestionJob.created_at)
+        )).all())
+    if reclaimed.rowcount:
+        logger.info("🔁 Retomando %s jobs de ingesta con lease vencido", reclaimed.rowcount)
+    return job_ids
+
+
+async def _update_job(job_id: str, **values) -> None:
+    # Sesión propia: el avance es visible aunque la ingesta no haya hecho commit.
+    async with AsyncSessionLocal() as db:
+        values["updated_at"] = datetime.utcnow()
+        await db.execute(
+            update(IngestionJob)
+            .where(IngestionJob.job_id == job_id)
+            .values(**values)
+        )
+        await db.commit()
+
+
+async def _claim_job(job_id: str) -> IngestionJob | None:
+    async with AsyncSessionLocal() as db:
+        now = datetime.utcnow()
+        claimed = await db.execute(
+            update(IngestionJob)
+            .where(IngestionJob.job_id == job_id, IngestionJob.status == "queued")
+            .values(
+                status="running",
+                owner=WORKER_ID,
+                started_at=now,
+                updated_at=now,
+                attempts=IngestionJob.attempts + 1,
+            )
+        )
+        await db.commit()
+        if not claimed.rowcount:
+            return None
+        return await db.scalar(select(IngestionJob).where(IngestionJob.job_id == job_id))
+
+
+async def _renew_lease(job_id: str) -> None:
+    # Latido del dueño mientras el job corre; sin él otra réplica lo retomaría.
+    while True:
+        await asyncio.sleep(INGESTION_JOB_LEASE_SECONDS / 3)
+        try:
+            async with AsyncSessionLocal() as db:
+                renewed = await db.execute(
+                    update(IngestionJob)
+                    .where(
+                        IngestionJob.job_id == job_id,
+                        IngestionJob.owner == WORKER_ID,
+                        IngestionJob.status == "running",
+                    )
+                    .values(updated_at=datetime.utcnow())
+                )
+                await db.commit()
+            if not renewed.rowcount:
+                logger.warning("⚠️ Job %s ya no pertenece a esta réplica", job_id)
+                return
+        except Exception as exc:
+            logger.warning("No se pudo renovar el lease del job %s: %s", job_id, exc)
+
+
+async def _committed_result(job: IngestionJob, db: AsyncSession) -> dict:
+    chunks = await db.scalar(
+        select(func.count())
+        .select_from(DocumentChunk)
+        .where(DocumentChunk.version_id == job.version_id)
+    )
+    if job.kind == JOB_INDEX_DOCUMENT:
+        return {"id": job.document_id, "filename": job.filename, "chunks": chunks, "status": "indexed"}
+    return {"document_id": job.document_id, "version": job.version, "chunks": chunks}
+
+
+async def _complete_job(job_id: str, result: dict) -> None:
+    await _update_job(
+        job_id,
+        status="completed",
+        stage="completed",
+        progress=1.0,
+        result=json.dumps(result, ensure_ascii=False),
+        finished_at=datetime.utcnow(),
+    )
+
+
+async def _fail_job(job: IngestionJob, error: str) -> None:
+    # Estado final: el archivo subido ya no se reintentará, salvo que sea el
+    # de una versión confirmada.
+    async with AsyncSessionLocal() as db:
+        committed = await version_committed(job.version_id, db)
+    if not committed:
+        _remove_file(job.file_path)
+    await _update_job(job.job_id, status="failed", error=error, finished_at=datetime.utcnow())
+
+
+async def _run_job(job_id: str) -> None:
+    job = await _claim_job(job_id)
+    if job is None:
+        return
+
+    # Un worker pudo caer entre el commit de la ingesta y marcar el job como
+    # completado: re-ejecutarlo chocaría con la versión ya confirmada.
+    async with AsyncSessionLocal() as db:
+        if await version_committed(job.version_id, db):
+            logger.info("🔁 Job %s ya había confirmado la versión %s", job_id, job.version_id)
+            await _complete_job(job_id, await _committed_result(job, db))
+            return
+
+    async def progress(stage: str, fraction: float) -> None:
+        # El avance es informativo: un fallo al registrarlo no aborta la ingesta.
+        try:
+            await _update_job(job_id, stage=stage, progress=fraction)
+        except Exception as exc:
+            logger.warning("No se pudo registrar el avance del job %s: %s", job_id, exc)
+
+    params = json.loads(job.params or "{}")
+    lease_task = asyncio.create_task(_renew_lease(job_id))
+    async with AsyncSessionLocal() as db:
+        try:
+            if job.kind == JOB_INDEX_DOCUMENT:
+                result = await index_document(
+                    file_path=job.file_path,
+                    filename=job.filename,
+                    file_size=job.file_size,
+                    file_hash=job.file_hash,
+                    db=db,
+                    document_id=job.document_id,
+                    version_id=job.version_id,
+                    version=job.version,
+                    progress=progress,
+                    **params,
+                )
+            elif job.kind == JOB_CREATE_VERSION:
+                result = await create_document_version(
+                    document_id=job.document_id,
+                    file_path=job.file_path,
+                    filename=job.filename,
+                    file_size=job.file_size,
+                    file_hash=job.file_hash,
+                    db=db,
+                    version=job.version,
+                    version_id=job.version_id,
+                    progress=progress,
+                    **params,
+                )
+            else:
+                raise ValueError(f"Tipo de job desconocido: {job.kind}")
+        except HTTPException as exc:
+            await db.rollback()
+            await _fail_job(job, str(exc.detail))
+            return
+        except Exception as exc:
+            await db.rollback()
+            logger.error("❌ Error en job de ingesta %s", job_id, exc_info=exc)
+            await _fail_job(job, str(exc))
+            return
+        finally:
+            lease_task.cancel()
+
+    await _complete_job(job_id, result)
+
+
+async def _create_job(
+    db: AsyncSession,
+    kind: str,
+    document_id: str,
+    version_id: str,
+    version: str,
+    filename: str,
+    file_path: str,
+    file_size: int,
+    file_hash: str,
+    params: dict,
+) -> IngestionJob:
+    now = datetime.utcnow()
+    job = IngestionJob(
+        job_id=str(uuid.uuid4()),
+        kind=kind,
+        status="queued",
+        stage="queued",
+        progress=0.0,
+        document_id=document_id,
+        version_id=version_id,
+        version=version,
+        filename=filename,
+        file_path=file_path,
+        file_size=file_size,
+        file_hash=file_hash,
+        params=json.dumps(params, ensure_ascii=False),
+        attempts=0,
+        created_at=now,
+        updated_at=now,
+    )
+    db.add(job)
+    await db.commit()
+    job_queue.submit(job.job_id)
+    return job
+
+
+def _remove_file(filepath: str) -> None:
+    if os.path.exists(filepath):
+        try:
+            os.remove(filepath)
+        except OSError as cleanup_exc:
+            logger.warning("No se pudo eliminar el archivo %s: %s", filepath, cleanup_exc)
+
+
+async def submit_index_job(file: UploadFile, db: AsyncSession, version: str = "1.0", **params) -> dict:
+    safe_filename = validate_upload_filename(file.filename)
+    document_id = str(uuid.uuid4())
+    version_id = str(uuid.uuid4())
+    filepath = build_storage_path(document_id, version_id, safe_filename)
+
+    try:
+        file_size, file_hash = await store_upload(file, filepath)
+        job = await _create_job(
+            db,
+            kind=JOB_INDEX_DOCUMENT,
+            document_id=document_id,
+            version_id=version_id,
+            version=version,
+            filename=safe_filename,
+            file_path=filepath,
+            file_size=file_size,
+            file_hash=file_hash,
+            params=params,
+        )
+    except Exception:
+        _remove_file(filepath)
+        raise
+
+    return _serialize_job(job)
+
+
+async def submit_version_job(
+    document_id: str,
+    file: UploadFile,
+    db: AsyncSession,
+    version: str,
+    change_summary: str | None = None,
+) -> dict:
+    safe_filename = validate_upload_filename(file.filename)
+    # Validaciones baratas antes de aceptar el upload; el job las repite.
+    await validate_new_version(document_id, version, db)
+
+    version_id = str(uuid.uuid4())
+    filepath = build_storage_path(document_id, version_id, safe_filename)
+
+    try:
+        file_size, file_hash = await store_upload(file, filepath)
+        await ensure_new_file_hash(document_id, file_hash, db)
+        job = await _create_job(
+            db,
+            kind=JOB_CREATE_VERSION,
+            document_id=document_id,
+            version_id=version_id,
+            version=version,
+            filename=safe_filename,
+            file_path=filepath,
+            file_size=file_size,
+            file_hash=file_hash,
+            params={"change_summary": change_summary},
+        )
+    except Exception:
+        _remove_file(filepath)
+        raise
+
+    return _serialize_job(job)
+
+
+def _serialize_job(job: IngestionJob) -> dict:
+    return {
+        "job_id": job.job_id,
+        "kind": job.kind,
+        "status": job.status,
+        "stage": job.stage,
+        "progress": job.progress,
+        "document_id": job.document_id,
+        "version": job.version,
+        "filename": job.filename,
+        "result": json.loads(job.result) if job.result else None,
+        "error": job.error,
+        "attempts": job.attempts,
+        "created_at": job.created_at.isoformat(),
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+async def get_job(job_id: str, db: AsyncSession) -> dict:
+    job = await db.scalar(select(IngestionJob).where(IngestionJob.job_id == job_id))
+    if not job:
+        raise HTTPException(404, "Job no encontrado")
+    return _serialize_job(job)
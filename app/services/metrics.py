@@ -0,0 +1,219 @@
+"""
+Métricas en formato de exposición de texto de Prometheus, sin agente ni
+dependencias externas: cada métrica guarda sus valores en memoria del
+proceso y /api/metrics los serializa en cada scrape.
+
+Las métricas con callback (pool de la base, threadpools, caché de respuestas)
+se calculan al momento del scrape en lugar de actualizarse en cada evento.
+"""
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
+# Segundos: cubre desde una búsqueda en Qdrant hasta una generación larga.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Ingesta: embeddings y upserts de documentos grandes tardan minutos.
+INGEST_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+Callback = Callable[[], dict[tuple, float]]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _Metric:
+    type_name = "untyped"
+
+    def __init__(self, name: str, help_text: str, labels: tuple[str, ...] = (), callback: Callback | None = None):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self._callback = callback
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(label, "")) for label in self.labels)
+
+    def _label_text(self, key: tuple, extra: tuple = ()) -> str:
+        pairs = [*zip(self.labels, key), *extra]
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in pairs) + "}"
+
+    def _collect(self) -> dict[tuple, float]:
+        if self._callback is not None:
+            return self._callback()
+        with self._lock:
+            return dict(self._values)
+
+    def _samples(self) -> list[str]:
+        return [
+            f"{self.name}{self._label_text(key)} {_format_value(value)}"
+            for key, value in sorted(self._collect().items())
+        ]
+
+    def render(self) -> list[str]:
+        return [
+            f"# HELP {self.name} {self.help}",
+            f"# TYPE {self.name} {self.type_name}",
+            *self._samples(),
+        ]
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(_Metric):
+    type_name = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    @contextmanager
+    def track(self, **labels) -> Iterator[None]:
+        # Cuenta lo que está en curso mientras dura el bloque.
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: tuple[str, ...] = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+        # Por combinación de labels: conteos por bucket (no acumulados), suma y total.
+        self._series: dict[tuple, tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        position = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, totals = self._series.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0, 0.0]))
+            counts[position] += 1
+            totals[0] += value
+            totals[1] += 1
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            series = {key: (list(counts), list(totals)) for key, (counts, totals) in self._series.items()}
+        lines = []
+        for key, (counts, (total_sum, total_count)) in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), counts):
+                cumulative += count
+                lines.append(
+                    f"{self.name}_bucket{self._label_text(key, (('le', _format_value(bound)),))} {cumulative}"
+                )
+            lines.append(f"{self.name}_sum{self._label_text(key)} {_format_value(total_sum)}")
+            lines.append(f"{self.name}_count{self._label_text(key)} {_format_value(total_count)}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Métrica duplicada: {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, help_text: str, labels: tuple[str, ...] = (), callback: Callback | None = None) -> Counter:
+    return REGISTRY.register(Counter(name, help_text, labels, callback))
+
+
+def gauge(name: str, help_text: str, labels: tuple[str, ...] = (), callback: Callback | None = None) -> Gauge:
+    return REGISTRY.register(Gauge(name, help_text, labels, callback))
+
+
+def histogram(name: str, help_text: str, labels: tuple[str, ...] = (), buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+    return REGISTRY.register(Histogram(name, help_text, labels, buckets))
+
+
+ASK_STAGE_SECONDS = histogram(
+    "apex_ask_stage_seconds",
+    "Duración de cada etapa de las preguntas (embed, route, search, generate, total…).",
+    ("endpoint", "stage"),
+)
+INGEST_STAGE_SECONDS = histogram(
+    "apex_ingest_stage_seconds",
+    "Duración de cada etapa de la ingesta (extract, split, embed, upsert, commit).",
+    ("stage",),
+    INGEST_BUCKETS,
+)
+OPENAI_TOKENS = counter(
+    "apex_openai_tokens_total",
+    "Tokens consumidos en OpenAI según el campo usage (o estimados en streaming).",
+    ("model", "kind"),
+)
+OPENAI_RETRIES = counter(
+    "apex_openai_retries_total",
+    "Reintentos de llamadas a OpenAI por error transitorio.",
+    ("operation",),
+)
+# Sin registrar: se expone junto a los otros pools en apex_threadpool_busy.
+EMBEDDING_THREADS_BUSY = Gauge(
+    "apex_embedding_threads_busy",
+    "Lotes de embeddings de ingesta en curso en el pool de threads.",
+)
+
+
+def record_token_usage(model: str, usage: dict | None) -> None:
+    if not usage:
+        return
+    for kind in ("prompt_tokens", "completion_tokens"):
+        if usage.get(kind):
+            OPENAI_TOKENS.inc(usage[kind], model=model, kind=kind.removesuffix("_tokens"))
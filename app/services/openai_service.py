@@ -1,91 +1,258 @@
+import asyncio
 import json
+from functools import lru_cache
+from typing import AsyncIterator
 
+import aiohttp
 import openai
+import tiktoken
 from fastapi import HTTPException
 
-from app.config import EMBEDDING_MODEL, logger
+from app.config import (
+    EMBEDDING_CONCURRENCY,
+    EMBEDDING_MODEL,
+    OPENAI_MAX_CONNECTIONS,
+    QUERY_EMBEDDING_CACHE_SIZE,
+    QUERY_EMBEDDING_CACHE_TTL,
+    logger,
+)
 from app.schemas import RouteDecision
+from app.services.cache import TTLCache
+from app.services.embeddings import (
+    build_batches,
+    embedding_kwargs,
+    embedding_signature,
+    retry_embeddings,
+)
+from app.services.metrics import OPENAI_TOKENS, record_token_usage
+from app.services.tracing import span
+from app.state import state
 
+CHAT_MODEL = "gpt-4o-mini"
 
-def embed_query(text: str) -> list[float]:
-    response = openai.Embedding.create(
-        model=EMBEDDING_MODEL,
-        input=text,
+_query_embedding_cache = TTLCache(
+    maxsize=QUERY_EMBEDDING_CACHE_SIZE,
+    ttl=QUERY_EMBEDDING_CACHE_TTL,
+)
+
+
+def _normalize_query(text: str) -> str:
+    return " ".join(text.casefold().split())
+
+
+def init_openai_session() -> aiohttp.ClientSession:
+    # Pool de conexiones HTTP compartido; sin él openai abre una sesión por llamada.
+    return aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(limit=OPENAI_MAX_CONNECTIONS),
     )
-    return response["data"][0]["embedding"]
 
 
-def generate_answer(question: str, context: str) -> str:
-    try:
-        response = openai.ChatCompletion.create(
-            model="gpt-4o-mini",
-            messages=[
-                {
-                    "role": "system",
-                    "content": (
-                        "Eres un sistema RAG estricto.\n"
-                        "REGLAS OBLIGATORIAS:\n"
-                        "- Usa EXCLUSIVAMENTE el contenido del contexto.\n"
-                        "- Cada afirmación relevante DEBE incluir una cita explícita.\n"
-                        "- Usa el formato (FUENTE X).\n"
-                        "- NO uses conocimiento previo.\n"
-                        "- NO inventes información.\n"
-                        "- Si el contexto no contiene la respuesta, responde EXACTAMENTE:\n"
-                        "  'No hay información suficiente en los documentos cargados.'\n"
-                        "- Responde en español formal.\n"
-                        "- Está PROHIBIDO escribir afirmaciones sin '(FUENTE X)'.\n"
-                        "- Si no puedes respaldar una afirmación con una FUENTE, no la incluyas.\n"
-                    ),
-                },
-                {
-                    "role": "user",
-                    "content": (
-                        "CONTEXTO DOCUMENTAL:\n"
-                        f"{context}\n\n"
-                        "PREGUNTA DEL USUARIO:\n"
-                        f"{question}\n\n"
-                        "INSTRUCCIONES DE RESPUESTA:\n"
-                        "- Responde SOLO con base en el contexto.\n"
-                        "- Cuando cites texto literal del contexto, encierra la frase entre comillas.\n"
-                        "- Incluye la referencia correspondiente en formato (FUENTE X).\n"
-                    ),
-                },
-            ],
-            temperature=0.2,
+def _use_shared_session() -> None:
+    # openai 0.28 toma la sesión de un ContextVar: se fija en el contexto del request.
+    if state.openai_session is not None:
+        openai.aiosession.set(state.openai_session)
+
+
+async def embed_query(text: str) -> list[float]:
+    # Preguntas repetidas (FAQ) no vuelven a pagar la llamada a OpenAI.
+    cache_key = (embedding_signature(), _normalize_query(text))
+    cached = _query_embedding_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    _use_shared_session()
+    with span("openai.embeddings", inputs=1) as current:
+        response = await openai.Embedding.acreate(
+            model=EMBEDDING_MODEL,
+            input=text,
+            **embedding_kwargs(),
+        )
+        current.set(tokens=(response.get("usage") or {}).get("total_tokens"))
+    record_token_usage(EMBEDDING_MODEL, response.get("usage"))
+    embedding = response["data"][0]["embedding"]
+    _query_embedding_cache.set(cache_key, embedding)
+    return embedding
+
+
+@retry_embeddings
+async def _aembed_batch(texts: list[str], semaphore: asyncio.Semaphore) -> dict:
+    # El semáforo se toma por intento: las esperas entre reintentos no ocupan cupo.
+    async with semaphore:
+        return await openai.Embedding.acreate(
+            model=EMBEDDING_MODEL,
+            input=texts,
+            **embedding_kwargs(),
         )
+
+
+async def embed_queries(texts: list[str]) -> list[list[float]]:
+    # Varias preguntas en la menor cantidad de llamadas: cada lote lleva muchos
+    # inputs y hasta EMBEDDING_CONCURRENCY lotes van a la vez, con los mismos
+    # reintentos que la ingesta. Usa el mismo caché que embed_query.
+    signature = embedding_signature()
+    keys = [(signature, _normalize_query(text)) for text in texts]
+    vectors = {key: _query_embedding_cache.get(key) for key in keys}
+    pending = {}
+    for key, text in zip(keys, texts):
+        if vectors[key] is None:
+            pending.setdefault(key, text)
+
+    if pending:
+        pending_keys = list(pending)
+        pending_texts = list(pending.values())
+        batches = build_batches(pending_texts)
+        semaphore = asyncio.Semaphore(EMBEDDING_CONCURRENCY)
+        _use_shared_session()
+        with span("openai.embeddings", inputs=len(pending_texts), batches=len(batches)):
+            responses = await asyncio.gather(*(
+                _aembed_batch([pending_texts[idx] for idx in batch], semaphore)
+                for batch in batches
+            ))
+        for batch, response in zip(batches, responses):
+            record_token_usage(EMBEDDING_MODEL, response.get("usage"))
+            # La API no garantiza el orden de "data"; usamos el índice devuelto.
+            data = sorted(response["data"], key=lambda item: item["index"])
+            if len(data) != len(batch):
+                raise RuntimeError("OpenAI devolvió un número inesperado de embeddings")
+            for idx, item in zip(batch, data):
+                vectors[pending_keys[idx]] = item["embedding"]
+                _query_embedding_cache.set(pending_keys[idx], item["embedding"])
+
+    return [vectors[key] for key in keys]
+
+
+@lru_cache(maxsize=1)
+def _chat_encoding() -> tiktoken.Encoding:
+    try:
+        return tiktoken.encoding_for_model(CHAT_MODEL)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+
+
+def count_prompt_tokens(text: str) -> int:
+    # Tokens con el tokenizador del modelo de chat (no el de embeddings).
+    return len(_chat_encoding().encode(text, disallowed_special=()))
+
+
+def _answer_messages(question: str, context: str) -> list[dict]:
+    return [
+        {
+            "role": "system",
+            "content": (
+                "Eres un sistema RAG estricto.\n"
+                "REGLAS OBLIGATORIAS:\n"
+                "- Usa EXCLUSIVAMENTE el contenido del contexto.\n"
+                "- Cada afirmación relevante DEBE incluir una cita explícita.\n"
+                "- Usa el formato (FUENTE X).\n"
+                "- NO uses conocimiento previo.\n"
+                "- NO inventes información.\n"
+                "- Si el contexto no contiene la respuesta, responde EXACTAMENTE:\n"
+                "  'No hay información suficiente en los documentos cargados.'\n"
+                "- Responde en español formal.\n"
+                "- Está PROHIBIDO escribir afirmaciones sin '(FUENTE X)'.\n"
+                "- Si no puedes respaldar una afirmación con una FUENTE, no la incluyas.\n"
+            ),
+        },
+        {
+            "role": "user",
+            "content": (
+                "CONTEXTO DOCUMENTAL:\n"
+                f"{context}\n\n"
+                "PREGUNTA DEL USUARIO:\n"
+                f"{question}\n\n"
+                "INSTRUCCIONES DE RESPUESTA:\n"
+                "- Responde SOLO con base en el contexto.\n"
+                "- Cuando cites texto literal del contexto, encierra la frase entre comillas.\n"
+                "- Incluye la referencia correspondiente en formato (FUENTE X).\n"
+            ),
+        },
+    ]
+
+
+async def generate_answer(question: str, context: str) -> str:
+    try:
+        _use_shared_session()
+        with span("openai.chat", purpose="answer") as current:
+            response = await openai.ChatCompletion.acreate(
+                model=CHAT_MODEL,
+                messages=_answer_messages(question, context),
+                temperature=0.2,
+            )
+            current.set(**(response.get("usage") or {}))
+        record_token_usage(CHAT_MODEL, response.get("usage"))
         return response["choices"][0]["message"]["content"]
     except Exception as exc:
         logger.error("❌ Error generando respuesta", exc_info=exc)
         raise HTTPException(status_code=500, detail="Error generando respuesta IA")
 
 
-def route_intent(question: str) -> RouteDecision:
-    response = openai.ChatCompletion.create(
-        model="gpt-4o-mini",
-        messages=[
-            {
-                "role": "system",
-                "content": (
-                    "Eres un clasificador de intención.\n"
-                    "Tu única tarea es clasificar la pregunta en UNA sola ruta.\n\n"
-                    "Rutas posibles:\n"
-                    "- rag → preguntas que deben responderse usando documentos cargados\n"
-                    "- hr → recursos humanos, ética, legislación laboral\n"
-                    "- legal → cumplimiento normativo, contratos, leyes\n"
-                    "- technical → tecnología, sistemas, soporte TI\n"
-                    "- training → capacitación, cursos, formación\n\n"
-                    "Responde SOLO en JSON válido, sin texto adicional.\n"
-                    "Formato EXACTO:\n"
-                    '{ "route": "rag|hr|legal|technical|training", "confidence": 0.0 }'
-                ),
-            },
-            {
-                "role": "user",
-                "content": question,
-            },
-        ],
-        temperature=0,
-    )
+async def generate_answer_stream(question: str, context: str) -> AsyncIterator[str]:
+    # Mismo prompt que generate_answer, entregando los tokens a medida que llegan.
+    # En streaming la API no informa usage: el prompt se cuenta localmente y
+    # cada delta de contenido cuenta como un token de respuesta.
+    messages = _answer_messages(question, context)
+    try:
+        _use_shared_session()
+        with span("openai.chat.stream", purpose="answer") as current:
+            response = await openai.ChatCompletion.acreate(
+                model=CHAT_MODEL,
+                messages=messages,
+                temperature=0.2,
+                stream=True,
+            )
+            prompt_tokens = sum(count_prompt_tokens(message["content"]) for message in messages)
+            OPENAI_TOKENS.inc(prompt_tokens, model=CHAT_MODEL, kind="prompt")
+            completion_tokens = 0
+            async for chunk in response:
+                choices = chunk.get("choices") or []
+                if not choices:
+                    continue
+                token = choices[0].get("delta", {}).get("content")
+                if token:
+                    OPENAI_TOKENS.inc(model=CHAT_MODEL, kind="completion")
+                    completion_tokens += 1
+                    current.set(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+                    yield token
+    except Exception as exc:
+        logger.error("❌ Error generando respuesta", exc_info=exc)
+        raise HTTPException(status_code=500, detail="Error generando respuesta IA")
+
+
+def _route_messages(question: str) -> list[dict]:
+    return [
+        {
+            "role": "system",
+            "content": (
+                "Eres un clasificador de intención.\n"
+                "Tu única tarea es clasificar la pregunta en UNA sola ruta.\n\n"
+                "Rutas posibles:\n"
+                "- rag → preguntas que deben responderse usando documentos cargados\n"
+                "- hr → recursos humanos, ética, legislación laboral\n"
+                "- legal → cumplimiento normativo, contratos, leyes\n"
+                "- technical → tecnología, sistemas, soporte TI\n"
+                "- training → capacitación, cursos, formación\n\n"
+                "Responde SOLO en JSON válido, sin texto adicional.\n"
+                "Formato EXACTO:\n"
+                '{ "route": "rag|hr|legal|technical|training", "confidence": 0.0 }'
+            ),
+        },
+        {
+            "role": "user",
+            "content": question,
+        },
+    ]
+
+
+async def route_intent(question: str) -> RouteDecision:
+    _use_shared_session()
+    with span("openai.chat", purpose="route") as current:
+        response = await openai.ChatCompletion.acreate(
+            model=CHAT_MODEL,
+            messages=_route_messages(question),
+            temperature=0,
+        )
+        current.set(**(response.get("usage") or {}))
+    record_token_usage(CHAT_MODEL, response.get("usage"))
 
     content = response["choices"][0]["message"]["content"]
 
@@ -1,23 +1,252 @@
-from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams
+from typing import List
 
-from app.config import QDRANT_COLLECTION, QDRANT_HOST, QDRANT_PORT, logger
+from qdrant_client import AsyncQdrantClient, QdrantClient
+from qdrant_client.models import (
+    BinaryQuantization,
+    BinaryQuantizationConfig,
+    Disabled,
+    Distance,
+    PayloadSchemaType,
+    QuantizationSearchParams,
+    ScalarQuantization,
+    ScalarQuantizationConfig,
+    ScalarType,
+    SearchParams,
+    VectorParams,
+    VectorParamsDiff,
+)
 
+from app.config import (
+    ANSWER_CACHE_COLLECTION,
+    ANSWER_CACHE_ENABLED,
+    QDRANT_COLLECTION,
+    QDRANT_HOST,
+    QDRANT_PORT,
+    QDRANT_QUANTIZATION,
+    QDRANT_QUANTIZATION_ALWAYS_RAM,
+    QDRANT_SEARCH_OVERSAMPLING,
+    QDRANT_SEARCH_RESCORE,
+    QDRANT_TWO_STAGE_SEARCH,
+    QDRANT_VECTORS_ON_DISK,
+    logger,
+)
+from app.services.embeddings import full_dimensions, index_dimensions, query_dimensions, shorten
 
-def init_qdrant() -> QdrantClient:
-    client = QdrantClient(host=QDRANT_HOST, port=QDRANT_PORT)
+# Campos por los que filtran búsquedas, set_payload y deletes.
+PAYLOAD_INDEXES = {
+    "document_id": PayloadSchemaType.KEYWORD,
+    "version": PayloadSchemaType.KEYWORD,
+    "category": PayloadSchemaType.KEYWORD,
+    "department": PayloadSchemaType.KEYWORD,
+    "is_current": PayloadSchemaType.BOOL,
+    "deleted": PayloadSchemaType.BOOL,
+    "public": PayloadSchemaType.BOOL,
+}
 
-    collections = [c.name for c in client.get_collections().collections]
-    if QDRANT_COLLECTION not in collections:
-        client.create_collection(
-            collection_name=QDRANT_COLLECTION,
-            vectors_config=VectorParams(
-                size=1536,
+# Filtros del caché de respuestas (app.services.answer_cache).
+ANSWER_CACHE_INDEXES = {
+    "generation": PayloadSchemaType.INTEGER,
+    "top_k": PayloadSchemaType.INTEGER,
+    "signature": PayloadSchemaType.KEYWORD,
+    "created_at": PayloadSchemaType.FLOAT,
+}
+
+QUANTIZATION_MODES = ("none", "scalar", "binary")
+
+# Vectores con nombre de la búsqueda en dos etapas.
+SHORT_VECTOR = "short"
+FULL_VECTOR = "full"
+
+
+def quantization_config(mode: str = QDRANT_QUANTIZATION):
+    if mode not in QUANTIZATION_MODES:
+        raise ValueError(f"QDRANT_QUANTIZATION inválido: {mode}")
+    if mode == "scalar":
+        return ScalarQuantization(scalar=ScalarQuantizationConfig(
+            type=ScalarType.INT8,
+            quantile=0.99,
+            always_ram=QDRANT_QUANTIZATION_ALWAYS_RAM,
+        ))
+    if mode == "binary":
+        return BinaryQuantization(binary=BinaryQuantizationConfig(
+            always_ram=QDRANT_QUANTIZATION_ALWAYS_RAM,
+        ))
+    return None
+
+
+def vectors_config() -> VectorParams | dict[str, VectorParams]:
+    if QDRANT_TWO_STAGE_SEARCH:
+        return {
+            SHORT_VECTOR: VectorParams(
+                size=index_dimensions(),
                 distance=Distance.COSINE,
+                on_disk=QDRANT_VECTORS_ON_DISK,
             ),
+            # Solo se lee para rescoring de unos pocos candidatos: siempre en disco.
+            FULL_VECTOR: VectorParams(
+                size=full_dimensions(),
+                distance=Distance.COSINE,
+                on_disk=True,
+            ),
+        }
+    return VectorParams(
+        size=index_dimensions(),
+        distance=Distance.COSINE,
+        on_disk=QDRANT_VECTORS_ON_DISK,
+    )
+
+
+def _vector_layout(vectors: VectorParams | dict[str, VectorParams]) -> dict[str, VectorParams]:
+    # El vector sin nombre se identifica como "" en la API de Qdrant.
+    if isinstance(vectors, VectorParams):
+        return {"": vectors}
+    return dict(vectors)
+
+
+def point_vector(embedding: List[float]) -> List[float] | dict[str, List[float]]:
+    if QDRANT_TWO_STAGE_SEARCH:
+        return {
+            SHORT_VECTOR: shorten(embedding, index_dimensions()),
+            FULL_VECTOR: embedding,
+        }
+    return embedding
+
+
+def search_params(mode: str = QDRANT_QUANTIZATION) -> SearchParams | None:
+    # Con cuantización: candidatos sobre el índice cuantizado y rescoring con los originales.
+    if mode == "none":
+        return None
+    return SearchParams(quantization=QuantizationSearchParams(
+        ignore=False,
+        rescore=QDRANT_SEARCH_RESCORE,
+        oversampling=QDRANT_SEARCH_OVERSAMPLING,
+    ))
+
+
+def ensure_payload_indexes(
+    client: QdrantClient,
+    collection_name: str = QDRANT_COLLECTION,
+    indexes: dict[str, PayloadSchemaType] = PAYLOAD_INDEXES,
+) -> None:
+    # Idempotente: solo crea (o corrige el tipo de) los índices que faltan.
+    schema = client.get_collection(collection_name).payload_schema or {}
+    for field_name, field_type in indexes.items():
+        existing = schema.get(field_name)
+        if existing is not None and existing.data_type == field_type:
+            continue
+        if existing is not None:
+            logger.warning(
+                "⚠️ Índice de payload %s con tipo %s; se recrea como %s",
+                field_name,
+                existing.data_type,
+                field_type,
+            )
+            client.delete_payload_index(collection_name, field_name, wait=True)
+        client.create_payload_index(
+            collection_name=collection_name,
+            field_name=field_name,
+            field_schema=field_type,
+            wait=True,
+        )
+        logger.info("🗂️ Índice de payload creado: %s (%s)", field_name, field_type.value)
+
+    schema = client.get_collection(collection_name).payload_schema or {}
+    missing = [
+        field_name
+        for field_name, field_type in indexes.items()
+        if field_name not in schema or schema[field_name].data_type != field_type
+    ]
+    if missing:
+        # Sin índices cada búsqueda filtrada recorre toda la colección: no se arranca así.
+        raise RuntimeError(
+            f"Índices de payload no disponibles en {collection_name} tras crearlos: {', '.join(missing)}"
         )
-        logger.info("📦 Colección Qdrant creada")
-    else:
-        logger.info("📦 Colección Qdrant existente")
+    logger.info("✅ Índices de payload verificados en %s (%s)", collection_name, len(indexes))
+
+
+def ensure_vector_storage(client: QdrantClient, collection_name: str = QDRANT_COLLECTION) -> None:
+    # Migra una colección existente a la cuantización/almacenamiento configurados.
+    # Qdrant reconstruye los segmentos en segundo plano; la colección sigue respondiendo.
+    config = client.get_collection(collection_name).config
+    current = _vector_layout(config.params.vectors)
+    desired = _vector_layout(vectors_config())
+
+    current_sizes = {name: params.size for name, params in current.items()}
+    desired_sizes = {name: params.size for name, params in desired.items()}
+    if current_sizes != desired_sizes:
+        # Cambiar dimensiones o vectores con nombre exige reindexar en otra colección.
+        raise RuntimeError(
+            f"La colección {collection_name} tiene vectores {current_sizes} y la "
+            f"configuración espera {desired_sizes}; reindexe en una nueva QDRANT_COLLECTION"
+        )
+
+    desired_quantization = quantization_config()
+    on_disk_changed = any(
+        bool(current[name].on_disk) != bool(params.on_disk)
+        for name, params in desired.items()
+    )
+    if config.quantization_config == desired_quantization and not on_disk_changed:
+        return
+
+    client.update_collection(
+        collection_name=collection_name,
+        vectors_config={
+            name: VectorParamsDiff(on_disk=params.on_disk)
+            for name, params in desired.items()
+        },
+        quantization_config=desired_quantization or Disabled.DISABLED,
+    )
+    logger.info(
+        "🔁 Colección Qdrant migrada: cuantización=%s, vectores en disco=%s",
+        QDRANT_QUANTIZATION,
+        QDRANT_VECTORS_ON_DISK,
+    )
+
+
+def ensure_answer_cache_collection(client: QdrantClient) -> None:
+    # Es un caché: si cambió el tamaño del embedding se descarta y se recrea.
+    collections = [c.name for c in client.get_collections().collections]
+    if ANSWER_CACHE_COLLECTION in collections:
+        vectors = client.get_collection(ANSWER_CACHE_COLLECTION).config.params.vectors
+        if isinstance(vectors, VectorParams) and vectors.size == query_dimensions():
+            ensure_payload_indexes(client, ANSWER_CACHE_COLLECTION, ANSWER_CACHE_INDEXES)
+            return
+        client.delete_collection(ANSWER_CACHE_COLLECTION)
+        logger.info("🔁 Caché de respuestas recreado por cambio de dimensiones")
+
+    client.create_collection(
+        collection_name=ANSWER_CACHE_COLLECTION,
+        vectors_config=VectorParams(size=query_dimensions(), distance=Distance.COSINE),
+    )
+    ensure_payload_indexes(client, ANSWER_CACHE_COLLECTION, ANSWER_CACHE_INDEXES)
+
+
+def init_qdrant() -> AsyncQdrantClient:
+    # Creación y migración de la colección con un cliente sync al arrancar;
+    # los requests usan el cliente async que se devuelve.
+    client = QdrantClient(host=QDRANT_HOST, port=QDRANT_PORT)
+    try:
+        collections = [c.name for c in client.get_collections().collections]
+        if QDRANT_COLLECTION not in collections:
+            client.create_collection(
+                collection_name=QDRANT_COLLECTION,
+                vectors_config=vectors_config(),
+                quantization_config=quantization_config(),
+            )
+            logger.info(
+                "📦 Colección Qdrant creada (dimensiones=%s, dos etapas=%s, cuantización=%s)",
+                index_dimensions(),
+                QDRANT_TWO_STAGE_SEARCH,
+                QDRANT_QUANTIZATION,
+            )
+        else:
+            logger.info("📦 Colección Qdrant existente")
+            ensure_vector_storage(client)
+
+        ensure_payload_indexes(client)
+        if ANSWER_CACHE_ENABLED:
+            ensure_answer_cache_collection(client)
+    finally:
+        client.close()
 
-    return client
+    return AsyncQdrantClient(host=QDRANT_HOST, port=QDRANT_PORT)
@@ -1,71 +1,601 @@
-from qdrant_client.models import FieldCondition, Filter, MatchValue
+import asyncio
+from dataclasses import dataclass, field
+from typing import AsyncIterator
 
-from app.config import QDRANT_COLLECTION
+from qdrant_client.models import (
+    FieldCondition,
+    Filter,
+    HasIdCondition,
+    MatchValue,
+    NamedVector,
+    ScoredPoint,
+    SearchParams,
+    SearchRequest,
+)
+from sqlalchemy import and_, or_, select, text
+
+from app.config import (
+    CONTEXT_MAX_TOKENS,
+    CONTEXT_NEIGHBOR_WINDOW,
+    DB_POOL_SIZE,
+    HYBRID_CANDIDATES,
+    HYBRID_MIN_TERM_FRACTION,
+    HYBRID_RRF_K,
+    HYBRID_SEARCH_ENABLED,
+    QDRANT_COLLECTION,
+    QDRANT_TWO_STAGE_CANDIDATES,
+    QDRANT_TWO_STAGE_SEARCH,
+    logger,
+)
+from app.db import AsyncSessionLocal, async_engine
+from app.migrations import TEXT_SEARCH_CONFIG
+from app.models import DocumentChunk
 from app.schemas import AskRequest, AskResponse
-from app.services.openai_service import embed_query, generate_answer
+from app.services.openai_service import (
+    count_prompt_tokens,
+    embed_queries,
+    embed_query,
+    generate_answer,
+    generate_answer_stream,
+)
+from app.services.embeddings import index_dimensions, shorten
+from app.services.qdrant_service import FULL_VECTOR, SHORT_VECTOR, search_params
+from app.services.text_splitter import CHUNK_OVERLAP
+from app.services.timing import StageTimer
+from app.services.tracing import span
 from app.state import state
 
 
-def preview_rag_hits(question: str, score_threshold: float = 0.25) -> bool:
-    query_vector = embed_query(question)
+# Similitud coseno mínima para que un hit denso llegue al prompt.
+MIN_DENSE_SCORE = 0.25
 
-    results = state.qdrant.search(
-        collection_name=QDRANT_COLLECTION,
+# OR de los lexemas de la pregunta (plainto_tsquery exige todos), pero cada
+# chunk debe contener al menos HYBRID_MIN_TERM_FRACTION de ellos: con un solo
+# término común una pregunta ajena al corpus no trae contexto. El filtro de
+# chunks vigentes coincide con el del índice GIN parcial.
+_LEXICAL_QUERY = text(f"""
+    WITH q AS (
+        SELECT CAST(
+            replace(CAST(plainto_tsquery('{TEXT_SEARCH_CONFIG}', :question) AS text), '&', '|')
+            AS tsquery
+        ) AS query,
+        tsvector_to_array(to_tsvector('{TEXT_SEARCH_CONFIG}', :question)) AS lexemes
+    )
+    SELECT c.chunk_id, c.document_id, c.version_id, c.chunk_index, c.content,
+           v.version, v.filename, ts_rank_cd(c.content_tsv, q.query, 32) AS rank
+    FROM document_chunks c
+    JOIN document_versions v ON v.version_id = c.version_id
+    CROSS JOIN q
+    WHERE c.is_current AND NOT c.deleted AND c.content_tsv @@ q.query
+      AND (
+          SELECT count(*) FROM unnest(q.lexemes) AS l(lexeme)
+          WHERE c.content_tsv @@ CAST(quote_literal(l.lexeme) AS tsquery)
+      ) >= GREATEST(1, CEIL(CAST(:min_term_fraction AS float8) * cardinality(q.lexemes)))
+    ORDER BY rank DESC
+    LIMIT :limit
+""")
+
+
+@dataclass
+class RetrievalContext:
+    # Vector y hits de una pregunta, calculados una sola vez por request.
+    question: str
+    query_vector: list[float]
+    # Hits densos con su similitud coseno.
+    hits: list[ScoredPoint] = field(default_factory=list)
+    # Orden final de la búsqueda híbrida (score RRF, con la similitud coseno en
+    # el payload); None si solo hubo búsqueda densa.
+    ranked: list[ScoredPoint] | None = None
+
+    def context_hits(self, top_k: int) -> list[ScoredPoint]:
+        if self.ranked is not None:
+            return self.ranked[:top_k]
+        return [hit for hit in self.hits[:top_k] if hit.score >= MIN_DENSE_SCORE]
+
+
+def hybrid_search_available() -> bool:
+    # El índice full-text es de PostgreSQL (migración 3).
+    return HYBRID_SEARCH_ENABLED and async_engine.dialect.name == "postgresql"
+
+
+async def build_retrieval_context(
+    question: str,
+    top_k: int,
+    timer: StageTimer | None = None,
+    query_vector: list[float] | None = None,
+) -> RetrievalContext:
+    timer = timer or StageTimer()
+    hybrid = hybrid_search_available()
+    limit = max(top_k, HYBRID_CANDIDATES) if hybrid else top_k
+
+    async def lexical() -> list[ScoredPoint]:
+        with timer.stage("lexical"):
+            return await search_lexical(question, limit)
+
+    # La búsqueda léxica no necesita el embedding: corre mientras se calcula.
+    lexical_task = asyncio.create_task(lexical()) if hybrid else None
+    try:
+        if query_vector is None:
+            with timer.stage("embed"):
+                query_vector = await embed_query(question)
+
+        with timer.stage("search"):
+            hits = await _search_current(query_vector, limit)
+    except BaseException:
+        if lexical_task is not None:
+            lexical_task.cancel()
+        raise
+
+    ranked = None
+    if lexical_task is not None:
+        dense = [hit for hit in hits if hit.score >= MIN_DENSE_SCORE]
+        ranked = fuse_hybrid(dense, await lexical_task)
+
+    return RetrievalContext(
+        question=question,
         query_vector=query_vector,
-        query_filter=Filter(
-            must=[
-                FieldCondition(
-                    key="is_current",
-                    match=MatchValue(value=True),
-                ),
-                FieldCondition(
-                    key="deleted",
-                    match=MatchValue(value=False),
-                ),
-            ]
-        ),
-        limit=1,
+        hits=hits,
+        ranked=ranked,
     )
 
-    if not results:
-        return False
 
-    return results[0].score >= score_threshold
+async def build_retrieval_contexts(
+    questions: list[str],
+    top_k: int,
+    timer: StageTimer | None = None,
+    query_vectors: list[list[float]] | None = None,
+) -> list[RetrievalContext]:
+    # Variante en lote de build_retrieval_context: un request de embeddings y
+    # un search_batch de Qdrant para todas las preguntas.
+    timer = timer or StageTimer()
+    hybrid = hybrid_search_available()
+    limit = max(top_k, HYBRID_CANDIDATES) if hybrid else top_k
+    # Las consultas léxicas van de a una: no ocupan más conexiones que el pool.
+    semaphore = asyncio.Semaphore(DB_POOL_SIZE)
+
+    async def lexical(question: str) -> list[ScoredPoint]:
+        async with semaphore:
+            return await search_lexical(question, limit)
+
+    async def lexical_all() -> list[list[ScoredPoint]]:
+        with timer.stage("lexical"):
+            return await asyncio.gather(*(lexical(question) for question in questions))
+
+    lexical_task = asyncio.create_task(lexical_all()) if hybrid else None
+    try:
+        if query_vectors is None:
+            with timer.stage("embed"):
+                query_vectors = await embed_queries(questions)
+
+        with timer.stage("search"):
+            all_hits = await _search_current_batch(query_vectors, limit)
+    except BaseException:
+        if lexical_task is not None:
+            lexical_task.cancel()
+        raise
+
+    rankings: list[list[ScoredPoint] | None] = [None] * len(questions)
+    if lexical_task is not None:
+        rankings = [
+            fuse_hybrid([hit for hit in hits if hit.score >= MIN_DENSE_SCORE], lexical_hits)
+            for hits, lexical_hits in zip(all_hits, await lexical_task)
+        ]
+
+    return [
+        RetrievalContext(question=question, query_vector=query_vector, hits=hits, ranked=ranked)
+        for question, query_vector, hits, ranked in zip(questions, query_vectors, all_hits, rankings)
+    ]
+
 
+async def search_lexical(question: str, limit: int) -> list[ScoredPoint]:
+    # Chunks vigentes que comparten términos con la pregunta (números de ley,
+    # artículos, códigos) aunque su similitud densa sea baja.
+    try:
+        with span("postgres.lexical", limit=limit) as current:
+            async with AsyncSessionLocal() as db:
+                rows = (await db.execute(_LEXICAL_QUERY, {
+                    "question": question,
+                    "limit": limit,
+                    "min_term_fraction": HYBRID_MIN_TERM_FRACTION,
+                })).all()
+            current.set(rows=len(rows))
+    except Exception as exc:
+        # Sin índice léxico se responde solo con la búsqueda densa.
+        logger.warning("⚠️ Búsqueda léxica no disponible: %s", exc)
+        return []
+
+    return [
+        ScoredPoint(
+            id=row.chunk_id,
+            version=0,
+            score=float(row.rank),
+            payload={
+                "document_id": row.document_id,
+                "version_id": row.version_id,
+                "version": row.version,
+                "chunk_index": row.chunk_index,
+                "filename": row.filename,
+                "content": row.content,
+            },
+        )
+        for row in rows
+    ]
 
-def ask_rag(payload: AskRequest) -> AskResponse:
-    query_vector = embed_query(payload.question)
 
-    search_results = state.qdrant.search(
+async def fetch_neighbors(hits: list[ScoredPoint], window: int) -> list[ScoredPoint]:
+    # Chunks chunk_index ± window de todos los hits en una sola consulta, sobre
+    # el índice (document_id, version_id, chunk_index) de la migración 5.
+    anchors: dict[tuple, dict] = {}
+    wanted: dict[tuple, set[int]] = {}
+    for hit in hits:
+        payload_data = hit.payload or {}
+        chunk_index = payload_data.get("chunk_index")
+        if payload_data.get("version_id") is None or chunk_index is None:
+            continue
+        key = (payload_data.get("document_id"), payload_data.get("version_id"))
+        anchors.setdefault(key, payload_data)
+        wanted.setdefault(key, set()).update(
+            idx for idx in range(chunk_index - window, chunk_index + window + 1) if idx >= 0
+        )
+    for hit in hits:
+        payload_data = hit.payload or {}
+        key = (payload_data.get("document_id"), payload_data.get("version_id"))
+        wanted.get(key, set()).discard(payload_data.get("chunk_index"))
+
+    conditions = [
+        and_(
+            DocumentChunk.document_id == document_id,
+            DocumentChunk.version_id == version_id,
+            DocumentChunk.chunk_index.in_(sorted(indexes)),
+        )
+        for (document_id, version_id), indexes in wanted.items()
+        if indexes
+    ]
+    if not conditions:
+        return []
+
+    query = (
+        select(
+            DocumentChunk.chunk_id,
+            DocumentChunk.document_id,
+            DocumentChunk.version_id,
+            DocumentChunk.chunk_index,
+            DocumentChunk.content,
+        )
+        .where(or_(*conditions))
+        .where(DocumentChunk.is_current.is_(True), DocumentChunk.deleted.is_(False))
+    )
+    try:
+        with span("postgres.neighbors", documents=len(conditions)) as current:
+            async with AsyncSessionLocal() as db:
+                rows = (await db.execute(query)).all()
+            current.set(rows=len(rows))
+    except Exception as exc:
+        # Sin vecinos el contexto queda con los hits exactos.
+        logger.warning("⚠️ No se pudieron leer chunks vecinos: %s", exc)
+        return []
+
+    neighbors = []
+    for row in rows:
+        anchor = anchors[(row.document_id, row.version_id)]
+        neighbors.append(ScoredPoint(
+            id=row.chunk_id,
+            version=0,
+            score=0.0,
+            payload={
+                "document_id": row.document_id,
+                "version_id": row.version_id,
+                "version": anchor.get("version"),
+                "chunk_index": row.chunk_index,
+                "filename": anchor.get("filename"),
+                "content": row.content,
+            },
+        ))
+    return neighbors
+
+
+def _chunk_key(hit: ScoredPoint) -> tuple:
+    # Solo se buscan versiones vigentes: (documento, índice) identifica el chunk
+    # aunque el ID del punto y el de document_chunks difieran (ingestas antiguas).
+    payload = hit.payload or {}
+    return payload.get("document_id"), payload.get("chunk_index")
+
+
+def fuse_rankings(*rankings: list[ScoredPoint], k: int = HYBRID_RRF_K) -> list[ScoredPoint]:
+    # Reciprocal rank fusion: cada lista aporta 1 / (k + posición) por chunk.
+    scores: dict[tuple, float] = {}
+    first_seen: dict[tuple, ScoredPoint] = {}
+    for ranking in rankings:
+        for position, hit in enumerate(ranking, start=1):
+            key = _chunk_key(hit)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + position)
+            first_seen.setdefault(key, hit)
+
+    return [
+        ScoredPoint(
+            id=first_seen[key].id,
+            version=first_seen[key].version,
+            score=scores[key],
+            payload=first_seen[key].payload,
+        )
+        for key in sorted(scores, key=scores.get, reverse=True)
+    ]
+
+
+# Clave del payload con la similitud coseno de un hit híbrido (None si solo
+# llegó por la vía léxica): el score RRF solo sirve para ordenar.
+SIMILARITY_KEY = "similarity"
+
+
+def fuse_hybrid(dense: list[ScoredPoint], lexical: list[ScoredPoint]) -> list[ScoredPoint]:
+    similarity = {_chunk_key(hit): hit.score for hit in dense}
+    return [
+        ScoredPoint(
+            id=hit.id,
+            version=hit.version,
+            score=hit.score,
+            payload={**(hit.payload or {}), SIMILARITY_KEY: similarity.get(_chunk_key(hit))},
+        )
+        for hit in fuse_rankings(dense, lexical)
+    ]
+
+
+def hit_similarity(hit: ScoredPoint) -> float | None:
+    # Score que ve el cliente: la similitud coseno, no el orden RRF.
+    payload = hit.payload or {}
+    return payload[SIMILARITY_KEY] if SIMILARITY_KEY in payload else hit.score
+
+
+def _current_filter() -> Filter:
+    return Filter(
+        must=[
+            FieldCondition(
+                key="is_current",
+                match=MatchValue(value=True),
+            ),
+            FieldCondition(
+                key="deleted",
+                match=MatchValue(value=False),
+            ),
+        ]
+    )
+
+
+async def _search_current(query_vector: list[float], top_k: int) -> list[ScoredPoint]:
+    with span("qdrant.search", limit=max(top_k, 1), two_stage=QDRANT_TWO_STAGE_SEARCH) as current:
+        if QDRANT_TWO_STAGE_SEARCH:
+            hits = await _search_two_stage(query_vector, max(top_k, 1))
+        else:
+            hits = await state.qdrant.search(
+                collection_name=QDRANT_COLLECTION,
+                query_vector=query_vector,
+                query_filter=_current_filter(),
+                search_params=search_params(),
+                limit=max(top_k, 1),
+            )
+        current.set(hits=len(hits))
+    return hits
+
+
+async def _search_two_stage(query_vector: list[float], limit: int) -> list[ScoredPoint]:
+    # Candidatos con el vector corto; orden final exacto con el vector completo.
+    candidates = await state.qdrant.search(
         collection_name=QDRANT_COLLECTION,
-        query_vector=query_vector,
-        query_filter=Filter(
-            must=[
-                FieldCondition(
-                    key="is_current",
-                    match=MatchValue(value=True),
-                ),
-                FieldCondition(
-                    key="deleted",
-                    match=MatchValue(value=False),
-                ),
-            ]
+        query_vector=NamedVector(
+            name=SHORT_VECTOR,
+            vector=shorten(query_vector, index_dimensions()),
         ),
-        limit=payload.top_k,
+        query_filter=_current_filter(),
+        search_params=search_params(),
+        limit=limit * QDRANT_TWO_STAGE_CANDIDATES,
+        with_payload=False,
+    )
+    if not candidates:
+        return []
+    return await state.qdrant.search(
+        collection_name=QDRANT_COLLECTION,
+        query_vector=NamedVector(name=FULL_VECTOR, vector=query_vector),
+        query_filter=Filter(must=[HasIdCondition(has_id=[hit.id for hit in candidates])]),
+        search_params=SearchParams(exact=True),
+        limit=limit,
     )
 
-    min_score = 0.25
-    search_results = [
-        hit for hit in search_results
-        if hit.score >= min_score
-    ]
 
-    if not search_results:
-        return {
-            "answer": "No hay información suficiente en los documentos cargados.",
-            "sources": [],
-        }
+async def _search_current_batch(
+    query_vectors: list[list[float]],
+    top_k: int,
+) -> list[list[ScoredPoint]]:
+    if not query_vectors:
+        return []
+    limit = max(top_k, 1)
+    with span("qdrant.search_batch", queries=len(query_vectors), limit=limit, two_stage=QDRANT_TWO_STAGE_SEARCH):
+        if QDRANT_TWO_STAGE_SEARCH:
+            return await _search_two_stage_batch(query_vectors, limit)
+        return await state.qdrant.search_batch(
+            collection_name=QDRANT_COLLECTION,
+            requests=[
+                SearchRequest(
+                    vector=query_vector,
+                    filter=_current_filter(),
+                    params=search_params(),
+                    limit=limit,
+                    with_payload=True,
+                )
+                for query_vector in query_vectors
+            ],
+        )
+
+
+async def _search_two_stage_batch(
+    query_vectors: list[list[float]],
+    limit: int,
+) -> list[list[ScoredPoint]]:
+    # Igual que _search_two_stage, con un search_batch por etapa.
+    candidates = await state.qdrant.search_batch(
+        collection_name=QDRANT_COLLECTION,
+        requests=[
+            SearchRequest(
+                vector=NamedVector(
+                    name=SHORT_VECTOR,
+                    vector=shorten(query_vector, index_dimensions()),
+                ),
+                filter=_current_filter(),
+                params=search_params(),
+                limit=limit * QDRANT_TWO_STAGE_CANDIDATES,
+                with_payload=False,
+            )
+            for query_vector in query_vectors
+        ],
+    )
+    pending = [idx for idx, hits in enumerate(candidates) if hits]
+    results: list[list[ScoredPoint]] = [[] for _ in query_vectors]
+    if not pending:
+        return results
+
+    rescored = await state.qdrant.search_batch(
+        collection_name=QDRANT_COLLECTION,
+        requests=[
+            SearchRequest(
+                vector=NamedVector(name=FULL_VECTOR, vector=query_vectors[idx]),
+                filter=Filter(must=[HasIdCondition(has_id=[hit.id for hit in candidates[idx]])]),
+                params=SearchParams(exact=True),
+                limit=limit,
+                with_payload=True,
+            )
+            for idx in pending
+        ],
+    )
+    for idx, hits in zip(pending, rescored):
+        results[idx] = hits
+    return results
+
+
+def preview_rag_hits(retrieval: RetrievalContext, score_threshold: float = MIN_DENSE_SCORE) -> bool:
+    if not retrieval.hits:
+        return False
+
+    return retrieval.hits[0].score >= score_threshold
+
+
+NO_INFO_ANSWER = "No hay información suficiente en los documentos cargados."
+
+# Chunks distintos que pueden llegar al prompt, aunque sobre presupuesto.
+MAX_CONTEXT_CHUNKS = 5
+# Solape mínimo (caracteres) para tratar dos chunks contiguos como repetidos.
+MIN_CHUNK_OVERLAP = 8
+
+
+def _strip_overlap(previous: str, following: str) -> str | None:
+    # El splitter repite hasta CHUNK_OVERLAP caracteres del final de un chunk al
+    # inicio del siguiente: se quita el prefijo más largo que cierre al anterior.
+    for size in range(min(len(previous), len(following), CHUNK_OVERLAP), MIN_CHUNK_OVERLAP - 1, -1):
+        if previous.endswith(following[:size]):
+            return following[size:]
+    return None
+
+
+def _merge_contents(contents: list[str]) -> str:
+    merged = contents[0]
+    for content in contents[1:]:
+        rest = _strip_overlap(merged, content)
+        merged = merged + rest if rest is not None else f"{merged}\n{content}"
+    return merged
+
+
+def _block_header(idx: int, payload_data: dict, chunk_indexes: list) -> str:
+    if len(chunk_indexes) == 1:
+        label = f"Chunk: {chunk_indexes[0]}"
+    else:
+        label = f"Chunks: {chunk_indexes[0]}-{chunk_indexes[-1]}"
+    return f"[FUENTE {idx}] Documento: {payload_data.get('filename')} | {label}\n"
+
+
+def _select_within_budget(hits: list[ScoredPoint], max_tokens: int) -> list[ScoredPoint]:
+    # Por score, mientras quepan. Cada chunk se cuenta como bloque propio (con
+    # encabezado y solape), así que al unir contiguos el total solo baja. El
+    # mejor hit entra siempre.
+    selected = []
+    used = 0
+    for hit in hits:
+        payload_data = hit.payload or {}
+        content = payload_data.get("content", "").strip()
+        tokens = count_prompt_tokens(
+            _block_header(len(selected) + 1, payload_data, [payload_data.get("chunk_index")]) + content
+        )
+        if selected and used + tokens > max_tokens:
+            continue
+        selected.append(hit)
+        used += tokens
+    return selected
 
+
+def _with_neighbors(
+    hits: list[ScoredPoint],
+    neighbors: list[ScoredPoint],
+    seen: set,
+) -> list[ScoredPoint]:
+    # Cada hit seguido de sus vecinos, del más cercano al más lejano; el vecino
+    # hereda el score del hit para ordenar y citar la fuente.
+    by_key = {
+        ((hit.payload or {}).get("document_id"), (hit.payload or {}).get("chunk_index")): hit
+        for hit in neighbors
+    }
+    candidates = []
+    for hit in hits:
+        candidates.append(hit)
+        document_id = hit.payload.get("document_id")
+        chunk_index = hit.payload.get("chunk_index")
+        if chunk_index is None:
+            continue
+        for distance in range(1, CONTEXT_NEIGHBOR_WINDOW + 1):
+            for key in ((document_id, chunk_index - distance), (document_id, chunk_index + distance)):
+                neighbor = by_key.get(key)
+                if neighbor is None or key in seen:
+                    continue
+                seen.add(key)
+                payload = neighbor.payload
+                if SIMILARITY_KEY in (hit.payload or {}):
+                    payload = {**payload, SIMILARITY_KEY: hit_similarity(hit)}
+                candidates.append(ScoredPoint(
+                    id=neighbor.id,
+                    version=neighbor.version,
+                    score=hit.score,
+                    payload=payload,
+                ))
+    return candidates
+
+
+def _group_adjacent(hits: list[ScoredPoint]) -> list[list[ScoredPoint]]:
+    # Chunks consecutivos (chunk_index n, n+1, …) de la misma versión forman un bloque.
+    by_version: dict[tuple, list[ScoredPoint]] = {}
+    for hit in hits:
+        payload_data = hit.payload or {}
+        key = (payload_data.get("document_id"), payload_data.get("version_id"))
+        by_version.setdefault(key, []).append(hit)
+
+    blocks = []
+    for version_hits in by_version.values():
+        version_hits.sort(key=lambda h: (h.payload or {}).get("chunk_index") or 0)
+        block = [version_hits[0]]
+        for hit in version_hits[1:]:
+            previous_index = (block[-1].payload or {}).get("chunk_index")
+            current_index = (hit.payload or {}).get("chunk_index")
+            if previous_index is not None and current_index == previous_index + 1:
+                block.append(hit)
+            else:
+                blocks.append(block)
+                block = [hit]
+        blocks.append(block)
+
+    # Las fuentes se numeran por el mejor score de cada bloque.
+    return sorted(blocks, key=lambda block: max(h.score for h in block), reverse=True)
+
+
+def _build_prompt_context(
+    search_results: list[ScoredPoint],
+    max_tokens: int = CONTEXT_MAX_TOKENS,
+    neighbors: list[ScoredPoint] | None = None,
+) -> tuple[str, list[dict]]:
     seen = set()
     filtered_hits = []
 
@@ -82,36 +612,113 @@ def ask_rag(payload: AskRequest) -> AskResponse:
         filtered_hits,
         key=lambda h: h.score,
         reverse=True,
-    )[:5]
+    )[:MAX_CONTEXT_CHUNKS]
+
+    if neighbors:
+        # Los vecinos no cuentan para MAX_CONTEXT_CHUNKS; solo para el presupuesto.
+        seen = {_chunk_key(hit) for hit in filtered_hits}
+        filtered_hits = _with_neighbors(filtered_hits, neighbors, seen)
+
+    selected = _select_within_budget(filtered_hits, max_tokens)
 
     context_chunks = []
     sources = []
 
-    for idx, hit in enumerate(filtered_hits, start=1):
-        payload_data = hit.payload or {}
-        content = payload_data.get("content", "").strip()
+    for idx, block in enumerate(_group_adjacent(selected), start=1):
+        payload_data = block[0].payload or {}
+        chunk_indexes = [(hit.payload or {}).get("chunk_index") for hit in block]
+        content = _merge_contents([(hit.payload or {}).get("content", "").strip() for hit in block])
+        similarities = [value for value in map(hit_similarity, block) if value is not None]
 
-        context_chunks.append(
-            f"[FUENTE {idx}] Documento: {payload_data.get('filename')} | Chunk: {payload_data.get('chunk_index')}\n"
-            f"{content}"
-        )
+        context_chunks.append(_block_header(idx, payload_data, chunk_indexes) + content)
 
         sources.append({
             "source_id": idx,
             "document_id": payload_data.get("document_id"),
             "filename": payload_data.get("filename"),
-            "chunk_index": payload_data.get("chunk_index"),
-            "score": round(hit.score, 4),
+            "chunk_index": chunk_indexes[0],
+            "chunk_indexes": chunk_indexes,
+            "score": round(max(similarities), 4) if similarities else None,
         })
 
     context = "\n\n".join(context_chunks)
+    if sources:
+        logger.info(
+            "🧩 Contexto: %s chunks en %s fuentes, %s tokens",
+            len(selected),
+            len(sources),
+            count_prompt_tokens(context),
+        )
+    return context, sources
 
-    answer = generate_answer(
-        question=payload.question,
-        context=context,
-    )
+
+async def _prompt_context(
+    retrieval: RetrievalContext,
+    top_k: int,
+    timer: StageTimer,
+) -> tuple[str, list[dict]]:
+    hits = retrieval.context_hits(top_k)
+    neighbors = None
+    if CONTEXT_NEIGHBOR_WINDOW and hits:
+        with timer.stage("neighbors"):
+            neighbors = await fetch_neighbors(hits[:MAX_CONTEXT_CHUNKS], CONTEXT_NEIGHBOR_WINDOW)
+    return _build_prompt_context(hits, neighbors=neighbors)
+
+
+async def ask_rag(
+    payload: AskRequest,
+    retrieval: RetrievalContext | None = None,
+    timer: StageTimer | None = None,
+) -> AskResponse:
+    timer = timer or StageTimer()
+    if retrieval is None:
+        retrieval = await build_retrieval_context(payload.question, payload.top_k, timer)
+
+    context, sources = await _prompt_context(retrieval, payload.top_k, timer)
+
+    if not sources:
+        return {
+            "answer": NO_INFO_ANSWER,
+            "sources": [],
+        }
+
+    with timer.stage("generate"):
+        answer = await generate_answer(
+            question=payload.question,
+            context=context,
+        )
 
     return {
         "answer": answer,
         "sources": sources,
     }
+
+
+async def stream_rag_answer(
+    payload: AskRequest,
+    retrieval: RetrievalContext,
+    timer: StageTimer | None = None,
+) -> AsyncIterator[tuple[str, dict]]:
+    # Eventos (nombre, datos): primero las fuentes, luego tokens y cierre.
+    timer = timer or StageTimer()
+    context, sources = await _prompt_context(retrieval, payload.top_k, timer)
+
+    yield "sources", {"sources": sources}
+
+    if not sources:
+        yield "token", {"text": NO_INFO_ANSWER}
+        yield "done", {"answer": NO_INFO_ANSWER}
+        return
+
+    answer_parts = []
+    with timer.stage("generate"):
+        async for token in generate_answer_stream(
+            question=payload.question,
+            context=context,
+        ):
+            if not answer_parts:
+                timer.record("first_token", timer.elapsed())
+            answer_parts.append(token)
+            yield "token", {"text": token}
+
+    yield "done", {"answer": "".join(answer_parts)}
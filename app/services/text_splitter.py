@@ -1,6 +1,10 @@
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
+CHUNK_SIZE = 800
+# Caracteres que un chunk repite del anterior; el contexto del prompt los quita al unirlos.
+CHUNK_OVERLAP = 100
+
 splitter = RecursiveCharacterTextSplitter(
-    chunk_size=800,
-    chunk_overlap=100,
+    chunk_size=CHUNK_SIZE,
+    chunk_overlap=CHUNK_OVERLAP,
 )
@@ -0,0 +1,46 @@
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+from app.services.metrics import Histogram
+from app.services.tracing import span
+
+
+class StageTimer:
+    # Duración por etapa de un request, en milisegundos. Con histogram, cada
+    # etapa también se registra (en segundos) para /api/metrics y, si el
+    # request está muestreado, abre un span del trace.
+
+    def __init__(self, histogram: Histogram | None = None, **labels):
+        self.stages: dict[str, float] = {}
+        self._started = time.perf_counter()
+        self._histogram = histogram
+        self._labels = labels
+
+    def elapsed(self) -> float:
+        return (time.perf_counter() - self._started) * 1000
+
+    def record(self, name: str, duration: float) -> None:
+        self.stages[name] = duration
+        if self._histogram is not None:
+            self._histogram.observe(duration / 1000, stage=name, **self._labels)
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            with span(name):
+                yield
+        finally:
+            self.record(name, (time.perf_counter() - start) * 1000)
+
+    def server_timing(self) -> str:
+        # Formato estándar del header Server-Timing (visible en DevTools).
+        return ", ".join(
+            f"{name};dur={duration:.1f}" for name, duration in self.stages.items()
+        )
+
+    def summary(self) -> str:
+        return " ".join(
+            f"{name}={duration:.0f}ms" for name, duration in self.stages.items()
+        )
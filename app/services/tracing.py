@@ -0,0 +1,321 @@
+"""
+Trazas por request: spans anidados con su duración, sin dependencias externas.
+
+El trace activo y el span padre viajan en contextvars, así que los spans
+creados en tasks de asyncio o en asyncio.to_thread quedan colgados del span
+donde se lanzaron. Solo se registra una fracción de los requests
+(TRACE_SAMPLE_RATE, o el header X-Trace-Sample con TRACE_FORCE_TOKEN); en
+los no muestreados cada span es un no-op. Los traces terminados van a un
+buffer circular en memoria (GET /api/debug/traces) y, si se configura
+TRACE_EXPORT_PATH, a un archivo JSONL con un trace por línea que escribe un
+hilo aparte y que rota por tamaño.
+"""
+
+import functools
+import hmac
+import json
+import logging
+import queue
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Iterator
+
+from app.config import (
+    TRACE_BUFFER_SIZE,
+    TRACE_EXPORT_BACKUPS,
+    TRACE_EXPORT_MAX_BYTES,
+    TRACE_EXPORT_PATH,
+    TRACE_EXPORT_QUEUE_SIZE,
+    TRACE_FORCE_TOKEN,
+    TRACE_SAMPLE_RATE,
+    logger,
+)
+
+TRACE_HEADER = "X-Trace-Id"
+SAMPLE_HEADER = "x-trace-sample"
+# Rutas que no se trazan: el propio scrape de métricas y la consulta de traces.
+UNTRACED_PREFIXES = ("/api/metrics", "/api/debug")
+
+
+class Span:
+    def __init__(self, trace: "Trace", name: str, parent_id: str | None, attributes: dict):
+        self.trace = trace
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.name = name
+        self.attributes = attributes
+        self.error: str | None = None
+        self._start = time.perf_counter()
+        self.start_ms = (self._start - trace.started) * 1000
+        self.duration_ms: float | None = None
+
+    def set(self, **attributes) -> None:
+        self.attributes.update(attributes)
+
+    def end(self) -> None:
+        self.duration_ms = (time.perf_counter() - self._start) * 1000
+
+    def to_dict(self) -> dict:
+        return {
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_ms": round(self.start_ms, 3),
+            "duration_ms": round(self.duration_ms, 3) if self.duration_ms is not None else None,
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+class _NoopSpan:
+    def set(self, **attributes) -> None:
+        return None
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Trace:
+    def __init__(self, name: str, attributes: dict):
+        self.trace_id = uuid.uuid4().hex
+        self.name = name
+        self.attributes = attributes
+        self.started_at = datetime.utcnow()
+        self.started = time.perf_counter()
+        self.spans: list[Span] = []
+        self.duration_ms: float | None = None
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "started_at": self.started_at.isoformat(),
+            "duration_ms": round(self.duration_ms, 3) if self.duration_ms is not None else None,
+            "attributes": self.attributes,
+            "spans": sorted((span.to_dict() for span in self.spans), key=lambda item: item["start_ms"]),
+        }
+
+
+_current_trace: ContextVar[Trace | None] = ContextVar("current_trace", default=None)
+_current_span: ContextVar[Span | None] = ContextVar("current_span", default=None)
+
+_buffer: deque[dict] = deque(maxlen=TRACE_BUFFER_SIZE)
+
+
+class _DroppingQueueHandler(QueueHandler):
+    # Cola acotada: con el escritor atrasado se descarta el trace en lugar de
+    # bloquear el event loop o crecer sin límite.
+
+    def __init__(self, records: queue.Queue):
+        super().__init__(records)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped == 1 or self.dropped % 1000 == 0:
+                logger.warning("⚠️ Cola de export de traces llena: %s traces descartados", self.dropped)
+
+
+_export_init_lock = threading.Lock()
+_export_handler: _DroppingQueueHandler | None = None
+_export_listener: QueueListener | None = None
+
+
+def _export_queue_handler() -> _DroppingQueueHandler | None:
+    # El archivo lo escribe el hilo del QueueListener con rotación por tamaño.
+    global _export_handler, _export_listener
+    if _export_handler is not None:
+        return _export_handler
+    with _export_init_lock:
+        if _export_handler is None:
+            try:
+                file_handler = RotatingFileHandler(
+                    TRACE_EXPORT_PATH,
+                    maxBytes=TRACE_EXPORT_MAX_BYTES,
+                    backupCount=TRACE_EXPORT_BACKUPS,
+                    encoding="utf-8",
+                    delay=True,
+                )
+            except OSError as exc:
+                logger.warning("⚠️ No se pudo abrir el export de traces %s: %s", TRACE_EXPORT_PATH, exc)
+                return None
+            file_handler.setFormatter(logging.Formatter("%(message)s"))
+            records: queue.Queue = queue.Queue(maxsize=TRACE_EXPORT_QUEUE_SIZE)
+            _export_listener = QueueListener(records, file_handler)
+            _export_listener.start()
+            _export_handler = _DroppingQueueHandler(records)
+    return _export_handler
+
+
+def shutdown_trace_export() -> None:
+    # Escribe los traces pendientes y cierra el archivo.
+    global _export_handler, _export_listener
+    with _export_init_lock:
+        if _export_listener is not None:
+            _export_listener.stop()
+            for handler in _export_listener.handlers:
+                handler.close()
+        _export_handler = None
+        _export_listener = None
+
+
+def sample_forced(header_value: bytes | None) -> bool:
+    # X-Trace-Sample solo cuenta con el token configurado: sin él cualquier
+    # cliente podría trazar (y exportar a disco) todos sus requests.
+    if not TRACE_FORCE_TOKEN or not header_value:
+        return False
+    return hmac.compare_digest(header_value, TRACE_FORCE_TOKEN.encode())
+
+
+def _should_sample(force: bool = False) -> bool:
+    return force or (TRACE_SAMPLE_RATE > 0 and random.random() < TRACE_SAMPLE_RATE)
+
+
+def current_trace_id() -> str | None:
+    trace = _current_trace.get()
+    return trace.trace_id if trace is not None else None
+
+
+@contextmanager
+def start_trace(name: str, force: bool = False, **attributes) -> Iterator[Trace | None]:
+    # Inicia un trace raíz si toca muestrearlo; si no, el bloque corre sin trazas.
+    if not _should_sample(force):
+        yield None
+        return
+
+    trace = Trace(name, attributes)
+    trace_token = _current_trace.set(trace)
+    span_token = _current_span.set(None)
+    try:
+        yield trace
+    finally:
+        trace.duration_ms = (time.perf_counter() - trace.started) * 1000
+        _current_span.reset(span_token)
+        _current_trace.reset(trace_token)
+        _export(trace)
+
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator[Span | _NoopSpan]:
+    trace = _current_trace.get()
+    if trace is None:
+        yield _NOOP_SPAN
+        return
+
+    parent = _current_span.get()
+    current = Span(trace, name, parent.span_id if parent else None, attributes)
+    trace.spans.append(current)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as exc:
+        current.error = type(exc).__name__
+        raise
+    finally:
+        current.end()
+        try:
+            _current_span.reset(token)
+        except ValueError:
+            # Generadores async cerrados desde otro contexto: se restaura a mano.
+            _current_span.set(parent)
+
+
+def traced(name: str):
+    # Decorador de corutinas: span dentro de un trace activo o, si no hay
+    # ninguno (jobs de ingesta), trace raíz sujeto al muestreo.
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            if _current_trace.get() is not None:
+                with span(name):
+                    return await func(*args, **kwargs)
+            with start_trace(name):
+                return await func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def _export(trace: Trace) -> None:
+    record = trace.to_dict()
+    _buffer.append(record)
+    if not TRACE_EXPORT_PATH:
+        return
+    handler = _export_queue_handler()
+    if handler is not None:
+        handler.enqueue(logging.makeLogRecord({
+            "msg": json.dumps(record, ensure_ascii=False),
+            "levelno": logging.INFO,
+            "levelname": "INFO",
+        }))
+
+
+def recent_traces(limit: int = 50, min_duration_ms: float = 0.0, name: str | None = None) -> list[dict]:
+    # Resumen de los traces más recientes primero, sin spans.
+    traces = []
+    for record in reversed(list(_buffer)):
+        if record["duration_ms"] < min_duration_ms:
+            continue
+        if name and record["name"] != name:
+            continue
+        traces.append({
+            "trace_id": record["trace_id"],
+            "name": record["name"],
+            "started_at": record["started_at"],
+            "duration_ms": record["duration_ms"],
+            "attributes": record["attributes"],
+            "spans": len(record["spans"]),
+        })
+        if len(traces) >= limit:
+            break
+    return traces
+
+
+def get_trace(trace_id: str) -> dict | None:
+    for record in reversed(list(_buffer)):
+        if record["trace_id"] == trace_id:
+            return record
+    return None
+
+
+class TracingMiddleware:
+    # Middleware ASGI: el trace cubre hasta el último byte enviado, incluidas
+    # las respuestas en streaming, y su ID vuelve en el header X-Trace-Id.
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        path = scope.get("path", "")
+        if scope["type"] != "http" or path.startswith(UNTRACED_PREFIXES):
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        force = sample_forced(headers.get(SAMPLE_HEADER.encode()))
+        with start_trace(f"{scope.get('method', '')} {path}", force=force) as trace:
+            if trace is None:
+                await self.app(scope, receive, send)
+                return
+
+            async def send_with_trace_id(message):
+                if message["type"] == "http.response.start":
+                    message["headers"] = [
+                        *message.get("headers", []),
+                        (TRACE_HEADER.lower().encode(), trace.trace_id.encode()),
+                    ]
+                    trace.attributes["status_code"] = message["status"]
+                await send(message)
+
+            await self.app(scope, receive, send_with_trace_id)
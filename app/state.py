@@ -1,11 +1,14 @@
 from dataclasses import dataclass
 
-from qdrant_client import QdrantClient
+import aiohttp
+from qdrant_client import AsyncQdrantClient
 
 
 @dataclass
 class AppState:
-    qdrant: QdrantClient | None = None
+    qdrant: AsyncQdrantClient | None = None
+    openai_session: aiohttp.ClientSession | None = None
+    intent_centroids: dict[str, list[float]] | None = None
 
 
 state = AppState()
@@ -0,0 +1,125 @@
+"""
+Concurrencia de /ask: requests simultáneos contra un backend en ejecución.
+
+Para cada nivel de concurrencia lanza N clientes que repiten /api/ask durante
+--duration segundos y reporta throughput, latencias y el máximo de requests
+en vuelo observados por el cliente. Con rutas sync el throughput se estanca
+en ~40 / latencia_del_LLM (hilos del threadpool de Starlette); con la ruta
+async debe seguir creciendo con la concurrencia hasta el límite de
+OPENAI_MAX_CONNECTIONS o del pool de la base.
+
+Uso:
+    python -m benchmarks.ask_concurrency --url http://localhost:8000 --concurrency 10 40 100 200
+    python -m benchmarks.ask_concurrency --questions preguntas.txt --duration 60
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+import aiohttp
+
+DEFAULT_QUESTIONS = [
+    "¿Cuántos días de vacaciones me corresponden al año?",
+    "¿Qué establece el código de ética sobre regalos?",
+    "¿Cuál es el procedimiento para pedir licencia médica?",
+    "¿Qué exige la política de compras para proveedores críticos?",
+]
+
+
+class _InFlight:
+    def __init__(self):
+        self.current = 0
+        self.peak = 0
+
+    def __enter__(self):
+        self.current += 1
+        self.peak = max(self.peak, self.current)
+
+    def __exit__(self, *exc):
+        self.current -= 1
+
+
+async def _client(
+    session: aiohttp.ClientSession,
+    url: str,
+    questions: list[str],
+    offset: int,
+    deadline: float,
+    in_flight: _InFlight,
+    latencies: list[float],
+    errors: list[int],
+) -> None:
+    idx = offset
+    while time.perf_counter() < deadline:
+        question = questions[idx % len(questions)]
+        idx += 1
+        start = time.perf_counter()
+        with in_flight:
+            try:
+                async with session.post(url, json={"question": question}) as response:
+                    await response.read()
+                    ok = response.status == 200
+            except aiohttp.ClientError:
+                ok = False
+        if ok:
+            latencies.append((time.perf_counter() - start) * 1000)
+        else:
+            errors.append(1)
+
+
+async def _run_level(url: str, questions: list[str], concurrency: int, duration: float) -> dict:
+    in_flight = _InFlight()
+    latencies: list[float] = []
+    errors: list[int] = []
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    timeout = aiohttp.ClientTimeout(total=300)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        started = time.perf_counter()
+        deadline = started + duration
+        await asyncio.gather(*(
+            _client(session, url, questions, idx, deadline, in_flight, latencies, errors)
+            for idx in range(concurrency)
+        ))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": len(errors),
+        "throughput_rps": round(len(latencies) / elapsed, 2),
+        "peak_in_flight": in_flight.peak,
+        "p50_ms": round(statistics.median(latencies), 1) if latencies else None,
+        "p95_ms": round(latencies[max(0, int(len(latencies) * 0.95) - 1)], 1) if latencies else None,
+    }
+
+
+async def main(url: str, concurrency: list[int], duration: float, questions: list[str]) -> list[dict]:
+    endpoint = f"{url.rstrip('/')}/api/ask"
+    results = []
+    for level in concurrency:
+        results.append(await _run_level(endpoint, questions, level, duration))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[10, 40, 100, 200])
+    parser.add_argument("--duration", type=float, default=30.0, help="Segundos por nivel")
+    parser.add_argument("--questions", help="Archivo con una pregunta por línea")
+    args = parser.parse_args()
+
+    questions = DEFAULT_QUESTIONS
+    if args.questions:
+        with open(args.questions, encoding="utf-8") as handle:
+            questions = [line.strip() for line in handle if line.strip()]
+
+    print(json.dumps(
+        asyncio.run(main(args.url, args.concurrency, args.duration, questions)),
+        indent=2,
+        ensure_ascii=False,
+    ))
@@ -0,0 +1,122 @@
+"""
+Inserción de filas en document_chunks: objeto ORM por fila vs inserción masiva.
+
+Compara, para cada tamaño, la ruta anterior (db.add por chunk + flush), el
+insert().values con executemany/insertmanyvalues y COPY (solo PostgreSQL).
+Cada corrida se hace dentro de una transacción que termina en rollback, así
+que no deja filas en la base; tras cada rollback se verifica que no quedó
+ninguna fila del documento (un COPY fuera de la transacción de la sesión
+dejaría filas huérfanas y el benchmark falla).
+
+Usa el motor async de los requests (asyncpg; COPY con copy_records_to_table).
+
+Uso:
+    python -m benchmarks.chunk_insert --sizes 1000 10000 --repeat 5
+    python -m benchmarks.chunk_insert --database-url sqlite+aiosqlite:///bench.sqlite
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+import uuid
+from datetime import datetime
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.config import ASYNC_DATABASE_URL
+from app.db import Base
+from app.models import DocumentChunk
+from app.services.documents import _copy_chunk_rows, chunk_point_id
+
+CHUNK_TEXT = "Los trabajadores tienen derecho a quince días hábiles de vacaciones. " * 12
+
+
+def _rows(count: int) -> list[dict]:
+    document_id = str(uuid.uuid4())
+    version_id = str(uuid.uuid4())
+    now = datetime.utcnow()
+    return [
+        {
+            "chunk_id": chunk_point_id(document_id, version_id, idx),
+            "document_id": document_id,
+            "version_id": version_id,
+            "content": CHUNK_TEXT,
+            "chunk_index": idx,
+            "section": None,
+            "is_current": True,
+            "deleted": False,
+            "created_at": now,
+        }
+        for idx in range(count)
+    ]
+
+
+async def _orm(db, rows: list[dict]) -> None:
+    for row in rows:
+        db.add(DocumentChunk(**row))
+    await db.flush()
+
+
+async def _bulk(db, rows: list[dict]) -> None:
+    await db.execute(insert(DocumentChunk), rows)
+
+
+async def _copy(db, rows: list[dict]) -> None:
+    await _copy_chunk_rows(db, rows)
+
+
+async def _assert_rolled_back(db, document_id: str, mode: str) -> None:
+    leftover = await db.scalar(
+        select(func.count())
+        .select_from(DocumentChunk)
+        .where(DocumentChunk.document_id == document_id)
+    )
+    await db.rollback()
+    if leftover:
+        raise RuntimeError(f"{mode}: quedaron {leftover} filas tras el rollback")
+
+
+async def main(database_url: str, sizes: list[int], repeat: int) -> list[dict]:
+    engine = create_async_engine(database_url)
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all, tables=[DocumentChunk.__table__])
+    Session = async_sessionmaker(bind=engine, autoflush=False)
+
+    modes = {"orm_add": _orm, "bulk_insert": _bulk}
+    if engine.dialect.name == "postgresql":
+        modes["copy"] = _copy
+
+    results = []
+    for size in sizes:
+        for mode, write_rows in modes.items():
+            samples = []
+            for _ in range(repeat):
+                rows = _rows(size)
+                async with Session() as db:
+                    start = time.perf_counter()
+                    await write_rows(db, rows)
+                    samples.append(time.perf_counter() - start)
+                    await db.rollback()
+                    await _assert_rolled_back(db, rows[0]["document_id"], mode)
+            median = statistics.median(samples)
+            results.append({
+                "chunks": size,
+                "mode": mode,
+                "median_ms": round(median * 1000, 1),
+                "rows_per_second": round(size / median),
+            })
+    await engine.dispose()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--database-url", default=ASYNC_DATABASE_URL)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(json.dumps(asyncio.run(main(args.database_url, args.sizes, args.repeat)), indent=2))
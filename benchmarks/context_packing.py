@@ -0,0 +1,116 @@
+"""
+Tokens del contexto del prompt: un bloque por chunk vs bloques contiguos unidos.
+
+Divide los archivos de texto con el splitter de la ingesta y simula hits de
+retrieval: cada pregunta toma --hits chunks de un documento, donde cada hit
+nuevo es, con probabilidad --adjacent, vecino de uno ya elegido (lo habitual
+cuando la respuesta cruza el borde de un chunk). Compara los tokens del
+contexto armado como antes (un bloque con encabezado por chunk, solape
+repetido) con el de _build_prompt_context, y verifica que todo el texto de
+los chunks elegidos siga en el contexto.
+
+Uso:
+    python -m benchmarks.context_packing --files politica.txt reglamento.txt
+    python -m benchmarks.context_packing --files *.txt --adjacent 0.3 --questions 500
+"""
+
+import argparse
+import json
+import random
+import statistics
+
+from qdrant_client.models import ScoredPoint
+
+from app.config import CONTEXT_MAX_TOKENS
+from app.services.openai_service import count_prompt_tokens
+from app.services.rag import MAX_CONTEXT_CHUNKS, _block_header, _build_prompt_context
+from app.services.text_splitter import splitter
+
+
+def _hits(chunks: list[str], filename: str, count: int, adjacent: float, rng: random.Random) -> list[ScoredPoint]:
+    chosen: list[int] = []
+    while len(chosen) < min(count, len(chunks)):
+        if chosen and rng.random() < adjacent:
+            idx = rng.choice(chosen) + rng.choice((-1, 1))
+        else:
+            idx = rng.randrange(len(chunks))
+        if 0 <= idx < len(chunks) and idx not in chosen:
+            chosen.append(idx)
+    return [
+        ScoredPoint(
+            id=idx,
+            version=0,
+            score=1.0 - position / 100,
+            payload={
+                "document_id": filename,
+                "version_id": filename,
+                "chunk_index": idx,
+                "filename": filename,
+                "content": chunks[idx],
+            },
+        )
+        for position, idx in enumerate(chosen)
+    ]
+
+
+def _unmerged_context(hits: list[ScoredPoint]) -> str:
+    return "\n\n".join(
+        _block_header(idx, hit.payload, [hit.payload["chunk_index"]]) + hit.payload["content"].strip()
+        for idx, hit in enumerate(hits, start=1)
+    )
+
+
+def _keeps_evidence(context: str, hits: list[ScoredPoint]) -> bool:
+    flat = " ".join(context.split())
+    return all(" ".join(hit.payload["content"].split()) in flat for hit in hits)
+
+
+def main(files: list[str], questions: int, hits: int, adjacent: float, seed: int) -> dict:
+    rng = random.Random(seed)
+    documents = []
+    for path in files:
+        with open(path, encoding="utf-8", errors="ignore") as handle:
+            chunks = splitter.split_text(handle.read())
+        if chunks:
+            documents.append((path, chunks))
+    if not documents:
+        raise SystemExit("Los archivos no generaron chunks")
+
+    before, after, merged_blocks, complete = [], [], [], []
+    for _ in range(questions):
+        filename, chunks = rng.choice(documents)
+        question_hits = _hits(chunks, filename, hits, adjacent, rng)
+        # Sin presupuesto: mide solo el efecto de unir contiguos y quitar el solape.
+        context, sources = _build_prompt_context(question_hits, max_tokens=10**9)
+        before.append(count_prompt_tokens(_unmerged_context(question_hits[:MAX_CONTEXT_CHUNKS])))
+        after.append(count_prompt_tokens(context))
+        merged_blocks.append(sum(len(source["chunk_indexes"]) > 1 for source in sources))
+        complete.append(_keeps_evidence(context, question_hits[:MAX_CONTEXT_CHUNKS]))
+
+    return {
+        "questions": questions,
+        "hits_per_question": hits,
+        "adjacent_probability": adjacent,
+        "context_max_tokens": CONTEXT_MAX_TOKENS,
+        "unmerged_median_tokens": statistics.median(before),
+        "packed_median_tokens": statistics.median(after),
+        "token_reduction": round(1 - sum(after) / sum(before), 4),
+        "questions_with_merged_blocks": round(sum(1 for count in merged_blocks if count) / questions, 4),
+        "evidence_kept": all(complete),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--files", nargs="+", required=True, help="Archivos de texto a chunkear")
+    parser.add_argument("--questions", type=int, default=200)
+    parser.add_argument("--hits", type=int, default=5)
+    parser.add_argument("--adjacent", type=float, default=0.5)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    print(json.dumps(
+        main(args.files, args.questions, args.hits, args.adjacent, args.seed),
+        indent=2,
+        ensure_ascii=False,
+    ))
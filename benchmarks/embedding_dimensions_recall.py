@@ -0,0 +1,137 @@
+"""
+Pérdida de recall al acortar los embeddings (EMBEDDING_DIMENSIONS).
+
+Toma los chunks vigentes de document_chunks con sus vectores completos (del
+caché de embeddings; solo se pagan los que falten) y compara, por fuerza
+bruta en memoria, el top-k con el vector completo contra:
+
+- short: búsqueda solo con los primeros N valores renormalizados
+- two_stage: top-k x QDRANT_TWO_STAGE_CANDIDATES con el vector corto y
+  reordenamiento con el completo (QDRANT_TWO_STAGE_SEARCH)
+
+Las consultas son preguntas reales (--questions, una por línea) o, por
+defecto, chunks del corpus excluyendo el propio chunk del resultado.
+
+Debe ejecutarse sin EMBEDDING_DIMENSIONS (vectores completos).
+
+Uso:
+    python -m benchmarks.embedding_dimensions_recall --dims 256 512 768 --top-k 8
+"""
+
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+import openai
+
+from app.config import OPENAI_API_KEY, QDRANT_TWO_STAGE_CANDIDATES
+from app.db import SessionLocal
+from app.models import DocumentChunk
+from app.services.embedding_cache import embed_with_cache
+from app.services.embeddings import embed_texts, full_dimensions, requested_dimensions
+
+
+def _load_corpus(limit: int) -> list[str]:
+    db = SessionLocal()
+    try:
+        rows = (
+            db.query(DocumentChunk.content)
+            .filter(DocumentChunk.is_current.is_(True), DocumentChunk.deleted.is_(False))
+            .limit(limit)
+            .all()
+        )
+    finally:
+        db.close()
+    return [content for (content,) in rows]
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return matrix / norms
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    top = np.argpartition(-scores, k, axis=1)[:, :k]
+    order = np.take_along_axis(scores, top, axis=1).argsort(axis=1)[:, ::-1]
+    return np.take_along_axis(top, order, axis=1)
+
+
+def _recall(expected: np.ndarray, found: np.ndarray) -> float:
+    hits = [len(set(row_expected) & set(row_found)) for row_expected, row_found in zip(expected, found)]
+    return float(np.mean(hits)) / expected.shape[1]
+
+
+def main(dims: list[int], top_k: int, corpus_limit: int, queries: int, questions: str | None) -> dict:
+    texts = _load_corpus(corpus_limit)
+    corpus = np.asarray(embed_with_cache(texts), dtype=np.float32)
+
+    if questions:
+        with open(questions, encoding="utf-8") as handle:
+            lines = [line.strip() for line in handle if line.strip()][:queries]
+        query_matrix = np.asarray(embed_texts(lines), dtype=np.float32)
+        exclude = None
+    else:
+        sample = np.random.default_rng(7).choice(len(texts), size=min(queries, len(texts)), replace=False)
+        query_matrix = corpus[sample]
+        exclude = sample
+
+    def scores_for(query: np.ndarray, docs: np.ndarray) -> np.ndarray:
+        scores = query @ docs.T
+        if exclude is not None:
+            scores[np.arange(len(exclude)), exclude] = -np.inf
+        return scores
+
+    full_scores = scores_for(_normalize(query_matrix), _normalize(corpus))
+    expected = _top_k(full_scores, top_k)
+
+    results = []
+    for dimension in dims:
+        short_corpus = _normalize(corpus[:, :dimension])
+        short_queries = _normalize(query_matrix[:, :dimension])
+
+        start = time.perf_counter()
+        short_scores = scores_for(short_queries, short_corpus)
+        short_ms = (time.perf_counter() - start) * 1000 / len(query_matrix)
+
+        candidates = _top_k(short_scores, min(top_k * QDRANT_TWO_STAGE_CANDIDATES, len(texts) - 1))
+        rescored = np.take_along_axis(full_scores, candidates, axis=1)
+        two_stage = np.take_along_axis(candidates, rescored.argsort(axis=1)[:, ::-1][:, :top_k], axis=1)
+
+        results.append({
+            "dimensions": dimension,
+            "bytes_per_vector": dimension * 4,
+            "memory_ratio": round(full_dimensions() / dimension, 2),
+            f"short_recall@{top_k}": round(_recall(expected, _top_k(short_scores, top_k)), 4),
+            f"two_stage_recall@{top_k}": round(_recall(expected, two_stage), 4),
+            "brute_force_ms_per_query": round(short_ms, 3),
+        })
+
+    return {
+        "corpus": len(texts),
+        "queries": len(query_matrix),
+        "full_dimensions": full_dimensions(),
+        "two_stage_candidates": QDRANT_TWO_STAGE_CANDIDATES,
+        "results": results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--dims", type=int, nargs="+", default=[256, 512, 768, 1024])
+    parser.add_argument("--top-k", type=int, default=8)
+    parser.add_argument("--corpus", type=int, default=20000, help="Máximo de chunks a cargar")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--questions", help="Archivo con una pregunta por línea")
+    args = parser.parse_args()
+
+    if requested_dimensions():
+        sys.exit("Ejecute sin EMBEDDING_DIMENSIONS: se necesitan los vectores completos")
+
+    openai.api_key = OPENAI_API_KEY
+    print(json.dumps(
+        main(args.dims, args.top_k, args.corpus, args.queries, args.questions),
+        indent=2,
+    ))
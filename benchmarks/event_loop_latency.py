@@ -0,0 +1,84 @@
+"""
+Latencia del event loop durante una ingesta grande.
+
+Mide cada 10 ms cuánto se atrasa un tick del loop mientras se extrae y
+chunkea un PDF, comparando la ruta antigua (PyPDF2 + splitter dentro del
+loop) con el pool de procesos de app.services.extraction.
+
+Uso:
+    python -m benchmarks.event_loop_latency --pdf uploads/2309.06180v1.pdf --repeat 5
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+from app.services import extraction
+
+TICK_SECONDS = 0.01
+
+
+async def _measure_lag(stop: asyncio.Event, samples: list[float]) -> None:
+    while not stop.is_set():
+        expected = time.perf_counter() + TICK_SECONDS
+        await asyncio.sleep(TICK_SECONDS)
+        samples.append(max(0.0, time.perf_counter() - expected) * 1000)
+
+
+def _inline_extract(path: str) -> list[str]:
+    page_count = extraction.count_pdf_pages(path)
+    text = extraction.extract_pdf_pages(path, 0, page_count)
+    return extraction.split_text(text)
+
+
+async def _run(mode: str, path: str, repeat: int) -> dict:
+    samples: list[float] = []
+    stop = asyncio.Event()
+    ticker = asyncio.create_task(_measure_lag(stop, samples))
+    await asyncio.sleep(0.1)
+
+    start = time.perf_counter()
+    chunks = 0
+    for _ in range(repeat):
+        if mode == "inline":
+            chunks += len(_inline_extract(path))
+        else:
+            chunks += len(await extraction.extract_chunks(path, path))
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    await ticker
+    samples.sort()
+    return {
+        "mode": mode,
+        "ingest_seconds": round(elapsed, 3),
+        "chunks": chunks,
+        "lag_ms_p50": round(statistics.median(samples), 2),
+        "lag_ms_p99": round(samples[int(len(samples) * 0.99) - 1], 2),
+        "lag_ms_max": round(samples[-1], 2),
+        "ticks": len(samples),
+    }
+
+
+async def _main(path: str, repeat: int) -> list[dict]:
+    # Calienta el pool para no medir el arranque de los procesos.
+    await extraction.extract_chunks(path, path)
+    return [
+        await _run("inline", path, repeat),
+        await _run("process_pool", path, repeat),
+    ]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--pdf", required=True)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    try:
+        results = asyncio.run(_main(args.pdf, args.repeat))
+    finally:
+        extraction.shutdown_extraction_pool()
+    print(json.dumps(results, indent=2))
@@ -0,0 +1,118 @@
+"""
+Recall de la recuperación híbrida (densa + full-text con RRF) frente a solo densa.
+
+Lee preguntas etiquetadas (JSONL con "question", "document_id" y
+opcionalmente "chunk_index") y, para cada k, mide en qué fracción de las
+preguntas el chunk (o documento) esperado aparece entre los k primeros hits
+que llegarían al prompt. Las preguntas con números de ley, artículos o
+códigos son las que más se benefician de la parte léxica.
+
+Las preguntas sin "document_id" (más OFF_TOPIC_QUESTIONS, siempre incluidas)
+son ajenas al corpus: para ellas se mide la fracción que llega al prompt con
+algún chunk, que debería ser 0 para que se responda NO_INFO_ANSWER.
+
+Requiere PostgreSQL con la migración 3 aplicada, Qdrant y OPENAI_API_KEY.
+
+Uso:
+    python -m benchmarks.hybrid_recall --labels preguntas.jsonl --k 1 3 5 8
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+
+import openai
+from qdrant_client import AsyncQdrantClient
+
+from app.config import (
+    HYBRID_CANDIDATES,
+    HYBRID_MIN_TERM_FRACTION,
+    OPENAI_API_KEY,
+    QDRANT_HOST,
+    QDRANT_PORT,
+)
+from app.services.rag import MIN_DENSE_SCORE, build_retrieval_context, hybrid_search_available
+from app.services.timing import StageTimer
+from app.state import state
+
+# Preguntas ajenas al corpus que comparten alguna palabra común con él.
+OFF_TOPIC_QUESTIONS = [
+    "¿Cuántos días de vacaciones tiene un astronauta en Marte?",
+    "¿Cuál es la capital de Australia?",
+]
+
+
+def _matches(hit, label: dict) -> bool:
+    payload = hit.payload or {}
+    if payload.get("document_id") != label["document_id"]:
+        return False
+    return "chunk_index" not in label or payload.get("chunk_index") == label["chunk_index"]
+
+
+def _hit_at(hits: list, label: dict, k: int) -> float:
+    return float(any(_matches(hit, label) for hit in hits[:k]))
+
+
+async def main(labels_path: str, ks: list[int]) -> dict:
+    with open(labels_path, encoding="utf-8") as handle:
+        labels = [json.loads(line) for line in handle if line.strip()]
+
+    state.qdrant = AsyncQdrantClient(host=QDRANT_HOST, port=QDRANT_PORT)
+    off_topic = [label["question"] for label in labels if not label.get("document_id")]
+    off_topic += OFF_TOPIC_QUESTIONS
+    labels = [label for label in labels if label.get("document_id")]
+
+    dense_hits = {k: [] for k in ks}
+    hybrid_hits = {k: [] for k in ks}
+    dense_leaks = []
+    hybrid_leaks = []
+    lexical_ms = []
+    try:
+        for question in off_topic:
+            retrieval = await build_retrieval_context(question, max(ks))
+            dense_leaks.append(float(any(hit.score >= MIN_DENSE_SCORE for hit in retrieval.hits)))
+            hybrid_leaks.append(float(bool(retrieval.context_hits(max(ks)))))
+        for label in labels:
+            timer = StageTimer()
+            retrieval = await build_retrieval_context(label["question"], max(ks), timer)
+            dense = [hit for hit in retrieval.hits if hit.score >= MIN_DENSE_SCORE]
+            hybrid = retrieval.ranked or []
+            lexical_ms.append(timer.stages.get("lexical", 0.0))
+            for k in ks:
+                dense_hits[k].append(_hit_at(dense, label, k))
+                hybrid_hits[k].append(_hit_at(hybrid, label, k))
+    finally:
+        await state.qdrant.close()
+
+    return {
+        "questions": len(labels),
+        "candidates": HYBRID_CANDIDATES,
+        "min_term_fraction": HYBRID_MIN_TERM_FRACTION,
+        "off_topic_questions": len(off_topic),
+        # Fracción de preguntas ajenas al corpus que llegan al prompt con contexto.
+        "off_topic_dense_leak_rate": round(statistics.fmean(dense_leaks), 4),
+        "off_topic_hybrid_leak_rate": round(statistics.fmean(hybrid_leaks), 4),
+        "lexical_p50_ms": round(statistics.median(lexical_ms), 2) if lexical_ms else None,
+        "results": [
+            {
+                "k": k,
+                "dense_hit_rate": round(statistics.fmean(dense_hits[k]), 4),
+                "hybrid_hit_rate": round(statistics.fmean(hybrid_hits[k]), 4),
+            }
+            for k in ks
+        ],
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--labels", required=True, help="JSONL con question y document_id")
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 3, 5, 8])
+    args = parser.parse_args()
+
+    if not hybrid_search_available():
+        raise SystemExit("Búsqueda híbrida no disponible: requiere PostgreSQL y HYBRID_SEARCH_ENABLED")
+
+    openai.api_key = OPENAI_API_KEY
+    print(json.dumps(asyncio.run(main(args.labels, args.k)), indent=2, ensure_ascii=False))
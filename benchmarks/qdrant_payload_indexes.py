@@ -0,0 +1,187 @@
+"""
+Latencia de búsquedas filtradas en Qdrant con y sin índices de payload.
+
+Carga el mismo corpus sintético (payload con la forma de los chunks reales)
+en dos colecciones temporales: una sin índices y otra con los índices de
+app.services.qdrant_service.PAYLOAD_INDEXES. Luego mide la búsqueda que usa
+/ask (is_current + deleted), una búsqueda acotada a un documento y el
+set_payload por document_id que usa el versionado.
+
+Requiere un Qdrant servidor (QDRANT_HOST/QDRANT_PORT): el modo local de
+qdrant-client ignora los índices de payload.
+
+Uso:
+    python -m benchmarks.qdrant_payload_indexes --points 1000000 --dim 1536
+    python -m benchmarks.qdrant_payload_indexes --points 100000 --dim 256 --keep
+"""
+
+import argparse
+import json
+import statistics
+import time
+
+import numpy as np
+from qdrant_client import QdrantClient
+from qdrant_client.models import (
+    Distance,
+    FieldCondition,
+    Filter,
+    MatchValue,
+    OptimizersConfigDiff,
+    VectorParams,
+)
+
+from app.config import QDRANT_HOST, QDRANT_PORT
+from app.services.qdrant_service import ensure_payload_indexes
+
+CHUNKS_PER_DOCUMENT = 50
+CATEGORIES = ["hr", "legal", "technical", "training", "finance"]
+DEPARTMENTS = ["personas", "legal", "ti", "operaciones", "comercial", "gerencia"]
+UPLOAD_BATCH = 512
+
+
+def _payloads(points: int, seed: int):
+    rng = np.random.default_rng(seed)
+    for idx in range(points):
+        document = idx // CHUNKS_PER_DOCUMENT
+        yield {
+            "document_id": f"doc-{document}",
+            "version": f"{1 + (document % 3)}.0",
+            "chunk_index": idx % CHUNKS_PER_DOCUMENT,
+            "category": CATEGORIES[document % len(CATEGORIES)],
+            "department": DEPARTMENTS[document % len(DEPARTMENTS)],
+            # Proporciones aproximadas de un corpus con historial de versiones.
+            "is_current": bool(rng.random() < 0.7),
+            "deleted": bool(rng.random() < 0.05),
+            "public": bool(document % 4 == 0),
+        }
+
+
+def _vectors(points: int, dim: int, seed: int):
+    rng = np.random.default_rng(seed + 1)
+    for start in range(0, points, UPLOAD_BATCH):
+        batch = rng.standard_normal((min(UPLOAD_BATCH, points - start), dim), dtype=np.float32)
+        yield from batch.tolist()
+
+
+def _wait_green(client: QdrantClient, name: str) -> float:
+    start = time.perf_counter()
+    while client.get_collection(name).status.value != "green":
+        time.sleep(1)
+    return time.perf_counter() - start
+
+
+def _load(client: QdrantClient, name: str, points: int, dim: int, seed: int, indexed: bool) -> dict:
+    client.recreate_collection(
+        collection_name=name,
+        vectors_config=VectorParams(size=dim, distance=Distance.COSINE),
+        # Se construye HNSW una sola vez al final de la carga.
+        optimizers_config=OptimizersConfigDiff(indexing_threshold=0),
+    )
+    if indexed:
+        ensure_payload_indexes(client, name)
+
+    start = time.perf_counter()
+    client.upload_collection(
+        collection_name=name,
+        vectors=_vectors(points, dim, seed),
+        payload=_payloads(points, seed),
+        ids=range(points),
+        batch_size=UPLOAD_BATCH,
+        parallel=4,
+        wait=True,
+    )
+    upload_seconds = time.perf_counter() - start
+
+    client.update_collection(
+        collection_name=name,
+        optimizer_config=OptimizersConfigDiff(indexing_threshold=20000),
+    )
+    return {
+        "upload_seconds": round(upload_seconds, 1),
+        "index_build_seconds": round(_wait_green(client, name), 1),
+    }
+
+
+def _percentiles(samples: list[float]) -> dict:
+    samples = sorted(samples)
+    return {
+        "p50_ms": round(statistics.median(samples), 2),
+        "p95_ms": round(samples[max(0, int(len(samples) * 0.95) - 1)], 2),
+        "mean_ms": round(statistics.fmean(samples), 2),
+    }
+
+
+def _timed(samples: list[float], func, *args, **kwargs) -> None:
+    start = time.perf_counter()
+    func(*args, **kwargs)
+    samples.append((time.perf_counter() - start) * 1000)
+
+
+def _measure(client: QdrantClient, name: str, points: int, dim: int, queries: int, seed: int) -> dict:
+    rng = np.random.default_rng(seed + 2)
+    documents = max(1, points // CHUNKS_PER_DOCUMENT)
+    rag_filter = Filter(must=[
+        FieldCondition(key="is_current", match=MatchValue(value=True)),
+        FieldCondition(key="deleted", match=MatchValue(value=False)),
+    ])
+
+    rag_search: list[float] = []
+    document_search: list[float] = []
+    set_payload: list[float] = []
+    for _ in range(queries):
+        vector = rng.standard_normal(dim, dtype=np.float32).tolist()
+        document_id = f"doc-{int(rng.integers(documents))}"
+        document_filter = Filter(must=[
+            FieldCondition(key="document_id", match=MatchValue(value=document_id)),
+            *rag_filter.must,
+        ])
+
+        _timed(rag_search, client.search, name, vector, query_filter=rag_filter, limit=8)
+        _timed(document_search, client.search, name, vector, query_filter=document_filter, limit=8)
+        _timed(
+            set_payload,
+            client.set_payload,
+            collection_name=name,
+            payload={"public": True},
+            points=Filter(must=[
+                FieldCondition(key="document_id", match=MatchValue(value=document_id)),
+            ]),
+            wait=True,
+        )
+
+    return {
+        "rag_search": _percentiles(rag_search),
+        "document_search": _percentiles(document_search),
+        "set_payload_by_document": _percentiles(set_payload),
+    }
+
+
+def main(points: int, dim: int, queries: int, seed: int, keep: bool) -> list[dict]:
+    client = QdrantClient(host=QDRANT_HOST, port=QDRANT_PORT, timeout=600)
+    results = []
+    for name, indexed in (("bench_filters_plain", False), ("bench_filters_indexed", True)):
+        load = _load(client, name, points, dim, seed, indexed)
+        results.append({
+            "collection": name,
+            "payload_indexes": indexed,
+            "points": points,
+            "dim": dim,
+            **load,
+            **_measure(client, name, points, dim, queries, seed),
+        })
+        if not keep:
+            client.delete_collection(name)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--points", type=int, default=1_000_000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--keep", action="store_true", help="No borrar las colecciones al terminar")
+    args = parser.parse_args()
+
+    print(json.dumps(main(args.points, args.dim, args.queries, args.seed, args.keep), indent=2))
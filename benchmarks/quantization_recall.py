@@ -0,0 +1,152 @@
+"""
+Recall y latencia de la búsqueda cuantizada frente a la búsqueda exacta.
+
+Usa la colección configurada (QDRANT_COLLECTION) con el filtro de /ask. La
+verdad de referencia es una búsqueda exacta (exact=True) sobre los vectores
+originales. Contra ella se compara cada variante:
+
+- float32: ignora el índice cuantizado
+- quantized: índice cuantizado sin rescoring
+- rescore xN: índice cuantizado, oversampling N y rescoring con los originales
+
+Las consultas son preguntas reales (--questions, una por línea, se embeben con
+EMBEDDING_MODEL) o, por defecto, vectores de chunks muestreados de la colección.
+
+Para migrar la colección existente basta con reiniciar el backend con
+QDRANT_QUANTIZATION=scalar|binary: init_qdrant aplica update_collection y
+Qdrant reconstruye los segmentos en segundo plano. Conviene correr este script
+antes y después para decidir el oversampling.
+
+Uso:
+    python -m benchmarks.quantization_recall --queries 200 --top-k 8
+    python -m benchmarks.quantization_recall --questions preguntas.txt --oversampling 1.5 2 3
+"""
+
+import argparse
+import json
+import statistics
+import time
+
+import openai
+from qdrant_client import QdrantClient
+from qdrant_client.models import NamedVector, QuantizationSearchParams, SearchParams
+
+from app.config import (
+    OPENAI_API_KEY,
+    QDRANT_COLLECTION,
+    QDRANT_HOST,
+    QDRANT_PORT,
+    QDRANT_TWO_STAGE_SEARCH,
+)
+from app.services.embeddings import embed_texts, index_dimensions, shorten
+from app.services.qdrant_service import SHORT_VECTOR, _vector_layout
+from app.services.rag import _current_filter
+
+
+def _query_vector(vector: list[float]):
+    # Con búsqueda en dos etapas se mide el vector corto, que es el cuantizado.
+    if QDRANT_TWO_STAGE_SEARCH:
+        return NamedVector(name=SHORT_VECTOR, vector=vector)
+    return vector
+
+
+def _sample_vectors(client: QdrantClient, count: int) -> list[list[float]]:
+    records, _ = client.scroll(
+        collection_name=QDRANT_COLLECTION,
+        scroll_filter=_current_filter(),
+        limit=count,
+        with_payload=False,
+        with_vectors=[SHORT_VECTOR] if QDRANT_TWO_STAGE_SEARCH else True,
+    )
+    if QDRANT_TWO_STAGE_SEARCH:
+        return [record.vector[SHORT_VECTOR] for record in records]
+    return [record.vector for record in records]
+
+
+def _load_questions(path: str, count: int) -> list[list[float]]:
+    with open(path, encoding="utf-8") as handle:
+        questions = [line.strip() for line in handle if line.strip()]
+    vectors = embed_texts(questions[:count])
+    if QDRANT_TWO_STAGE_SEARCH:
+        return [shorten(vector, index_dimensions()) for vector in vectors]
+    return vectors
+
+
+def _search(client: QdrantClient, vector: list[float], top_k: int, params: SearchParams) -> tuple[list, float]:
+    start = time.perf_counter()
+    hits = client.search(
+        collection_name=QDRANT_COLLECTION,
+        query_vector=_query_vector(vector),
+        query_filter=_current_filter(),
+        search_params=params,
+        limit=top_k,
+        with_payload=False,
+    )
+    return [hit.id for hit in hits], (time.perf_counter() - start) * 1000
+
+
+def _variants(oversampling: list[float]) -> dict[str, SearchParams]:
+    variants = {
+        "float32": SearchParams(quantization=QuantizationSearchParams(ignore=True)),
+        "quantized": SearchParams(quantization=QuantizationSearchParams(rescore=False)),
+    }
+    for factor in oversampling:
+        variants[f"rescore x{factor:g}"] = SearchParams(quantization=QuantizationSearchParams(
+            rescore=True,
+            oversampling=factor,
+        ))
+    return variants
+
+
+def main(queries: int, top_k: int, oversampling: list[float], questions: str | None) -> dict:
+    client = QdrantClient(host=QDRANT_HOST, port=QDRANT_PORT, timeout=120)
+    config = client.get_collection(QDRANT_COLLECTION).config
+    vectors = _load_questions(questions, queries) if questions else _sample_vectors(client, queries)
+
+    exact = [
+        set(_search(client, vector, top_k, SearchParams(exact=True))[0])
+        for vector in vectors
+    ]
+
+    results = []
+    for name, params in _variants(oversampling).items():
+        recalls = []
+        latencies = []
+        for vector, expected in zip(vectors, exact):
+            ids, elapsed = _search(client, vector, top_k, params)
+            latencies.append(elapsed)
+            recalls.append(len(expected & set(ids)) / max(len(expected), 1))
+        latencies.sort()
+        results.append({
+            "variant": name,
+            f"recall@{top_k}": round(statistics.fmean(recalls), 4),
+            "p50_ms": round(statistics.median(latencies), 2),
+            "p95_ms": round(latencies[max(0, int(len(latencies) * 0.95) - 1)], 2),
+        })
+
+    return {
+        "collection": QDRANT_COLLECTION,
+        "quantization": config.quantization_config.model_dump() if config.quantization_config else None,
+        "vectors_on_disk": {
+            name or "default": bool(params.on_disk)
+            for name, params in _vector_layout(config.params.vectors).items()
+        },
+        "queries": len(vectors),
+        "results": results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=8)
+    parser.add_argument("--oversampling", type=float, nargs="+", default=[1.0, 2.0, 3.0])
+    parser.add_argument("--questions", help="Archivo con una pregunta por línea")
+    args = parser.parse_args()
+
+    openai.api_key = OPENAI_API_KEY
+    print(json.dumps(
+        main(args.queries, args.top_k, args.oversampling, args.questions),
+        indent=2,
+        ensure_ascii=False,
+    ))
@@ -7,6 +7,8 @@ const API_BASE_URL = window.location.hostname === 'localhost'
 class DocumentManager {
     constructor() {
         this.documents = [];
+        this.nextCursor = null;
+        this.searchTimer = null;
         this.selectedFiles = [];
         this.currentView = 'grid';
         this.currentDocument = null;
@@ -14,7 +16,6 @@ class DocumentManager {
         this.initializeElements();
         this.attachEventListeners();
         this.loadDocuments();
-        this.updateStats();
     }
 
     initializeElements() {
@@ -22,6 +23,8 @@ class DocumentManager {
             // Containers
             documentsContainer: document.getElementById('documentsContainer'),
             emptyState: document.getElementById('emptyState'),
+            loadMore: document.getElementById('loadMore'),
+            loadMoreBtn: document.getElementById('loadMoreBtn'),
             
             // Buttons
             uploadBtn: document.getElementById('uploadBtn'),
@@ -62,11 +65,14 @@ class DocumentManager {
         // Refresh button
         this.elements.refreshBtn.addEventListener('click', () => this.loadDocuments());
         
-        // Filters
-        this.elements.searchInput.addEventListener('input', () => this.filterDocuments());
-        this.elements.categoryFilter.addEventListener('change', () => this.filterDocuments());
-        this.elements.typeFilter.addEventListener('change', () => this.filterDocuments());
-        this.elements.statusFilter.addEventListener('change', () => this.filterDocuments());
+        // Filters (se aplican en el servidor)
+        this.elements.searchInput.addEventListener('input', () => this.scheduleSearch());
+        this.elements.categoryFilter.addEventListener('change', () => this.loadDocuments());
+        this.elements.typeFilter.addEventListener('change', () => this.loadDocuments());
+        this.elements.statusFilter.addEventListener('change', () => this.loadDocuments());
+
+        // Paginación
+        this.elements.loadMoreBtn.addEventListener('click', () => this.loadDocuments({ append: true }));
         
         // View toggle
         document.querySelectorAll('.view-btn').forEach(btn => {
@@ -106,13 +112,18 @@ class DocumentManager {
         this.elements.saveEdit.addEventListener('click', () => this.saveMetadata());
     }
 
-    async loadDocuments() {
+    async loadDocuments({ append = false } = {}) {
         try {
             // Intentar cargar desde API con timeout de 2 segundos
             const controller = new AbortController();
             const timeoutId = setTimeout(() => controller.abort(), 2000);
-            
-            const response = await fetch(`${API_BASE_URL}/documents`, {
+
+            const params = this.buildFilterParams();
+            if (append && this.nextCursor) {
+                params.set('cursor', this.nextCursor);
+            }
+
+            const response = await fetch(`${API_BASE_URL}/documents?${params}`, {
                 signal: controller.signal
             });
             
@@ -122,29 +133,18 @@ class DocumentManager {
                 throw new Error('Error cargando documentos');
             }
 
-            const rawDocs = await response.json();
-            this.documents = rawDocs.map(doc => ({
-                ...doc,
-
-                // normalización mínima para que el UI no falle
-                id: doc.document_id || doc.id,
-                filename: doc.filename || doc.title || 'Documento sin título',
-                size: Number.isFinite(doc.size) ? doc.size : 0,
-                type: (doc.type || 'pdf').toLowerCase(),
-                tags: Array.isArray(doc.tags) ? doc.tags : [],
-                description: doc.description || '',
-                owner: doc.owner || '—',
-                created_at: doc.created_at || doc.effective_from,
-                modified_at: doc.modified_at || doc.updated_at || doc.createdAt,
-
-                // compatibilidad de estado
-                status: doc.status === 'indexed' ? 'completed' : doc.status
-            }));
+            const page = await response.json();
+            const pageDocs = page.items.map(doc => this.normalizeDocument(doc));
+            this.documents = append ? this.documents.concat(pageDocs) : pageDocs;
+            this.nextCursor = page.next_cursor;
 
             console.log('✓ Documentos cargados desde API:', this.documents.length);
         } catch (error) {
             console.error('Error cargando documentos:', error.message);
-            this.documents = [];
+            if (!append) {
+                this.documents = [];
+                this.nextCursor = null;
+            }
         } finally {
             console.log('Total documents loaded:', this.documents.length);
             this.renderDocuments();
@@ -152,6 +152,46 @@ class DocumentManager {
         }
     }
 
+    normalizeDocument(doc) {
+        return {
+            ...doc,
+
+            // normalización mínima para que el UI no falle
+            id: doc.document_id || doc.id,
+            filename: doc.filename || doc.title || 'Documento sin título',
+            size: Number.isFinite(doc.size) ? doc.size : 0,
+            type: (doc.type || 'pdf').toLowerCase(),
+            tags: Array.isArray(doc.tags) ? doc.tags : [],
+            description: doc.description || '',
+            owner: doc.owner || '—',
+            created_at: doc.created_at || doc.effective_from,
+            modified_at: doc.modified_at || doc.updated_at || doc.createdAt,
+
+            // compatibilidad de estado
+            status: doc.status === 'indexed' ? 'completed' : doc.status
+        };
+    }
+
+    buildFilterParams() {
+        const params = new URLSearchParams();
+        const searchTerm = this.elements.searchInput.value.trim();
+        const category = this.elements.categoryFilter.value;
+        const type = this.elements.typeFilter.value;
+        const status = this.elements.statusFilter.value;
+
+        if (searchTerm) params.set('q', searchTerm);
+        if (category) params.set('category', category);
+        if (type) params.set('type', type);
+        if (status) params.set('status', status);
+        return params;
+    }
+
+    scheduleSearch() {
+        // Evita una consulta por cada tecla.
+        clearTimeout(this.searchTimer);
+        this.searchTimer = setTimeout(() => this.loadDocuments(), 300);
+    }
+
     getMockDocuments() {
         return [
             {
@@ -253,7 +293,8 @@ class DocumentManager {
     }
 
     renderDocuments() {
-        const filteredDocs = this.filterDocuments();
+        const filteredDocs = this.documents;
+        this.elements.loadMore.style.display = this.nextCursor ? 'flex' : 'none';
         
         if (filteredDocs.length === 0) {
             this.elements.documentsContainer.style.display = 'none';
@@ -383,26 +424,6 @@ class DocumentManager {
         });
     }
 
-    filterDocuments() {
-        const searchTerm = this.elements.searchInput.value.toLowerCase();
-        const category = this.elements.categoryFilter.value;
-        const type = this.elements.typeFilter.value;
-        const status = this.elements.statusFilter.value;
-        
-        return this.documents.filter(doc => {
-            const matchesSearch = !searchTerm || 
-                (doc.filename && doc.filename.toLowerCase().includes(searchTerm)) ||
-                (doc.description && doc.description.toLowerCase().includes(searchTerm)) ||
-                (Array.isArray(doc.tags) && doc.tags.some(tag => tag.toLowerCase().includes(searchTerm)));
-            
-            const matchesCategory = !category || doc.category === category;
-            const matchesType = !type || doc.type === type;
-            const matchesStatus = !status || doc.status === status;
-            
-            return matchesSearch && matchesCategory && matchesType && matchesStatus;
-        });
-    }
-
     toggleView(view) {
         this.currentView = view;
         
@@ -525,6 +546,7 @@ class DocumentManager {
         this.elements.startUpload.textContent = 'Subiendo...';
         
         try {
+            const jobIds = [];
             for (const file of this.selectedFiles) {
                 const formData = new FormData();
                 formData.append('file', file);
@@ -540,9 +562,20 @@ class DocumentManager {
                 if (!response.ok) {
                     throw new Error(`Error subiendo ${file.name}`);
                 }
+                const job = await response.json();
+                jobIds.push(job.job_id);
             }
             
-            alert('Documentos subidos exitosamente');
+            // La indexación corre en segundo plano; esperamos a que terminen los jobs
+            this.elements.startUpload.textContent = 'Indexando...';
+            const jobs = await Promise.all(jobIds.map(jobId => this.waitForJob(jobId)));
+            const failed = jobs.filter(job => job.status === 'failed');
+            
+            if (failed.length) {
+                alert(`Algunos documentos no se pudieron indexar:\n${failed.map(job => `${job.filename}: ${job.error}`).join('\n')}`);
+            } else {
+                alert('Documentos subidos exitosamente');
+            }
             this.closeUploadModal();
             this.loadDocuments();
             
@@ -555,6 +588,20 @@ class DocumentManager {
         }
     }
 
+    async waitForJob(jobId, intervalMs = 1500) {
+        while (true) {
+            const response = await fetch(`${API_BASE_URL}/jobs/${encodeURIComponent(jobId)}`);
+            if (!response.ok) {
+                throw new Error(`Error consultando job ${jobId}`);
+            }
+            const job = await response.json();
+            if (job.status === 'completed' || job.status === 'failed') {
+                return job;
+            }
+            await new Promise(resolve => setTimeout(resolve, intervalMs));
+        }
+    }
+
     // Edit Document
     editDocument(docId) {
         const doc = this.documents.find(d => (d.document_id || d.id) === docId);
@@ -689,13 +736,21 @@ class DocumentManager {
         }
     }
 
-    updateStats() {
-        const totalDocs = this.documents.length;
-        const totalBytes = this.documents.reduce((sum, doc) => sum + doc.size, 0);
-        const totalMB = (totalBytes / (1024 * 1024)).toFixed(1);
-        
-        this.elements.totalDocs.textContent = totalDocs;
-        this.elements.totalSize.textContent = `${totalMB} MB`;
+    async updateStats() {
+        // Totales del servidor: la lista solo tiene las páginas cargadas.
+        try {
+            const response = await fetch(`${API_BASE_URL}/documents/count`);
+            if (!response.ok) {
+                throw new Error('Error cargando totales');
+            }
+            const stats = await response.json();
+            const totalMB = (stats.total_size / (1024 * 1024)).toFixed(1);
+
+            this.elements.totalDocs.textContent = stats.total;
+            this.elements.totalSize.textContent = `${totalMB} MB`;
+        } catch (error) {
+            console.error('Error cargando totales:', error.message);
+        }
     }
 
     // Helper functions
@@ -1,8 +1,8 @@
 import { CONFIG } from '../config/constants.js';
-import { queryRAG } from '../services/ragService.js';
+import { streamRAG } from '../services/ragService.js';
 import { loadChats, saveChats } from '../storage/chatStorage.js';
 import { autoResizeTextarea, scrollToBottom } from '../utils/dom.js';
-import { renderMessage, showLoadingIndicator, removeLoadingIndicator } from '../ui/messages.js';
+import { renderMessage, updateMessageContent, showLoadingIndicator, removeLoadingIndicator } from '../ui/messages.js';
 
 export class ChatApp {
     constructor() {
@@ -108,18 +108,35 @@ export class ChatApp {
 
         showLoadingIndicator({ elements: this.elements, currentAgent: this.currentAgent });
 
+        const assistantMessage = {
+            role: 'assistant',
+            content: '',
+            sources: [],
+            timestamp: Date.now(),
+            agent: 'rag'
+        };
+        let streamingDiv = null;
+
         try {
-            const response = await queryRAG({ query: message, agentKey: this.currentAgent });
+            const response = await streamRAG({
+                query: message,
+                agentKey: this.currentAgent,
+                onToken: (token) => {
+                    if (!streamingDiv) {
+                        removeLoadingIndicator(this.elements);
+                        streamingDiv = renderMessage({ message: assistantMessage, elements: this.elements });
+                    }
+                    assistantMessage.content += token;
+                    updateMessageContent(streamingDiv, assistantMessage.content);
+                    this.scrollToBottom();
+                }
+            });
 
             removeLoadingIndicator(this.elements);
+            streamingDiv?.remove();
 
-            const assistantMessage = {
-                role: 'assistant',
-                content: response.answer,
-                sources: response.sources,
-                timestamp: Date.now(),
-                agent: 'rag'
-            };
+            assistantMessage.content = response.answer;
+            assistantMessage.sources = response.sources;
 
             this.currentMessages.push(assistantMessage);
             renderMessage({ message: assistantMessage, elements: this.elements });
@@ -128,6 +145,7 @@ export class ChatApp {
         } catch (error) {
             console.error('Error querying RAG:', error);
             removeLoadingIndicator(this.elements);
+            streamingDiv?.remove();
 
             const errorMessage = {
                 role: 'assistant',
@@ -24,6 +24,75 @@ export async function queryRAG({ query, agentKey }) {
     return await response.json();
 }
 
+export async function streamRAG({ query, agentKey, onToken }) {
+    if (USE_MOCK_RAG) {
+        const response = await queryRAG({ query, agentKey });
+        onToken?.(response.answer);
+        return response;
+    }
+
+    const response = await fetch(`${CONFIG.API_BASE_URL}/ask/stream`, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+            'Accept': 'text/event-stream'
+        },
+        body: JSON.stringify({
+            question: query,
+            top_k: 5
+        })
+    });
+
+    if (!response.ok || !response.body) {
+        throw new Error('Error consultando backend RAG');
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    const result = { answer: '', sources: [] };
+    let buffer = '';
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+
+        buffer += decoder.decode(value, { stream: true });
+        const events = buffer.split('\n\n');
+        buffer = events.pop();
+
+        for (const rawEvent of events) {
+            const { event, data } = parseSSEEvent(rawEvent);
+            if (event === 'sources') {
+                result.sources = data.sources;
+            } else if (event === 'token') {
+                result.answer += data.text;
+                onToken?.(data.text);
+            } else if (event === 'done') {
+                result.answer = data.answer;
+            } else if (event === 'error') {
+                throw new Error(data.detail || 'Error consultando backend RAG');
+            }
+        }
+    }
+
+    return result;
+}
+
+function parseSSEEvent(rawEvent) {
+    let event = 'message';
+    const dataLines = [];
+
+    rawEvent.split('\n').forEach(line => {
+        if (line.startsWith('event:')) {
+            event = line.slice(6).trim();
+        } else if (line.startsWith('data:')) {
+            dataLines.push(line.slice(5).trim());
+        }
+    });
+
+    return { event, data: dataLines.length ? JSON.parse(dataLines.join('\n')) : {} };
+}
+
 async function mockRAGQuery(query, agentKey) {
     // Simulate API delay
     await new Promise(resolve => setTimeout(resolve, 1500));
@@ -27,7 +27,7 @@ export function renderMessage({ message, elements }) {
             <div class="source-item">
             <span><strong>${s.filename}</strong></span>
             <span>Chunk ${s.chunk_index}</span>
-            <span>Score ${(s.score * 100).toFixed(1)}%</span>
+            <span>Score ${s.score == null ? '—' : `${(s.score * 100).toFixed(1)}%`}</span>
             </div>
         `).join('')}
         </div>
@@ -36,6 +36,11 @@ export function renderMessage({ message, elements }) {
 
     messageDiv.innerHTML = messageHTML;
     elements.messagesContainer.appendChild(messageDiv);
+    return messageDiv;
+}
+
+export function updateMessageContent(messageDiv, content) {
+    messageDiv.querySelector('.message-content').innerHTML = formatMessageContent(content);
 }
 
 export function formatMessageContent(content) {